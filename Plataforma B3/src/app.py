@@ -1,18 +1,165 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, Query
+from contextlib import asynccontextmanager
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
+from flow_manager import FlowManager, Flow, flow_cache
+from flow_repository import FlowRepository
 import asyncio
-from models import Flow
-from dotenv import load_dotenv
-from flow_manager import FlowManager, Flow
-from model_integration import ModelIntegration
+from model_integration import ModelIntegration, FlowRunError, FlowDeadlineExceeded, build_model_client
 from config import settings
-from database import get_db
+from database import (
+    get_db, get_flows_collection, get_runs_collection, get_jobs_collection, ping, close_clients
+)
+from http_client import HTTPClientPool
+from batch import BatchJob, run_batch, iter_lines, parse_item
+from argo_client import ArgoClient, ArgoError
+from run_log import RunLog
+from flow_io import FORMATS, MEDIA_TYPES, detect_format, iter_chunk_lines, parse_records, format_record
+from job_queue import JobQueue, JobWorker
+from warmup import WarmUp, warm_http_pool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from metrics import REGISTRY
+from tracing import exporter
+import json
+import logging
+import tempfile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Monta os componentes sem acessar a rede e deixa o que depende dela para o aquecimento.
+
+    O servidor começa a aceitar conexões logo em seguida; /readyz só responde
+    200 depois que `_warm_up_steps` concluir.
+    """
+    http_client = HTTPClientPool()
+    await http_client.start()
+    app.state.http_client = http_client
+    app.state.argo_client = ArgoClient(http_client.session)
+    app.state.run_log = RunLog(get_runs_collection()) if settings.RUN_LOG_ENABLED else None
+    # Um cliente para todas as requisições: caches, limites e coalescência são compartilhados
+    model_client = build_model_client(http_client.session, run_log=app.state.run_log)
+    app.state.model_client = model_client
+    app.state.response_cache = model_client.cache
+    app.state.rate_limits = model_client.rate_limits
+    app.state.coalescer = model_client.coalescer
+    app.state.hedging = model_client.hedging
+    app.state.semantic_cache = model_client.semantic_cache
+    app.state.batch_jobs = {}
+    app.state.job_queue = JobQueue(get_jobs_collection())
+    app.state.job_worker = None
+    app.state.cache_watcher = None
+    collector = lambda: _state_metrics(app.state)
+    REGISTRY.add_collector(collector)
+    app.state.warm_up = WarmUp(_warm_up_steps(app.state))
+    app.state.warm_up.start()
+    try:
+        yield
+    finally:
+        REGISTRY.remove_collector(collector)
+        await app.state.warm_up.stop()
+        if app.state.job_worker is not None:
+            await app.state.job_worker.stop()
+        if app.state.cache_watcher is not None:
+            app.state.cache_watcher.cancel()
+            await asyncio.gather(app.state.cache_watcher, return_exceptions=True)
+        if app.state.run_log is not None:
+            await app.state.run_log.close()
+        await http_client.close()
+        close_clients()
+
+def _warm_up_steps(state):
+    """Etapas do aquecimento, em ordem: banco (índices e caches persistidos), pool HTTP e workers."""
+    async def indexes():
+        await FlowRepository(get_flows_collection()).ensure_indexes()
+        await state.job_queue.ensure_indexes()
+
+    async def run_log():
+        await state.run_log.start()
+
+    async def flow_cache_warm():
+        await FlowManager(get_flows_collection()).warm_cache()
+        state.cache_watcher = asyncio.ensure_future(flow_cache.watch(get_flows_collection()))
+
+    async def http_pool():
+        await warm_http_pool(state.http_client.session, settings.UFPB_OPENAI_API_BASE)
+
+    async def job_worker():
+        state.job_worker = JobWorker(
+            state.job_queue, state.model_client, FlowManager(get_flows_collection()),
+            session=state.http_client.session
+        )
+        state.job_worker.start()
+
+    steps = [("indices", indexes)]
+    if state.run_log is not None:
+        steps.append(("registro de execuções", run_log))
+    steps += [
+        ("cache semântico", state.semantic_cache.load),
+        ("cache de fluxos", flow_cache_warm),
+        ("pool HTTP", http_pool),
+    ]
+    if settings.JOB_WORKER_EMBEDDED:
+        steps.append(("worker de jobs", job_worker))
+    return steps
 
-load_dotenv()
+def _state_metrics(state):
+    """Métricas lidas dos contadores dos componentes compartilhados no momento da coleta."""
+    yield ("app_ready", "gauge", "1 quando o aquecimento da inicialização terminou.", [
+        ({}, int(state.warm_up.ready)),
+    ])
+    yield ("app_warmup_seconds", "gauge", "Duração do aquecimento (até agora, se ainda em andamento).", [
+        ({}, round(state.warm_up.seconds, 3)),
+    ])
+    yield ("response_cache_requests_total", "counter", "Consultas ao cache de respostas.", [
+        ({"result": "hit"}, state.response_cache.hits),
+        ({"result": "miss"}, state.response_cache.misses),
+    ])
+    yield ("flow_cache_requests_total", "counter", "Consultas ao cache de fluxos.", [
+        ({"result": "hit"}, flow_cache.hits),
+        ({"result": "miss"}, flow_cache.misses),
+    ])
+    yield ("flow_cache_watch_up", "gauge", "1 quando o change stream que invalida o cache de fluxos está aberto.", [
+        ({}, int(flow_cache.watch_status == "watching")),
+    ])
+    yield ("flow_cache_watch_restarts_total", "counter", "Reaberturas do change stream do cache de fluxos.", [
+        ({}, flow_cache.watch_restarts),
+    ])
+    semantic = state.semantic_cache.stats()
+    yield ("semantic_cache_requests_total", "counter", "Consultas ao cache semântico.", [
+        ({"result": "hit"}, semantic["hits"]),
+        ({"result": "miss"}, semantic["misses"]),
+    ])
+    yield ("semantic_cache_entries", "gauge", "Entradas nos índices do cache semântico.", [
+        ({}, semantic["entries"]),
+    ])
+    coalescing = state.coalescer.stats()
+    yield ("model_coalesced_calls_total", "counter", "Chamadas atendidas por uma requisição já em andamento.", [
+        ({}, coalescing["coalesced"]),
+    ])
+    yield ("model_coalescing_waiting", "gauge", "Chamadas aguardando uma requisição em andamento.", [
+        ({}, coalescing["waiting"]),
+    ])
+    limits = state.rate_limits.stats()
+    yield ("deployment_concurrency_limit", "gauge", "Limite de concorrência adaptativo por deployment.", [
+        ({"deployment": deployment}, values["concurrency_limit"]) for deployment, values in limits.items()
+    ])
+    yield ("deployment_throttled_total", "counter", "Respostas 429 recebidas por deployment.", [
+        ({"deployment": deployment}, values["throttled"]) for deployment, values in limits.items()
+    ])
+    if state.run_log is not None:
+        run_log = state.run_log.stats()
+        yield ("run_log_pending_operations", "gauge", "Operações do registro de execuções aguardando gravação.", [
+            ({}, run_log["pending"]),
+        ])
+        yield ("run_log_failed_writes_total", "counter", "Operações do registro de execuções que falharam ao gravar.", [
+            ({}, run_log["failed_writes"]),
+        ])
 
-app = FastAPI(title=settings.APP_NAME)
+app = FastAPI(title=settings.APP_NAME, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,65 +171,502 @@ app.add_middleware(
 
 class FlowuserMessage(BaseModel):
     user_message: str = Field(..., example="Qual a análise?")
+    timeout: Optional[float] = Field(default=None, gt=0, example=30)
+
+def get_model_client(request: Request) -> ModelIntegration:
+    return request.app.state.model_client
+
+@app.get("/healthz", response_model=Dict)
+def healthz():
+    """Liveness: o processo está de pé e o event loop responde."""
+    return {"status": "ok"}
+
+@app.get("/readyz", response_model=Dict)
+async def readyz(http_request: Request, response: Response):
+    """Readiness: 200 só depois do aquecimento e com o banco respondendo; 503 caso contrário.
+
+    `flow_cache_watch` informa o estado do change stream do cache de fluxos,
+    sem afetar o status: sem ele o cache ainda expira por FLOW_CACHE_TTL.
+    """
+    status = http_request.app.state.warm_up.status()
+    status["flow_cache_watch"] = flow_cache.watch_status
+    if status["ready"]:
+        try:
+            await ping(settings.READINESS_DB_TIMEOUT)
+            status["database"] = "ok"
+        except Exception as e:
+            status["ready"] = False
+            status["database"] = str(e) or type(e).__name__
+    if not status["ready"]:
+        response.status_code = 503
+    return status
 
 @app.post("/createFlows/", response_model=Dict)
-def create_flow(flow: Flow, db=Depends(get_db)):
+async def create_flow(flow: Flow, db=Depends(get_db)):
     manager = FlowManager(db)
     try:
-        new_flow = Flow(**flow.dict())
-        manager.create_flow(new_flow)
-        return {"message": "Fluxo criado com sucesso"}
+        new_flow = Flow(**flow.model_dump())
+        flow_id = await manager.create_flow(new_flow)
+        return {"message": "Fluxo criado com sucesso", "id": flow_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/flows/import", response_model=Dict)
+async def import_flows(
+    http_request: Request,
+    format: Optional[str] = Query(default=None, description="ndjson ou yaml; padrão: pelo Content-Type"),
+    batch_size: int = Query(default=settings.FLOW_IMPORT_BATCH_SIZE, ge=1, le=10000),
+    db=Depends(get_db)
+):
+    """Importa fluxos de um corpo NDJSON ou YAML com vários documentos, lido em streaming.
+
+    Registros com `id` criam ou substituem o fluxo com esse id. A resposta
+    traz as contagens e um erro por registro inválido ou não gravado.
+    """
+    fmt = format or detect_format(http_request.headers.get("content-type"))
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=422, detail=f"Formato inválido: '{fmt}'")
+    records = parse_records(iter_chunk_lines(http_request.stream()), fmt)
+    try:
+        return await FlowManager(db).import_flows(records, batch_size=batch_size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/flows/export")
+async def export_flows(
+    format: str = Query(default="ndjson", description="ndjson ou yaml"),
+    is_active: Optional[bool] = None,
+    db=Depends(get_db)
+):
+    """Exporta todos os fluxos em NDJSON ou YAML, no formato aceito por /flows/import."""
+    if format not in FORMATS:
+        raise HTTPException(status_code=422, detail=f"Formato inválido: '{format}'")
+
+    async def body():
+        async for record in FlowManager(db).export_flows(is_active=is_active):
+            yield format_record(record, format)
+
+    return StreamingResponse(body(), media_type=MEDIA_TYPES[format])
+
 @app.get("/getFlows/", response_model=List[Dict])
-def list_flows(db=Depends(get_db)):
+async def list_flows(
+    response: Response,
+    limit: int = Query(default=100, ge=1, le=1000),
+    after: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    db=Depends(get_db)
+):
+    """Lista fluxos paginados por cursor; o cursor da próxima página vem no cabeçalho X-Next-After."""
     manager = FlowManager(db)
-    return manager.list_flows()
+    flows, next_after = await manager.list_flows(limit=limit, after=after, is_active=is_active)
+    if next_after is not None:
+        response.headers["X-Next-After"] = next_after
+    return flows
 
 @app.get("/getFlowsById/{flow_id}", response_model=Dict)
-def get_flow(flow_id: str, db=Depends(get_db)):
+async def get_flow(flow_id: str, db=Depends(get_db)):
     manager = FlowManager(db)
-    flow = manager.get_flow(flow_id)
+    flow = await manager.get_flow(flow_id)
     if flow is None:
         raise HTTPException(status_code=404, detail="Fluxo não encontrado")
-    return flow.dict()
+    return flow.model_dump()
 
 @app.put("/updateFlows/{flow_id}", response_model=Dict)
-def update_flow(flow_id: str, flow: Flow, db=Depends(get_db)):
+async def update_flow(flow_id: str, flow: Flow, db=Depends(get_db)):
     manager = FlowManager(db)
     try:
-        updated_flow = Flow(**flow.dict())
-        manager.update_flow(flow_id, updated_flow)
+        updated_flow = Flow(**flow.model_dump())
+        await manager.update_flow(flow_id, updated_flow)
         return {"message": "Fluxo atualizado com sucesso"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/deleteFlows/{flow_id}", response_model=Dict)
-def delete_flow(flow_id: str, db=Depends(get_db)):
+async def delete_flow(flow_id: str, db=Depends(get_db)):
     manager = FlowManager(db)
     try:
-        manager.delete_flow(flow_id)
+        await manager.delete_flow(flow_id)
         return {"message": "Fluxo deletado com sucesso"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _flow_error(e: FlowRunError) -> HTTPException:
+    """Erro HTTP de uma execução com falha: 504 se o prazo esgotou, 500 nos demais casos.
+
+    Os passos concluídos vão no cabeçalho X-Completed-Steps e o id da
+    execução, que permite retomá-la em /runs/{run_id}/resume, em X-Run-Id.
+    """
+    headers = {"X-Completed-Steps": ",".join(e.completed_steps)}
+    if e.run_id is not None:
+        headers["X-Run-Id"] = e.run_id
+    if isinstance(e, FlowDeadlineExceeded):
+        detail = {"message": str(e), "completed_steps": e.completed_steps, "run_id": e.run_id}
+        return HTTPException(status_code=504, detail=detail, headers=headers)
+    return HTTPException(status_code=500, detail=str(e), headers=headers)
+
+async def _cancel_on_disconnect(http_request: Request, coro):
+    """Executa `coro` e a cancela se o cliente HTTP desconectar antes do fim."""
+    task = asyncio.ensure_future(coro)
+    disconnected = False
+
+    async def watch():
+        nonlocal disconnected
+        while not task.done():
+            if await http_request.is_disconnected():
+                logger.info("Cliente desconectado; cancelando a execução do fluxo")
+                disconnected = True
+                task.cancel()
+                return
+            await asyncio.sleep(settings.DISCONNECT_POLL_INTERVAL)
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if not disconnected:
+            raise
+        # Ninguém vai ler a resposta; 499 segue a convenção de "cliente fechou a requisição"
+        raise HTTPException(status_code=499, detail="Cliente desconectado")
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+
 @app.post("/flows/{flow_id}/exec_flow", response_model=Dict)
-def exec_flow(flow_id: str, request: FlowuserMessage, db=Depends(get_db)):
+async def exec_flow(
+    flow_id: str,
+    request: FlowuserMessage,
+    http_request: Request,
+    db=Depends(get_db),
+    model_client: ModelIntegration = Depends(get_model_client)
+):
     manager = FlowManager(db)
-    flow = manager.get_flow(flow_id)
+    flow = await manager.get_flow(flow_id)
     if flow is None:
         raise HTTPException(status_code=404, detail="Fluxo não encontrado")
     
-    model_client = ModelIntegration(api_key=settings.UFPB_OPENAI_API_KEY)
-    
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(
-            model_client.process_flow(user_message=request.user_message, flow=flow)
+        return await _cancel_on_disconnect(http_request, model_client.process_flow(
+            user_message=request.user_message, flow=flow, flow_id=flow_id, timeout=request.timeout
+        ))
+    except FlowRunError as e:
+        raise _flow_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/flows/{flow_id}/exec_flow/stream")
+async def exec_flow_stream(
+    flow_id: str,
+    request: FlowuserMessage,
+    db=Depends(get_db),
+    model_client: ModelIntegration = Depends(get_model_client)
+):
+    manager = FlowManager(db)
+    flow = await manager.get_flow(flow_id)
+    if flow is None:
+        raise HTTPException(status_code=404, detail="Fluxo não encontrado")
+
+    async def events():
+        async for event in model_client.process_flow_stream(
+            user_message=request.user_message, flow=flow, flow_id=flow_id, timeout=request.timeout
+        ):
+            yield _sse(event["event"], event["data"])
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/flows/{flow_id}/exec_batch")
+async def exec_batch(
+    flow_id: str,
+    http_request: Request,
+    concurrency: int = settings.BATCH_CONCURRENCY,
+    ordered: bool = True,
+    db=Depends(get_db),
+    model_client: ModelIntegration = Depends(get_model_client)
+):
+    """Executa o fluxo para cada linha NDJSON do corpo e devolve um resultado NDJSON por linha."""
+    if not 1 <= concurrency <= settings.BATCH_MAX_CONCURRENCY:
+        raise HTTPException(
+            status_code=422,
+            detail=f"concurrency deve estar entre 1 e {settings.BATCH_MAX_CONCURRENCY}"
         )
-        loop.close()
-        return result
+    manager = FlowManager(db)
+    flow = await manager.get_flow(flow_id)
+    if flow is None:
+        raise HTTPException(status_code=404, detail="Fluxo não encontrado")
+
+    # O corpo é lido antes de iniciar a resposta: a StreamingResponse passa a
+    # consumir o canal de recebimento para detectar desconexões.
+    body = await _spool_body(http_request, settings.BATCH_MAX_BODY_BYTES)
+    job = BatchJob(flow_id, concurrency=concurrency, ordered=ordered)
+    jobs = http_request.app.state.batch_jobs
+    jobs[job.id] = job
+
+    async def results():
+        try:
+            async for record in run_batch(model_client, flow, iter_lines(body), job):
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+        finally:
+            jobs.pop(job.id, None)
+            body.close()
+
+    return StreamingResponse(
+        results(),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Id": job.id}
+    )
+
+async def _spool_body(http_request: Request, max_bytes: int) -> tempfile.SpooledTemporaryFile:
+    """Copia o corpo, à medida que chega, para um arquivo temporário (em memória até BATCH_SPOOL_MEMORY_BYTES).
+
+    Corpos acima de `max_bytes` são recusados com 413.
+    """
+    too_large = HTTPException(status_code=413, detail=f"O corpo excede o limite de {max_bytes} bytes")
+    if int(http_request.headers.get("content-length") or 0) > max_bytes:
+        raise too_large
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.BATCH_SPOOL_MEMORY_BYTES)
+    size = 0
+    try:
+        async for chunk in http_request.stream():
+            size += len(chunk)
+            if size > max_bytes:
+                raise too_large
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+async def _spooled_lines(spool: tempfile.SpooledTemporaryFile, chunk_size: int = 64 * 1024):
+    """Linhas não vazias (em bytes) de um corpo copiado por `_spool_body`, lidas do início em blocos."""
+    async def chunks():
+        spool.seek(0)
+        while True:
+            chunk = spool.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    async for line in iter_chunk_lines(chunks()):
+        if line.strip():
+            yield line
+
+def _get_run_log(http_request: Request) -> RunLog:
+    run_log = http_request.app.state.run_log
+    if run_log is None:
+        raise HTTPException(status_code=503, detail="Registro de execuções desabilitado")
+    return run_log
+
+@app.post("/flows/{flow_id}/exec_argo", response_model=Dict)
+async def exec_argo(flow_id: str, request: FlowuserMessage, http_request: Request, db=Depends(get_db)):
+    """Compila o fluxo em um Workflow do Argo e o submete; os passos gravam suas saídas na execução retornada."""
+    run_log = _get_run_log(http_request)
+    manager = FlowManager(db)
+    if await manager.get_flow(flow_id) is None:
+        raise HTTPException(status_code=404, detail="Fluxo não encontrado")
+
+    try:
+        return await manager.execute_flow(flow_id, request.user_message, http_request.app.state.argo_client, run_log)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/flows/{flow_id}/exec_argo_batch", response_model=List[Dict])
+async def exec_argo_batch(
+    flow_id: str,
+    http_request: Request,
+    concurrency: int = settings.ARGO_SUBMIT_CONCURRENCY,
+    db=Depends(get_db)
+):
+    """Submete um workflow do Argo por linha NDJSON do corpo (mesmo formato de exec_batch).
+
+    O corpo tem o mesmo limite de exec_batch. Todas as linhas são validadas
+    antes da primeira submissão; depois são lidas de novo e submetidas em
+    grupos de 4x `concurrency`, sem manter o corpo inteiro em memória.
+    """
+    run_log = _get_run_log(http_request)
+    if not 1 <= concurrency <= settings.BATCH_MAX_CONCURRENCY:
+        raise HTTPException(
+            status_code=422,
+            detail=f"concurrency deve estar entre 1 e {settings.BATCH_MAX_CONCURRENCY}"
+        )
+    body = await _spool_body(http_request, settings.BATCH_MAX_BODY_BYTES)
+    try:
+        index = 0
+        async for line in _spooled_lines(body):
+            try:
+                parse_item(line, index)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=f"Linha {index}: {str(e)}")
+            index += 1
+
+        manager = FlowManager(db)
+        if await manager.get_flow(flow_id) is None:
+            raise HTTPException(status_code=404, detail="Fluxo não encontrado")
+
+        async def submit(items: List[Dict]) -> List[Dict]:
+            outcomes = await manager.execute_flow_batch(
+                flow_id, [item["user_message"] for item in items], http_request.app.state.argo_client, run_log,
+                concurrency=concurrency
+            )
+            return [{"id": item["id"], **outcome} for item, outcome in zip(items, outcomes)]
+
+        results: List[Dict] = []
+        group: List[Dict] = []
+        index = 0
+        try:
+            async for line in _spooled_lines(body):
+                group.append(parse_item(line, index))
+                index += 1
+                if len(group) >= 4 * concurrency:
+                    results += await submit(group)
+                    group = []
+            if group:
+                results += await submit(group)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        return results
+    finally:
+        body.close()
+
+@app.get("/workflows/{workflow_name}", response_model=Dict)
+async def get_workflow(workflow_name: str, http_request: Request):
+    """Status de um workflow do Argo: fase e fase de cada passo."""
+    try:
+        return await http_request.app.state.argo_client.get_status(workflow_name)
+    except ArgoError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+@app.get("/runs/{run_id}", response_model=Dict)
+async def get_run(run_id: str, http_request: Request):
+    run = await _get_run_log(http_request).load(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Execução não encontrada")
+    return run
+
+@app.post("/runs/{run_id}/resume", response_model=Dict)
+async def resume_run(
+    run_id: str,
+    http_request: Request,
+    timeout: Optional[float] = Query(default=None, gt=0),
+    model_client: ModelIntegration = Depends(get_model_client)
+):
+    """Retoma uma execução com falha a partir do último passo concluído, reaproveitando as saídas gravadas.
+
+    Execuções ainda em andamento recebem 409, a menos que estejam sem
+    atualização há mais de RUN_STALE_AFTER segundos.
+    """
+    run_log = _get_run_log(http_request)
+    run = await run_log.claim(run_id)
+    if run is None:
+        run = await run_log.load(run_id)
+        if run is None:
+            raise HTTPException(status_code=404, detail="Execução não encontrada")
+        if run["status"] == "done":
+            raise HTTPException(status_code=409, detail="A execução já foi concluída")
+        raise HTTPException(status_code=409, detail="A execução ainda está em andamento")
+
+    try:
+        return await _cancel_on_disconnect(http_request, model_client.resume_flow(run, timeout=timeout))
+    except FlowRunError as e:
+        raise _flow_error(e)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+class FlowJobRequest(FlowuserMessage):
+    callback_url: Optional[str] = Field(default=None, example="https://exemplo.com/callbacks/flows")
+
+def _job_view(job: Dict) -> Dict:
+    return {
+        "job_id": job["_id"],
+        "flow_id": job["flow_id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "run_id": job.get("run_id"),
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+@app.post("/flows/{flow_id}/jobs", response_model=Dict, status_code=202)
+async def submit_job(flow_id: str, request: FlowJobRequest, http_request: Request, db=Depends(get_db)):
+    """Enfileira a execução do fluxo e retorna o id do job sem esperar o resultado.
+
+    O job é executado por qualquer worker (embutido em uma réplica da API ou
+    standalone, `python src/job_queue.py`). Acompanhe por /jobs/{job_id},
+    /jobs/{job_id}/wait ou pelo POST em `callback_url` ao final.
+    """
+    flow = await FlowManager(db).get_flow(flow_id)
+    if flow is None:
+        raise HTTPException(status_code=404, detail="Fluxo não encontrado")
+    if not flow.is_active:
+        raise HTTPException(status_code=400, detail="O fluxo não está ativo")
+    job_id = await http_request.app.state.job_queue.submit(
+        flow_id, request.user_message, timeout=request.timeout, callback_url=request.callback_url
+    )
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/jobs/", response_model=Dict)
+async def get_job_counts(http_request: Request):
+    """Quantidade de jobs por status."""
+    return await http_request.app.state.job_queue.counts()
+
+@app.get("/jobs/{job_id}", response_model=Dict)
+async def get_job(job_id: str, http_request: Request):
+    job = await http_request.app.state.job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return _job_view(job)
+
+@app.get("/jobs/{job_id}/wait", response_model=Dict)
+async def wait_job(job_id: str, http_request: Request, timeout: float = Query(default=30.0, gt=0, le=300)):
+    """Long polling: responde quando o job termina ou após `timeout` segundos, com o estado atual."""
+    job = await http_request.app.state.job_queue.wait(job_id, timeout)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return _job_view(job)
+
+@app.get("/batches/", response_model=List[Dict])
+def list_batches(http_request: Request):
+    return [job.progress() for job in http_request.app.state.batch_jobs.values()]
+
+@app.get("/batches/{batch_id}", response_model=Dict)
+def get_batch(batch_id: str, http_request: Request):
+    job = http_request.app.state.batch_jobs.get(batch_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Lote não encontrado")
+    return job.progress()
+
+@app.get("/stats/", response_model=Dict)
+def get_stats(http_request: Request):
+    """Contadores de cache, coalescência de chamadas, limites por deployment e orçamentos de hedge."""
+    state = http_request.app.state
+    return {
+        "response_cache": {"hits": state.response_cache.hits, "misses": state.response_cache.misses},
+        "flow_cache": {"hits": flow_cache.hits, "misses": flow_cache.misses, "watch": flow_cache.watch_status},
+        "semantic_cache": state.semantic_cache.stats(),
+        "coalescing": state.coalescer.stats(),
+        "rate_limits": state.rate_limits.stats(),
+        "run_log": state.run_log.stats() if state.run_log is not None else None,
+        "hedging": state.hedging.stats(),
+        "job_worker": state.job_worker.stats() if state.job_worker is not None else None,
+        "warm_up": state.warm_up.status(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces/", response_model=List[List[Dict]])
+def list_traces(limit: int = Query(default=50, ge=1, le=1000)):
+    """Traces recentes de process_flow: cada trace é a lista de spans (raiz e passos)."""
+    return exporter.traces(limit)
\ No newline at end of file
@@ -0,0 +1,136 @@
+import asyncio
+import time
+from typing import List, Dict, Any, Optional
+import logging
+import aiohttp
+from rate_limit import RETRYABLE_STATUS, backoff_delay
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FINAL_PHASES = {"Succeeded", "Failed", "Error"}
+
+class ArgoError(ValueError):
+    """Resposta de erro do servidor do Argo."""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+class ArgoClient:
+    """Cliente assíncrono da API do Argo Server, sobre a sessão HTTP compartilhada.
+
+    Submissões com erro transitório (5xx, 429 ou falha de conexão) são
+    repetidas com backoff; `submit_many` envia lotes de workflows com
+    concorrência limitada e `wait` acompanha o status por polling.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        base_url: str = settings.ARGO_SERVER_URL,
+        namespace: str = settings.ARGO_NAMESPACE,
+        token: Optional[str] = settings.ARGO_TOKEN,
+        max_retries: int = 3,
+    ):
+        self.session = session
+        self.base_url = base_url.rstrip("/")
+        self.namespace = namespace
+        self.max_retries = max_retries
+        self.headers = {"Content-Type": "application/json"}
+        if token:
+            self.headers["Authorization"] = token if token.startswith("Bearer ") else f"Bearer {token}"
+
+    def _url(self, name: Optional[str] = None) -> str:
+        url = f"{self.base_url}/api/v1/workflows/{self.namespace}"
+        return f"{url}/{name}" if name else url
+
+    async def _call(self, method: str, url: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            try:
+                async with self.session.request(method, url, json=payload, headers=self.headers) as response:
+                    if response.status == 200:
+                        return await response.json()
+                    text = await response.text()
+                    error: Exception = ArgoError(f"Erro do Argo ({response.status}): {text}", response.status)
+                    if response.status not in RETRYABLE_STATUS:
+                        raise error
+            except aiohttp.ClientError as e:
+                error = ValueError(f"Erro de conexão com o Argo: {str(e)}")
+            if attempt >= self.max_retries:
+                raise error
+            delay = backoff_delay(attempt, base=0.5, cap=10.0)
+            logger.warning(f"{error}; nova tentativa em {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def submit(self, workflow: Dict[str, Any]) -> str:
+        """Submete um Workflow e retorna o nome gerado pelo Argo."""
+        created = await self._call("POST", self._url(), {"workflow": workflow})
+        name = created["metadata"]["name"]
+        logger.info(f"Workflow {name} submetido")
+        return name
+
+    async def submit_many(
+        self,
+        workflows: List[Dict[str, Any]],
+        concurrency: int = settings.ARGO_SUBMIT_CONCURRENCY,
+    ) -> List[Dict[str, Any]]:
+        """Submete vários workflows; retorna, na mesma ordem, `{"name"}` ou `{"error"}` por item."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def submit_one(workflow: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return {"name": await self.submit(workflow)}
+                except ValueError as e:
+                    return {"error": str(e)}
+
+        return list(await asyncio.gather(*(submit_one(workflow) for workflow in workflows)))
+
+    async def get_status(self, name: str) -> Dict[str, Any]:
+        """Resumo do status: fase, horários, mensagem e a fase de cada passo do DAG."""
+        workflow = await self._call("GET", self._url(name))
+        status = workflow.get("status", {})
+        nodes = {
+            node.get("displayName"): node.get("phase")
+            for node in status.get("nodes", {}).values()
+            if node.get("type") in ("Pod", "Retry", "Skipped", "Omitted")
+        }
+        return {
+            "name": name,
+            "phase": status.get("phase", "Pending"),
+            "started_at": status.get("startedAt"),
+            "finished_at": status.get("finishedAt"),
+            "message": status.get("message"),
+            "nodes": nodes,
+        }
+
+    async def wait(
+        self,
+        name: str,
+        interval: float = settings.ARGO_POLL_INTERVAL,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Consulta o workflow até uma fase final (Succeeded, Failed ou Error)."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            status = await self.get_status(name)
+            if status["phase"] in FINAL_PHASES:
+                return status
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Workflow {name} não terminou em {timeout}s")
+            await asyncio.sleep(interval)
+
+    async def wait_many(
+        self,
+        names: List[str],
+        interval: float = settings.ARGO_POLL_INTERVAL,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        return list(await asyncio.gather(*(self.wait(name, interval, timeout) for name in names)))
+
+    async def delete(self, name: str):
+        await self._call("DELETE", self._url(name))
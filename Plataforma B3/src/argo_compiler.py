@@ -0,0 +1,147 @@
+import re
+from typing import List, Dict, Any, Optional
+import logging
+from flow_manager import Flow, FlowStep
+from flow_executor import FlowGraph
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ROUTE_FILE = "/tmp/route"
+
+def task_names(graph: FlowGraph) -> Dict[str, str]:
+    """Nomes de tarefa válidos no Argo (minúsculas, dígitos e hífens), únicos por passo."""
+    names: Dict[str, str] = {}
+    used = set()
+    for step_name in graph.order:
+        base = re.sub(r"[^a-z0-9-]+", "-", step_name.lower()).strip("-")[:50] or "passo"
+        name, suffix = base, 2
+        while name in used:
+            name = f"{base}-{suffix}"
+            suffix += 1
+        used.add(name)
+        names[step_name] = name
+    return names
+
+def _depends(deps: List[str], names: Dict[str, str]) -> Optional[str]:
+    """Expressão `depends` equivalente à regra do FlowExecutor.
+
+    O passo espera todas as dependências terminarem (executadas, puladas ou
+    omitidas) e só roda se pelo menos uma delas tiver sido executada.
+    """
+    if not deps:
+        return None
+    if len(deps) == 1:
+        return f"{names[deps[0]]}.Succeeded"
+    finished = [f"({names[dep]}.Succeeded || {names[dep]}.Skipped || {names[dep]}.Omitted)" for dep in deps]
+    any_succeeded = "(" + " || ".join(f"{names[dep]}.Succeeded" for dep in deps) + ")"
+    return " && ".join(finished + [any_succeeded])
+
+def route_tokens(router: FlowStep, labels: List[str]) -> str:
+    """Rota gravada pelo router em ROUTE_FILE: ",r0,r2,", com a posição de cada rótulo em `conditions`.
+
+    Os rótulos são texto livre; as posições mantêm aspas, espaços e
+    caracteres especiais fora da expressão `when`.
+    """
+    positions = list(router.conditions or {})
+    return "," + ",".join(f"r{positions.index(label)}" for label in labels) + ","
+
+def _when(router_task: str, router: FlowStep, label: str) -> str:
+    return f"'{{{{tasks.{router_task}.outputs.parameters.route}}}}' =~ '{route_tokens(router, [label])}'"
+
+def _step_template(image: str, env_secret: str, retry_limit: int) -> Dict[str, Any]:
+    return {
+        "name": "run-step",
+        "inputs": {"parameters": [{"name": "step_name"}]},
+        "outputs": {"parameters": [
+            {"name": "route", "valueFrom": {"path": ROUTE_FILE, "default": ","}}
+        ]},
+        "retryStrategy": {
+            "limit": str(retry_limit),
+            "retryPolicy": "Always",
+            "backoff": {"duration": "5s", "factor": "2", "maxDuration": "5m"},
+        },
+        "container": {
+            "image": image,
+            "command": ["python", "src/argo_step.py"],
+            "args": ["{{workflow.parameters.run_id}}", "{{inputs.parameters.step_name}}"],
+            "envFrom": [{"secretRef": {"name": env_secret}}],
+        },
+    }
+
+def _finish_template(image: str, env_secret: str) -> Dict[str, Any]:
+    return {
+        "name": "finish-run",
+        "container": {
+            "image": image,
+            "command": ["python", "src/argo_step.py"],
+            "args": ["{{workflow.parameters.run_id}}", "--finish", "{{workflow.status}}"],
+            "envFrom": [{"secretRef": {"name": env_secret}}],
+        },
+    }
+
+def compile_workflow(
+    flow: Flow,
+    run_id: str,
+    flow_id: Optional[str] = None,
+    image: str = settings.ARGO_IMAGE,
+    env_secret: str = settings.ARGO_ENV_SECRET,
+    retry_limit: int = settings.ARGO_RETRY_LIMIT,
+    service_account: Optional[str] = settings.ARGO_SERVICE_ACCOUNT,
+) -> Dict[str, Any]:
+    """Compila um fluxo em um Workflow do Argo com um template DAG.
+
+    Cada passo vira uma tarefa do DAG com as mesmas dependências do
+    FlowGraph, então ramos independentes rodam em paralelo; passos com
+    `execute_if` recebem uma condição `when` sobre a rota escolhida pelo
+    router. Os contêineres executam `argo_step.py`, que lê e grava as saídas
+    dos passos na execução `run_id` do registro de execuções, e o `onExit`
+    fecha a execução com o status final do workflow.
+    """
+    graph = FlowGraph(flow)
+    names = task_names(graph)
+    router_for_label = {
+        label: step.step_name for step in graph.steps.values() if step.is_router for label in step.conditions
+    }
+
+    tasks = []
+    for step_name in graph.order:
+        step = graph.steps[step_name]
+        task: Dict[str, Any] = {
+            "name": names[step_name],
+            "template": "run-step",
+            "arguments": {"parameters": [{"name": "step_name", "value": step_name}]},
+        }
+        depends = _depends(graph.dependencies[step_name], names)
+        if depends:
+            task["depends"] = depends
+        if step.execute_if is not None:
+            router = router_for_label[step.execute_if]
+            task["when"] = _when(names[router], graph.steps[router], step.execute_if)
+        tasks.append(task)
+
+    generate_name = re.sub(r"[^a-z0-9-]+", "-", flow.name.lower()).strip("-")[:40] or "fluxo"
+    spec: Dict[str, Any] = {
+        "entrypoint": "flow",
+        "onExit": "finish-run",
+        "arguments": {"parameters": [{"name": "run_id", "value": run_id}]},
+        "templates": [
+            {"name": "flow", "dag": {"tasks": tasks}},
+            _step_template(image, env_secret, retry_limit),
+            _finish_template(image, env_secret),
+        ],
+    }
+    if service_account:
+        spec["serviceAccountName"] = service_account
+
+    return {
+        "apiVersion": "argoproj.io/v1alpha1",
+        "kind": "Workflow",
+        "metadata": {
+            "generateName": f"{generate_name}-",
+            "labels": {"app": "plataforma-b3"},
+            "annotations": {"plataforma-b3/flow-id": flow_id or "", "plataforma-b3/run-id": run_id},
+        },
+        "spec": spec,
+    }
@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import logging
+from flow_manager import Flow
+from flow_executor import FlowGraph, FlowExecutor, StepResult
+from argo_compiler import ROUTE_FILE, route_tokens
+from run_log import RunLog, completed_steps
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def run_step(run_id: str, step_name: str):
+    """Executa um passo de uma execução registrada; ponto de entrada das tarefas do workflow."""
+    from database import get_runs_collection
+    from http_client import HTTPClientPool
+    from model_integration import build_model_client
+
+    run_log = RunLog(get_runs_collection())
+    try:
+        run = await run_log.load(run_id)
+        if run is None:
+            raise ValueError(f"Execução {run_id} não encontrada")
+        flow = Flow(**run["flow"])
+        completed = completed_steps(run)
+        if step_name in completed:
+            # Nova tentativa de uma tarefa cujo passo já foi gravado
+            result = completed[step_name]
+        else:
+            http_client = HTTPClientPool()
+            await http_client.start()
+            try:
+                model_client = build_model_client(http_client.session)
+                if next(step for step in flow.steps if step.step_name == step_name).semantic_cache:
+                    await model_client.semantic_cache.load()
+                executor = FlowExecutor(
+                    FlowGraph(flow),
+                    model_client.process_step,
+                    on_result=lambda result: run_log.record_step(run_id, result)
+                )
+                result = await executor.run_node(step_name, completed, run["user_message"])
+            finally:
+                await http_client.close()
+    finally:
+        await run_log.close()
+
+    with open(ROUTE_FILE, "w", encoding="utf-8") as route_file:
+        step = next(step for step in flow.steps if step.step_name == step_name)
+        route_file.write(route_tokens(step, result.route))
+    logger.info(f"Passo '{step_name}' da execução {run_id}: {result.status}")
+
+async def finish_run(run_id: str, workflow_status: str):
+    """Fecha a execução com o status final do workflow (handler onExit)."""
+    from database import get_runs_collection
+
+    run_log = RunLog(get_runs_collection())
+    try:
+        run = await run_log.load(run_id)
+        if run is None:
+            raise ValueError(f"Execução {run_id} não encontrada")
+        if workflow_status == "Succeeded":
+            graph = FlowGraph(Flow(**run["flow"]))
+            completed = completed_steps(run)
+            results = {
+                name: completed.get(name) or StepResult(step_name=name, status="skipped")
+                for name in graph.order
+            }
+            final_response = FlowExecutor(graph, None).final_response(results, run["user_message"])
+            run_log.finish_run(run_id, "done", final_response=final_response)
+        else:
+            run_log.finish_run(run_id, "failed", error=f"Workflow terminou com status {workflow_status}")
+    finally:
+        await run_log.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa um passo de fluxo dentro de uma tarefa do Argo.")
+    parser.add_argument("run_id")
+    parser.add_argument("step_name", nargs="?")
+    parser.add_argument("--finish", metavar="STATUS", help="Fecha a execução com o status do workflow")
+    args = parser.parse_args()
+    if args.finish:
+        asyncio.run(finish_run(args.run_id, args.finish))
+    elif args.step_name:
+        asyncio.run(run_step(args.run_id, args.step_name))
+    else:
+        parser.error("informe step_name ou --finish")
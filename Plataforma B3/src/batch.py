@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from typing import Dict, Any, Optional, AsyncIterable, AsyncIterator, Iterable, Union
+import logging
+from flow_manager import Flow
+from model_integration import ModelIntegration, FlowRunError, build_model_client
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class BatchJob:
+    """Contadores de progresso de uma execução em lote."""
+
+    def __init__(self, flow_id: str, concurrency: int, ordered: bool):
+        self.id = str(uuid.uuid4())
+        self.flow_id = flow_id
+        self.concurrency = concurrency
+        self.ordered = ordered
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.finished = False
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+
+    def progress(self) -> Dict[str, Any]:
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        done = self.completed + self.failed
+        return {
+            "id": self.id,
+            "flow_id": self.flow_id,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "in_flight": self.submitted - done,
+            "finished": self.finished,
+            "elapsed_seconds": round(elapsed, 3),
+            "items_per_second": round(done / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+
+def parse_item(line: Union[str, bytes], index: int) -> Dict[str, Any]:
+    """Converte uma linha NDJSON em item; aceita objeto com `user_message` (e `timeout` opcional) ou string JSON.
+
+    Linhas em bytes são decodificadas aqui, para que uma linha inválida em
+    UTF-8 vire erro do próprio item.
+    """
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    item = json.loads(line)
+    if isinstance(item, str):
+        item = {"user_message": item}
+    if not isinstance(item, dict) or not item.get("user_message"):
+        raise ValueError("Cada linha deve conter 'user_message'")
+    item.setdefault("id", index)
+    return item
+
+async def iter_lines(source: Iterable[Union[str, bytes]]) -> AsyncIterator[Union[str, bytes]]:
+    """Produz as linhas não vazias de um arquivo ou de um corpo já dividido em linhas, sem decodificá-las."""
+    for line in source:
+        if line.strip():
+            yield line
+
+async def run_batch(
+    model_client: ModelIntegration,
+    flow: Flow,
+    lines: AsyncIterable[Union[str, bytes]],
+    job: BatchJob,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Executa `process_flow` para cada linha de entrada e produz um resultado por linha.
+
+    A concorrência é limitada por `job.concurrency`. Em modo ordenado os
+    resultados saem na ordem da entrada e no máximo 4x `concurrency` itens
+    ficam pendentes; caso contrário saem na ordem de conclusão. Falhas
+    (inclusive linhas ilegíveis) são reportadas por item, com `index` e `id`,
+    e não interrompem o lote. Um erro ao ler a entrada cancela os itens em
+    andamento e é repassado a quem consome os resultados.
+    """
+    running = asyncio.Semaphore(job.concurrency)
+    pending_window = asyncio.Semaphore(job.concurrency * 4)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def run_item(index: int, line: Union[str, bytes]):
+        item_id = index
+        try:
+            item = parse_item(line, index)
+            item_id = item["id"]
+            result = await model_client.process_flow(
+                user_message=item["user_message"], flow=flow, flow_id=job.flow_id, timeout=item.get("timeout")
+            )
+            job.completed += 1
+            record = {"index": index, "id": item_id, "status": "ok", "result": result}
+        except Exception as e:
+            job.failed += 1
+            record = {"index": index, "id": item_id, "status": "error", "error": str(e)}
+            if isinstance(e, FlowRunError):
+                record["completed_steps"] = e.completed_steps
+                if e.run_id is not None:
+                    record["run_id"] = e.run_id
+        finally:
+            running.release()
+        await results.put(record)
+
+    async def produce():
+        tasks = []
+        index = 0
+        try:
+            async for line in lines:
+                if job.ordered:
+                    await pending_window.acquire()
+                await running.acquire()
+                job.submitted += 1
+                tasks.append(asyncio.ensure_future(run_item(index, line)))
+                index += 1
+            await asyncio.gather(*tasks)
+        finally:
+            # Sem o sentinela o consumidor esperaria para sempre
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            results.put_nowait(None)
+
+    producer = asyncio.ensure_future(produce())
+    buffered: Dict[int, Dict[str, Any]] = {}
+    next_index = 0
+    try:
+        while True:
+            record = await results.get()
+            if record is None:
+                break
+            if not job.ordered:
+                yield record
+                continue
+            buffered[record["index"]] = record
+            while next_index in buffered:
+                yield buffered.pop(next_index)
+                pending_window.release()
+                next_index += 1
+        await producer
+    finally:
+        if not producer.done():
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+        job.finished = True
+        job.finished_at = time.monotonic()
+
+async def _main(args):
+    from database import get_db, get_runs_collection
+    from flow_manager import FlowManager
+    from http_client import HTTPClientPool
+    from run_log import RunLog
+
+    manager = FlowManager(next(get_db()))
+    flow = await manager.get_flow(args.flow_id)
+    if flow is None:
+        raise SystemExit(f"Fluxo {args.flow_id} não encontrado")
+
+    http_client = HTTPClientPool()
+    await http_client.start()
+    run_log = RunLog(get_runs_collection()) if settings.RUN_LOG_ENABLED else None
+    if run_log is not None:
+        await run_log.start()
+    model_client = build_model_client(http_client.session, run_log=run_log)
+    await model_client.semantic_cache.load()
+    job = BatchJob(args.flow_id, concurrency=args.concurrency, ordered=not args.unordered)
+
+    source = open(args.input, "rb") if args.input != "-" else sys.stdin.buffer
+    output = open(args.output, "w", encoding="utf-8") if args.output != "-" else sys.stdout
+    try:
+        async for record in run_batch(model_client, flow, iter_lines(source), job):
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if (job.completed + job.failed) % args.progress_every == 0:
+                logger.info(f"Progresso: {job.progress()}")
+    finally:
+        if run_log is not None:
+            await run_log.close()
+        await http_client.close()
+        if source is not sys.stdin.buffer:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    logger.info(f"Lote concluído: {job.progress()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa um fluxo sobre um arquivo NDJSON de entradas.")
+    parser.add_argument("flow_id")
+    parser.add_argument("input", help="Arquivo NDJSON de entrada ('-' para stdin)")
+    parser.add_argument("-o", "--output", default="-", help="Arquivo NDJSON de saída ('-' para stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=settings.BATCH_CONCURRENCY)
+    parser.add_argument("--unordered", action="store_true", help="Emite resultados na ordem de conclusão")
+    parser.add_argument("--progress-every", type=int, default=100)
+    asyncio.run(_main(parser.parse_args()))
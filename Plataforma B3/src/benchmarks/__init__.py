@@ -0,0 +1,9 @@
+"""Benchmarks offline do caminho de execução de fluxos e servidores falsos usados nos testes locais.
+
+Uso (a partir de `src/`):
+
+    python -m benchmarks.run --mode direct --concurrency 1,8,32
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.mock_server --port 8911
+    python -m benchmarks.fake_argo --port 2746
+"""
@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import random
+import re
+import string
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+import logging
+from aiohttp import web
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _timestamp(value: float) -> str:
+    return datetime.fromtimestamp(value, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class FakeArgoServer:
+    """Servidor local que imita a API de workflows do Argo Server.
+
+    Valida a estrutura básica do Workflow submetido (entrypoint, templates e
+    referências do DAG) e simula a execução: o workflow fica `Running` por
+    `duration` segundos e termina `Succeeded`, ou `Failed` com probabilidade
+    `fail_rate`. Nada é executado de fato.
+    """
+
+    def __init__(self, duration: float = 0.5, fail_rate: float = 0.0, host: str = "127.0.0.1", port: int = 0, seed: Optional[int] = None):
+        self.duration = duration
+        self.fail_rate = fail_rate
+        self.host = host
+        self.port = port
+        self.rng = random.Random(seed)
+        self.workflows: Dict[str, Dict[str, Any]] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        """Valor para ARGO_SERVER_URL apontando para este servidor."""
+        return f"http://{self.host}:{self.port}"
+
+    def _validate(self, workflow: Dict[str, Any]) -> Optional[str]:
+        if workflow.get("kind") != "Workflow":
+            return "kind deve ser Workflow"
+        spec = workflow.get("spec", {})
+        templates = {template.get("name"): template for template in spec.get("templates", [])}
+        if spec.get("entrypoint") not in templates:
+            return f"entrypoint '{spec.get('entrypoint')}' sem template"
+        if spec.get("onExit") and spec["onExit"] not in templates:
+            return f"onExit '{spec['onExit']}' sem template"
+        for template in templates.values():
+            tasks = template.get("dag", {}).get("tasks", [])
+            names = {task["name"] for task in tasks}
+            for task in tasks:
+                if task.get("template") not in templates:
+                    return f"tarefa '{task['name']}' usa template inexistente"
+                for reference in re.findall(r"([a-z0-9-]+)\.(?:Succeeded|Skipped|Omitted|Failed)", task.get("depends", "")):
+                    if reference not in names:
+                        return f"tarefa '{task['name']}' depende de tarefa inexistente '{reference}'"
+        return None
+
+    def _status(self, workflow: Dict[str, Any]) -> Dict[str, Any]:
+        state = workflow["_fake"]
+        elapsed = time.time() - state["created_at"]
+        tasks = [
+            task
+            for template in workflow["spec"]["templates"]
+            if template["name"] == workflow["spec"]["entrypoint"]
+            for task in template.get("dag", {}).get("tasks", [])
+        ]
+        if elapsed < self.duration:
+            phase, finished_at = "Running", None
+            node_phase = "Running"
+        else:
+            phase = state["final_phase"]
+            finished_at = _timestamp(state["created_at"] + self.duration)
+            node_phase = phase
+        nodes = {
+            f"{workflow['metadata']['name']}-{index}": {"displayName": task["name"], "type": "Pod", "phase": node_phase}
+            for index, task in enumerate(tasks)
+        }
+        return {
+            "phase": phase,
+            "startedAt": _timestamp(state["created_at"]),
+            "finishedAt": finished_at,
+            "message": "simulação" if phase == "Failed" else None,
+            "nodes": nodes,
+        }
+
+    async def create(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        workflow = body.get("workflow") or {}
+        error = self._validate(workflow)
+        if error:
+            return web.json_response({"code": 3, "message": error}, status=400)
+        suffix = "".join(self.rng.choices(string.ascii_lowercase + string.digits, k=5))
+        metadata = dict(workflow.get("metadata", {}))
+        metadata["name"] = metadata.get("name") or f"{metadata.get('generateName', 'workflow-')}{suffix}"
+        metadata["namespace"] = request.match_info["namespace"]
+        workflow = {**workflow, "metadata": metadata}
+        workflow["_fake"] = {
+            "created_at": time.time(),
+            "final_phase": "Failed" if self.rng.random() < self.fail_rate else "Succeeded",
+        }
+        self.workflows[metadata["name"]] = workflow
+        return web.json_response({key: value for key, value in workflow.items() if key != "_fake"})
+
+    async def get(self, request: web.Request) -> web.Response:
+        workflow = self.workflows.get(request.match_info["name"])
+        if workflow is None:
+            return web.json_response({"code": 5, "message": "workflow não encontrado"}, status=404)
+        body = {key: value for key, value in workflow.items() if key != "_fake"}
+        body["status"] = self._status(workflow)
+        return web.json_response(body)
+
+    async def delete(self, request: web.Request) -> web.Response:
+        if self.workflows.pop(request.match_info["name"], None) is None:
+            return web.json_response({"code": 5, "message": "workflow não encontrado"}, status=404)
+        return web.json_response({})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/api/v1/workflows/{namespace}", self.create)
+        app.router.add_get("/api/v1/workflows/{namespace}/{name}", self.get)
+        app.router.add_delete("/api/v1/workflows/{namespace}/{name}", self.delete)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"Argo falso em {self.base_url}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+async def _serve(args):
+    server = FakeArgoServer(duration=args.duration, fail_rate=args.fail_rate, host=args.host, port=args.port, seed=args.seed)
+    await server.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API de workflows do Argo.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2746)
+    parser.add_argument("--duration", type=float, default=0.5, help="Tempo (s) até o workflow terminar")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,171 @@
+import argparse
+import asyncio
+import json
+import random
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional
+import logging
+from aiohttp import web
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+@dataclass
+class LatencyDistribution:
+    """Distribuição de latência do mock: fixed, uniform, normal ou lognormal (segundos)."""
+    kind: str = "fixed"
+    a: float = 0.05
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        """Lê especificações como `fixed:0.05`, `uniform:0.02:0.1` ou `lognormal:0.05:0.5`.
+
+        Para `normal`, os parâmetros são média e desvio; para `lognormal`,
+        mediana e sigma.
+        """
+        kind, *params = spec.split(":")
+        values = [float(param) for param in params]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Distribuição de latência desconhecida: {kind}")
+        return cls(kind, *values)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b)
+        if self.kind == "normal":
+            return max(rng.gauss(self.a, self.b), 0.0)
+        if self.kind == "lognormal":
+            return self.a * rng.lognormvariate(0.0, self.b)
+        return self.a
+
+@dataclass
+class MockConfig:
+    latency: LatencyDistribution = field(default_factory=LatencyDistribution)
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: float = 0.1
+    completion_tokens: int = 8
+    stream_chunks: int = 8
+    seed: Optional[int] = None
+
+class MockAzureServer:
+    """Servidor local que imita o endpoint chat/completions do Azure OpenAI."""
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockConfig()
+        self.host = host
+        self.port = port
+        self.rng = random.Random(self.config.seed)
+        self.requests = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        """Valor para UFPB_OPENAI_API_BASE apontando para este servidor."""
+        return f"http://{self.host}:{self.port}/"
+
+    def _answer(self, body: Dict[str, Any], deployment: str) -> str:
+        user_message = body["messages"][-1]["content"]
+        words = [f"{deployment}-{index}" for index in range(self.config.completion_tokens)]
+        return " ".join(words) if user_message else ""
+
+    def _usage(self, body: Dict[str, Any]) -> Dict[str, int]:
+        prompt_tokens = sum(len(message.get("content") or "") for message in body["messages"]) // 4
+        completion_tokens = self.config.completion_tokens
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        deployment = request.match_info["deployment"]
+        body = await request.json()
+        roll = self.rng.random()
+        if roll < self.config.throttle_rate:
+            return web.json_response(
+                {"error": {"code": "429", "message": "Rate limit is exceeded."}},
+                status=429,
+                headers={"Retry-After": str(self.config.retry_after)},
+            )
+        if roll < self.config.throttle_rate + self.config.error_rate:
+            return web.json_response({"error": {"code": "500", "message": "Mock failure."}}, status=500)
+
+        latency = self.config.latency.sample(self.rng)
+        answer = self._answer(body, deployment)
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return web.json_response({
+                "id": f"mock-{self.requests}",
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": self._usage(body),
+            })
+
+        # Em streaming, a latência é dividida entre o primeiro byte e os chunks
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        words = answer.split(" ")
+        chunks = max(min(self.config.stream_chunks, len(words)), 1)
+        size = -(-len(words) // chunks)
+        for index in range(0, len(words), size):
+            await asyncio.sleep(latency / chunks)
+            delta = " ".join(words[index:index + size]) + (" " if index + size < len(words) else "")
+            chunk = {"choices": [{"index": 0, "delta": {"content": delta}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/openai/deployments/{deployment}/chat/completions", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"Mock do Azure OpenAI em {self.base_url}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+def config_from_args(args) -> MockConfig:
+    return MockConfig(
+        latency=LatencyDistribution.parse(args.latency),
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        completion_tokens=args.completion_tokens,
+        seed=args.seed,
+    )
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", default="fixed:0.05", help="fixed:S | uniform:MIN:MAX | normal:MEAN:STD | lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de respostas 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fração de respostas 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After (s) das respostas 429")
+    parser.add_argument("--completion-tokens", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=None)
+
+async def _serve(args):
+    server = MockAzureServer(config_from_args(args), host=args.host, port=args.port)
+    await server.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock local do endpoint chat/completions do Azure OpenAI.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8911)
+    add_mock_arguments(parser)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from typing import Dict, Any, List, Callable, Awaitable
+import logging
+import aiohttp
+from benchmarks.mock_server import MockAzureServer, add_mock_arguments, config_from_args
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+# Variáveis obrigatórias do config.Settings; no modo offline apontam para o mock
+OFFLINE_ENV = {
+    "UFPB_OPENAI_API_KEY": "benchmark",
+    "UFPB_OPENAI_API_BASE": "http://127.0.0.1:8911/",
+    "UFPB_OPENAI_API_VERSION": "2024-02-01",
+    "UFPB_OPENAI_EMBEDDING_DEPLOYMENT": "text-embedding-3-small",
+    "COSMOSDB_URL": "mongodb://127.0.0.1:27017/?serverSelectionTimeoutMS=2000",
+}
+
+# Fluxos usados nos cenários; o modo HTTP cria o fluxo via /createFlows/ quando --flow-id não é informado
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "chain": {
+        "name": "benchmark-chain",
+        "description": "Três passos sequenciais",
+        "steps": [
+            {"step_name": f"passo_{order}", "step_order": order, "system_prompt": f"Passo {order}: resuma o texto.", "max_tokens": 50}
+            for order in (1, 2, 3)
+        ],
+    },
+    "fanout": {
+        "name": "benchmark-fanout",
+        "description": "Um passo, três ramos paralelos e uma consolidação",
+        "steps": [
+            {"step_name": "entrada", "step_order": 1, "system_prompt": "Normalize o texto.", "max_tokens": 50},
+            {"step_name": "resumo", "step_order": 2, "system_prompt": "Resuma o texto.", "max_tokens": 50},
+            {"step_name": "sentimento", "step_order": 2, "system_prompt": "Classifique o sentimento.", "max_tokens": 50, "model": "gpt-4o-mini"},
+            {"step_name": "entidades", "step_order": 2, "system_prompt": "Extraia as entidades.", "max_tokens": 50, "model": "gpt-4o-mini"},
+            {"step_name": "consolidacao", "step_order": 3, "system_prompt": "Consolide as análises.", "max_tokens": 50},
+        ],
+    },
+}
+
+USER_MESSAGE = "Prezados, solicito a segunda via do boleto referente ao contrato 1234, vencido ontem."
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentil por interpolação linear entre os pontos vizinhos."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é dado em bytes no macOS e em KiB no Linux
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+async def run_level(call: Callable[[], Awaitable[None]], concurrency: int, requests: int) -> Dict[str, Any]:
+    """Executa `requests` chamadas com no máximo `concurrency` simultâneas e resume as latências."""
+    latencies: List[float] = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for index in range(requests):
+        queue.put_nowait(index)
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                await call()
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors += 1
+                logger.debug(f"Falha na chamada: {e}")
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "peak_alloc_mb": round(peak / (1024 * 1024), 3),
+        "max_rss_mb": round(_max_rss_mb(), 1),
+    }
+
+async def bench_direct(args, server: MockAzureServer, levels: List[int]) -> List[Dict[str, Any]]:
+    """Mede ModelIntegration.process_flow (ou process_flow_stream) contra o mock, sem API nem banco."""
+    from config import settings
+    from flow_manager import Flow
+    from http_client import HTTPClientPool
+    from model_integration import ModelIntegration
+    from rate_limit import DeploymentRateLimits
+    from coalescing import SingleFlight
+    from flow_optimizer import optimize_flow
+
+    settings.UFPB_OPENAI_API_BASE = server.base_url
+    flow = Flow(**SCENARIOS[args.scenario])
+    # Como os fluxos lidos do banco, que já trazem o plano gerado ao salvar
+    flow = flow.model_copy(update={"plan": optimize_flow(flow)})
+    http_client = HTTPClientPool()
+    await http_client.start()
+    try:
+        results = []
+        for concurrency in levels:
+            # Limitadores novos a cada nível, para que a concorrência AIMD de um não afete o próximo
+            model_client = ModelIntegration(
+                api_key=settings.UFPB_OPENAI_API_KEY,
+                session=http_client.session,
+                rate_limits=DeploymentRateLimits(initial_concurrency=concurrency, max_concurrency=max(concurrency, 64)),
+                coalescer=SingleFlight()
+            )
+
+            if args.stream:
+                async def call():
+                    async for event in model_client.process_flow_stream(user_message=USER_MESSAGE, flow=flow):
+                        if event["event"] == "error":
+                            raise ValueError(event["data"]["detail"])
+            else:
+                async def call():
+                    await model_client.process_flow(user_message=USER_MESSAGE, flow=flow)
+
+            results.append(await run_level(call, concurrency, args.requests))
+        return results
+    finally:
+        await http_client.close()
+
+async def bench_http(args, levels: List[int]) -> List[Dict[str, Any]]:
+    """Mede POST /flows/{id}/exec_flow de uma API em execução (que deve apontar para o mock)."""
+    base_url = args.base_url.rstrip("/")
+    connector = aiohttp.TCPConnector(limit=max(levels))
+    async with aiohttp.ClientSession(connector=connector) as session:
+        flow_id = args.flow_id
+        if flow_id is None:
+            async with session.post(f"{base_url}/createFlows/", json=SCENARIOS[args.scenario]) as response:
+                if response.status != 200:
+                    raise ValueError(f"Falha ao criar o fluxo do cenário: {await response.text()}")
+                flow_id = (await response.json())["id"]
+
+        async def call():
+            async with session.post(
+                f"{base_url}/flows/{flow_id}/exec_flow",
+                json={"user_message": USER_MESSAGE}
+            ) as response:
+                await response.read()
+                if response.status != 200:
+                    raise ValueError(f"HTTP {response.status}")
+
+        try:
+            return [await run_level(call, concurrency, args.requests) for concurrency in levels]
+        finally:
+            if args.flow_id is None:
+                async with session.delete(f"{base_url}/deleteFlows/{flow_id}") as response:
+                    await response.read()
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Lista as regressões de `current` em relação a `baseline` além da tolerância relativa.
+
+    Latência (p50/p95/p99) e memória regridem quando sobem; vazão, quando cai.
+    Só são comparados níveis de concorrência presentes nos dois resultados, e
+    uma configuração de cenário ou do mock diferente também é reportada.
+    """
+    regressions = []
+    for key in ("mode", "scenario", "stream", "mock"):
+        current_value = {k: v for k, v in current[key].items() if k != "mock_requests"} if key == "mock" else current[key]
+        baseline_value = {k: v for k, v in baseline[key].items() if k != "mock_requests"} if key == "mock" else baseline[key]
+        if current_value != baseline_value:
+            regressions.append(f"configuração '{key}' difere da baseline: {current_value} != {baseline_value}")
+    baseline_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in current["levels"]:
+        reference = baseline_levels.get(level["concurrency"])
+        if reference is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "peak_alloc_mb"):
+            if reference[metric] and level[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(
+                    f"c={level['concurrency']} {metric}: {level[metric]} > {reference[metric]} (+{tolerance:.0%})"
+                )
+        if level["throughput_rps"] < reference["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"c={level['concurrency']} throughput_rps: {level['throughput_rps']} < "
+                f"{reference['throughput_rps']} (-{tolerance:.0%})"
+            )
+        if level["errors"] > reference["errors"]:
+            regressions.append(f"c={level['concurrency']} errors: {level['errors']} > {reference['errors']}")
+    return regressions
+
+def _print_table(result: Dict[str, Any]):
+    header = f"{'conc':>5} {'req':>6} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'alloc MB':>9} {'rss MB':>8}"
+    print(f"\n{result['mode']} / {result['scenario']}{' / stream' if result['stream'] else ''}")
+    print(header)
+    for level in result["levels"]:
+        print(
+            f"{level['concurrency']:>5} {level['requests']:>6} {level['errors']:>5} {level['throughput_rps']:>9} "
+            f"{level['p50_ms']:>9} {level['p95_ms']:>9} {level['p99_ms']:>9} {level['peak_alloc_mb']:>9} {level['max_rss_mb']:>8}"
+        )
+
+async def _main(args) -> int:
+    levels = [int(value) for value in args.concurrency.split(",")]
+    server = MockAzureServer(config_from_args(args), port=args.mock_port)
+    await server.start()
+    try:
+        if args.mode == "direct":
+            levels_results = await bench_direct(args, server, levels)
+        else:
+            levels_results = await bench_http(args, levels)
+    finally:
+        await server.stop()
+
+    result = {
+        "mode": args.mode,
+        "scenario": args.scenario,
+        "stream": args.stream,
+        "mock": {
+            "latency": args.latency,
+            "error_rate": args.error_rate,
+            "throttle_rate": args.throttle_rate,
+            "mock_requests": server.requests,
+        },
+        "python": platform.python_version(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "levels": levels_results,
+    }
+    _print_table(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(result, output, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as output:
+            json.dump(result, output, indent=2)
+        print(f"\nBaseline salva em {args.save_baseline}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as source:
+            baseline = json.load(source)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressões em relação à baseline:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"\nSem regressões em relação a {args.compare} (tolerância {args.tolerance:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    for name, value in OFFLINE_ENV.items():
+        os.environ.setdefault(name, value)
+
+    parser = argparse.ArgumentParser(description="Benchmark offline da execução de fluxos contra um mock do Azure OpenAI.")
+    parser.add_argument("--mode", choices=("direct", "http"), default="direct",
+                        help="direct: ModelIntegration.process_flow; http: POST /flows/{id}/exec_flow")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="chain")
+    parser.add_argument("--concurrency", default="1,8,32", help="Níveis de concorrência separados por vírgula")
+    parser.add_argument("--requests", type=int, default=200, help="Execuções de fluxo por nível")
+    parser.add_argument("--stream", action="store_true", help="Usa process_flow_stream (apenas no modo direct)")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="API usada no modo http")
+    parser.add_argument("--flow-id", default=None, help="Fluxo existente para o modo http")
+    parser.add_argument("--mock-port", type=int, default=0, help="Porta do mock (0 = livre; use 8911 no modo http)")
+    add_mock_arguments(parser)
+    parser.add_argument("-o", "--output", default=None, help="Salva o resultado em JSON")
+    parser.add_argument("--save-baseline", default=None, help="Salva o resultado como baseline")
+    parser.add_argument("--compare", default=None, help="Compara com uma baseline e falha em caso de regressão")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Tolerância relativa da comparação")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
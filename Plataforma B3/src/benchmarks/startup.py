@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, Any, List, Optional
+import logging
+import aiohttp
+from benchmarks.mock_server import MockAzureServer
+from benchmarks.run import OFFLINE_ENV
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure_import(env: Dict[str, str]) -> float:
+    """Tempo de `import app` em um interpretador novo (inclui FastAPI, aiohttp, config e módulos internos)."""
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=SRC_DIR, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+async def _wait_status(session: aiohttp.ClientSession, url: str, deadline: float) -> Optional[float]:
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=1)) as response:
+                if response.status == 200:
+                    return time.monotonic()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+        await asyncio.sleep(0.02)
+    return None
+
+async def measure_server(env: Dict[str, str], port: int, timeout: float) -> Dict[str, Optional[float]]:
+    """Sobe `uvicorn app:app` e mede o tempo até /healthz e /readyz responderem 200."""
+    started = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SRC_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        async with aiohttp.ClientSession() as session:
+            deadline = started + timeout
+            live = await _wait_status(session, f"{base_url}/healthz", deadline)
+            ready = await _wait_status(session, f"{base_url}/readyz", deadline) if live is not None else None
+    finally:
+        process.terminate()
+        process.wait()
+    return {
+        "healthz_seconds": round(live - started, 3) if live is not None else None,
+        "readyz_seconds": round(ready - started, 3) if ready is not None else None,
+    }
+
+def _median(values: List[Optional[float]]) -> Optional[float]:
+    measured = [value for value in values if value is not None]
+    return round(statistics.median(measured), 3) if measured else None
+
+async def _main(args) -> Dict[str, Any]:
+    server = MockAzureServer(port=args.mock_port)
+    await server.start()
+    env = dict(os.environ)
+    env.update(OFFLINE_ENV)
+    env["UFPB_OPENAI_API_BASE"] = server.base_url
+    if args.mongo_url:
+        env["COSMOSDB_URL"] = args.mongo_url
+    runs = []
+    try:
+        for _ in range(args.runs):
+            run = {"import_seconds": round(measure_import(env), 3)}
+            run.update(await measure_server(env, args.port, args.timeout))
+            runs.append(run)
+    finally:
+        await server.stop()
+    return {
+        "runs": runs,
+        "median": {key: _median([run[key] for run in runs]) for key in runs[0]},
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede o tempo de inicialização da API (import, /healthz e /readyz).")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mock-port", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=30.0,
+                        help="Espera máxima por execução; /readyz sem resposta no prazo fica como null")
+    parser.add_argument("--mongo-url", default=None,
+                        help="Mongo usado pelo aquecimento (padrão: o de OFFLINE_ENV)")
+    print(json.dumps(asyncio.run(_main(parser.parse_args())), indent=2))
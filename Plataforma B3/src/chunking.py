@@ -0,0 +1,110 @@
+import functools
+from typing import List, Optional
+import logging
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Usado quando o tiktoken não está instalado ou não consegue carregar o vocabulário
+CHARS_PER_TOKEN = 4
+
+DEFAULT_REDUCE_PROMPT = (
+    "Os textos a seguir são resultados parciais da mesma tarefa, aplicada a trechos consecutivos "
+    "de um documento longo. Combine-os em uma única resposta coesa, sem repetir informações.\n\n"
+    "Tarefa original: {system_prompt}"
+)
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model: str):
+    """Vocabulário do modelo, carregado uma vez; None cai na estimativa por caracteres."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # O tiktoken baixa o vocabulário no primeiro uso; sem rede, usa a estimativa
+        logger.warning(f"Tokenizador indisponível para '{model}', usando estimativa: {str(e)}")
+        return None
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def context_window(model: str) -> int:
+    return settings.MODEL_CONTEXT_WINDOWS.get(model, settings.MODEL_DEFAULT_CONTEXT_WINDOW)
+
+def prompt_budget(model: str, system_prompt: str, max_tokens: int) -> int:
+    """Tokens disponíveis para a mensagem do usuário numa chamada com este prompt e `max_tokens`."""
+    return (
+        context_window(model) - max_tokens - count_tokens(system_prompt, model) - settings.CHUNK_SAFETY_MARGIN
+    )
+
+def chunk_size(model: str, system_prompt: str, max_tokens: int, chunk_tokens: Optional[int] = None) -> int:
+    """Tamanho dos trechos: o configurado (ou CHUNK_MAX_TOKENS), limitado ao que cabe na janela de contexto."""
+    size = min(chunk_tokens or settings.CHUNK_MAX_TOKENS, prompt_budget(model, system_prompt, max_tokens))
+    if size < 1:
+        raise ValueError(
+            f"Janela de contexto de '{model}' ({context_window(model)} tokens) não comporta "
+            f"o prompt e max_tokens={max_tokens}"
+        )
+    return size
+
+def split_text(text: str, model: str, size: int, overlap: int) -> List[str]:
+    """Divide o texto em trechos de até `size` tokens, cada um repetindo os `overlap` finais do anterior."""
+    overlap = min(overlap, size - 1)
+    stride = size - overlap
+    encoding = _encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return [
+            encoding.decode(tokens[start:start + size])
+            for start in range(0, max(len(tokens) - overlap, 1), stride)
+        ]
+
+    # Sem tokenizador: janelas de caracteres, terminando em espaço quando houver um no último quinto
+    size, overlap = size * CHARS_PER_TOKEN, overlap * CHARS_PER_TOKEN
+    chunks = []
+    start = 0
+    while True:
+        end = start + size
+        if end >= len(text):
+            chunks.append(text[start:])
+            return chunks
+        cut = text.rfind(" ", end - size // 5, end)
+        if cut > start + overlap + (size - overlap) // 2:
+            end = cut
+        chunks.append(text[start:end])
+        start = end - overlap
+
+def group_partials(partials: List[str], model: str, budget: int) -> List[List[str]]:
+    """Agrupa resultados parciais consecutivos em grupos que cabem em `budget` tokens.
+
+    Cada grupo tem ao menos dois itens, para que toda rodada de redução
+    diminua o número de parciais.
+    """
+    groups: List[List[str]] = []
+    current: List[str] = []
+    used = 0
+    for partial in partials:
+        tokens = count_tokens(partial, model)
+        if len(current) >= 2 and used + tokens > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(partial)
+        used += tokens
+    if len(current) == 1 and groups:
+        groups[-1].append(current[0])
+    elif current:
+        groups.append(current)
+    return groups
+
+def join_partials(partials: List[str]) -> str:
+    return "\n\n".join(f"[Parte {index}/{len(partials)}]\n{partial}" for index, partial in enumerate(partials, 1))
@@ -0,0 +1,63 @@
+import asyncio
+from typing import Dict, Any, Callable, Awaitable
+import logging
+from deadline import remaining, without_deadline
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """Deduplica chamadas idênticas em andamento: uma requisição upstream por chave.
+
+    A primeira chamada (líder) dispara a requisição; chamadas concorrentes
+    com a mesma chave aguardam e recebem o mesmo resultado (ou a mesma
+    exceção). A requisição só é cancelada quando todos os interessados
+    desistem dela.
+
+    A requisição compartilhada roda sem o prazo do líder; cada chamada
+    aguarda o resultado apenas até o próprio prazo (asyncio.TimeoutError).
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            self.leaders += 1
+            call = _Call(asyncio.ensure_future(without_deadline(fn())))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._forget(key, call))
+        else:
+            self.coalesced += 1
+        call.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(call.task), remaining())
+        except BaseException:
+            if not call.task.done() and call.waiters == 1:
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            # Marca a exceção como recuperada mesmo que ninguém mais aguarde
+            call.task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+            "waiting": sum(call.waiters for call in self._calls.values()),
+        }
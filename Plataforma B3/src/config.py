@@ -1,8 +1,10 @@
 import os
+from typing import Dict, Optional
 from pydantic import Field
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
+# Único ponto que carrega o .env; os demais módulos leem `settings`
 load_dotenv()
 
 class Settings(BaseSettings):
@@ -15,10 +17,111 @@ class Settings(BaseSettings):
     def MODEL_URL(self, model_name: str) -> str:
         return f"{self.UFPB_OPENAI_API_BASE}openai/deployments/{model_name}/chat/completions?api-version={self.UFPB_OPENAI_API_VERSION}"
 
+    def EMBEDDING_URL(self) -> str:
+        return f"{self.UFPB_OPENAI_API_BASE}openai/deployments/{self.UFPB_OPENAI_EMBEDDING_DEPLOYMENT}/embeddings?api-version={self.UFPB_OPENAI_API_VERSION}"
+
     COSMOSDB_URL: str = Field(..., env="COSMOSDB_URL")
     
     APP_NAME: str = Field(default="Plataforma B3 - IA", env="APP_NAME")
     DEBUG: bool = Field(default=False, env="DEBUG")
+
+    HTTP_POOL_LIMIT: int = Field(default=100, env="HTTP_POOL_LIMIT")
+    HTTP_POOL_LIMIT_PER_HOST: int = Field(default=20, env="HTTP_POOL_LIMIT_PER_HOST")
+    HTTP_DNS_CACHE_TTL: int = Field(default=300, env="HTTP_DNS_CACHE_TTL")
+    HTTP_KEEPALIVE_TIMEOUT: float = Field(default=60.0, env="HTTP_KEEPALIVE_TIMEOUT")
+
+    RESPONSE_CACHE_MAX_ENTRIES: int = Field(default=1024, env="RESPONSE_CACHE_MAX_ENTRIES")
+    RESPONSE_CACHE_TTL: int = Field(default=3600, env="RESPONSE_CACHE_TTL")
+    RESPONSE_CACHE_SHARED: bool = Field(default=False, env="RESPONSE_CACHE_SHARED")
+
+    SEMANTIC_CACHE_THRESHOLD: float = Field(default=0.95, env="SEMANTIC_CACHE_THRESHOLD")
+    SEMANTIC_CACHE_MAX_ENTRIES: int = Field(default=5000, env="SEMANTIC_CACHE_MAX_ENTRIES")
+    SEMANTIC_CACHE_MAX_TOTAL_ENTRIES: int = Field(default=20000, env="SEMANTIC_CACHE_MAX_TOTAL_ENTRIES")
+    SEMANTIC_CACHE_MAX_NAMESPACES: int = Field(default=256, env="SEMANTIC_CACHE_MAX_NAMESPACES")
+    SEMANTIC_CACHE_SHARED: bool = Field(default=False, env="SEMANTIC_CACHE_SHARED")
+    SEMANTIC_CACHE_RETENTION: int = Field(default=7 * 24 * 3600, env="SEMANTIC_CACHE_RETENTION")
+    SEMANTIC_CACHE_TRIM_EVERY: int = Field(default=100, env="SEMANTIC_CACHE_TRIM_EVERY")
+    SEMANTIC_CACHE_EMBEDDER: str = Field(default="azure", env="SEMANTIC_CACHE_EMBEDDER")
+    EMBEDDING_BATCH_SIZE: int = Field(default=16, env="EMBEDDING_BATCH_SIZE")
+    EMBEDDING_BATCH_WINDOW: float = Field(default=0.01, env="EMBEDDING_BATCH_WINDOW")
+
+    FLOW_CACHE_MAX_ENTRIES: int = Field(default=1024, env="FLOW_CACHE_MAX_ENTRIES")
+    FLOW_CACHE_TTL: float = Field(default=300.0, env="FLOW_CACHE_TTL")
+    FLOW_CACHE_WARM_LIMIT: int = Field(default=200, env="FLOW_CACHE_WARM_LIMIT")
+    FLOW_CACHE_WATCH_RETRY_BASE_DELAY: float = Field(default=1.0, env="FLOW_CACHE_WATCH_RETRY_BASE_DELAY")
+    FLOW_CACHE_WATCH_RETRY_MAX_DELAY: float = Field(default=60.0, env="FLOW_CACHE_WATCH_RETRY_MAX_DELAY")
+
+    HTTP_WARM_CONNECTIONS: int = Field(default=4, env="HTTP_WARM_CONNECTIONS")
+    WARMUP_RETRY_BASE_DELAY: float = Field(default=1.0, env="WARMUP_RETRY_BASE_DELAY")
+    WARMUP_RETRY_MAX_DELAY: float = Field(default=30.0, env="WARMUP_RETRY_MAX_DELAY")
+    READINESS_DB_TIMEOUT: float = Field(default=2.0, env="READINESS_DB_TIMEOUT")
+
+    FLOW_IMPORT_BATCH_SIZE: int = Field(default=1000, env="FLOW_IMPORT_BATCH_SIZE")
+
+    MODEL_CONTEXT_WINDOWS: Dict[str, int] = Field(
+        default_factory=lambda: {"gpt-4o": 128000, "gpt-4o-mini": 128000}, env="MODEL_CONTEXT_WINDOWS"
+    )
+    MODEL_DEFAULT_CONTEXT_WINDOW: int = Field(default=8192, env="MODEL_DEFAULT_CONTEXT_WINDOW")
+    CHUNK_MAX_TOKENS: int = Field(default=4000, env="CHUNK_MAX_TOKENS")
+    CHUNK_OVERLAP_TOKENS: int = Field(default=200, env="CHUNK_OVERLAP_TOKENS")
+    CHUNK_CONCURRENCY: int = Field(default=4, env="CHUNK_CONCURRENCY")
+    CHUNK_SAFETY_MARGIN: int = Field(default=64, env="CHUNK_SAFETY_MARGIN")
+
+    BATCH_CONCURRENCY: int = Field(default=8, env="BATCH_CONCURRENCY")
+    BATCH_MAX_CONCURRENCY: int = Field(default=64, env="BATCH_MAX_CONCURRENCY")
+    # O corpo de exec_batch fica em memória até BATCH_SPOOL_MEMORY_BYTES e depois vai para disco
+    BATCH_MAX_BODY_BYTES: int = Field(default=512 * 1024 * 1024, env="BATCH_MAX_BODY_BYTES")
+    BATCH_SPOOL_MEMORY_BYTES: int = Field(default=8 * 1024 * 1024, env="BATCH_SPOOL_MEMORY_BYTES")
+    DEPLOYMENT_RPM_LIMITS: Dict[str, int] = Field(default_factory=dict, env="DEPLOYMENT_RPM_LIMITS")
+    DEPLOYMENT_TPM_LIMITS: Dict[str, int] = Field(default_factory=dict, env="DEPLOYMENT_TPM_LIMITS")
+    DEPLOYMENT_INITIAL_CONCURRENCY: int = Field(default=8, env="DEPLOYMENT_INITIAL_CONCURRENCY")
+    DEPLOYMENT_MAX_CONCURRENCY: int = Field(default=64, env="DEPLOYMENT_MAX_CONCURRENCY")
+
+    COALESCE_MAX_TEMPERATURE: float = Field(default=0.3, env="COALESCE_MAX_TEMPERATURE")
+
+    TRACE_MAX_TRACES: int = Field(default=200, env="TRACE_MAX_TRACES")
+    TRACE_EXPORT_PATH: Optional[str] = Field(default=None, env="TRACE_EXPORT_PATH")
+
+    RUN_LOG_ENABLED: bool = Field(default=True, env="RUN_LOG_ENABLED")
+    RUN_LOG_BATCH_SIZE: int = Field(default=100, env="RUN_LOG_BATCH_SIZE")
+    RUN_LOG_FLUSH_INTERVAL: float = Field(default=0.5, env="RUN_LOG_FLUSH_INTERVAL")
+    # Execução "running" sem atualização há mais tempo que isso é considerada abandonada e pode ser retomada
+    RUN_STALE_AFTER: float = Field(default=600.0, env="RUN_STALE_AFTER")
+
+    ARGO_SERVER_URL: str = Field(default="http://argo-server.argo:2746", env="ARGO_SERVER_URL")
+    ARGO_NAMESPACE: str = Field(default="argo", env="ARGO_NAMESPACE")
+    ARGO_TOKEN: Optional[str] = Field(default=None, env="ARGO_TOKEN")
+    ARGO_IMAGE: str = Field(default="plataforma-b3:latest", env="ARGO_IMAGE")
+    ARGO_SERVICE_ACCOUNT: Optional[str] = Field(default=None, env="ARGO_SERVICE_ACCOUNT")
+    ARGO_ENV_SECRET: str = Field(default="plataforma-b3-env", env="ARGO_ENV_SECRET")
+    ARGO_RETRY_LIMIT: int = Field(default=3, env="ARGO_RETRY_LIMIT")
+    ARGO_SUBMIT_CONCURRENCY: int = Field(default=8, env="ARGO_SUBMIT_CONCURRENCY")
+    ARGO_POLL_INTERVAL: float = Field(default=5.0, env="ARGO_POLL_INTERVAL")
+
+    FLOW_DEFAULT_TIMEOUT: Optional[float] = Field(default=None, env="FLOW_DEFAULT_TIMEOUT")
+    DISCONNECT_POLL_INTERVAL: float = Field(default=0.5, env="DISCONNECT_POLL_INTERVAL")
+
+    JOB_WORKER_EMBEDDED: bool = Field(default=True, env="JOB_WORKER_EMBEDDED")
+    JOB_WORKER_CONCURRENCY: int = Field(default=4, env="JOB_WORKER_CONCURRENCY")
+    JOB_VISIBILITY_TIMEOUT: float = Field(default=60.0, env="JOB_VISIBILITY_TIMEOUT")
+    JOB_POLL_INTERVAL: float = Field(default=1.0, env="JOB_POLL_INTERVAL")
+    JOB_MAX_ATTEMPTS: int = Field(default=3, env="JOB_MAX_ATTEMPTS")
+    JOB_RETRY_BASE_DELAY: float = Field(default=2.0, env="JOB_RETRY_BASE_DELAY")
+    JOB_RETRY_MAX_DELAY: float = Field(default=60.0, env="JOB_RETRY_MAX_DELAY")
+    JOB_WAIT_POLL_INTERVAL: float = Field(default=0.5, env="JOB_WAIT_POLL_INTERVAL")
+    JOB_CALLBACK_TIMEOUT: float = Field(default=10.0, env="JOB_CALLBACK_TIMEOUT")
+    JOB_DRAIN_TIMEOUT: float = Field(default=30.0, env="JOB_DRAIN_TIMEOUT")
+    JOB_RETENTION: int = Field(default=7 * 24 * 3600, env="JOB_RETENTION")
+
+    MODEL_MAX_RETRIES: int = Field(default=4, env="MODEL_MAX_RETRIES")
+    MODEL_FALLBACK_RETRIES: int = Field(default=1, env="MODEL_FALLBACK_RETRIES")
+    MODEL_RETRY_BASE_DELAY: float = Field(default=0.5, env="MODEL_RETRY_BASE_DELAY")
+    MODEL_RETRY_MAX_DELAY: float = Field(default=30.0, env="MODEL_RETRY_MAX_DELAY")
+
+    HEDGE_LATENCY_WINDOW: int = Field(default=200, env="HEDGE_LATENCY_WINDOW")
+    HEDGE_MIN_SAMPLES: int = Field(default=20, env="HEDGE_MIN_SAMPLES")
+    HEDGE_DEFAULT_DELAY: float = Field(default=2.0, env="HEDGE_DEFAULT_DELAY")
+    HEDGE_MIN_DELAY: float = Field(default=0.05, env="HEDGE_MIN_DELAY")
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,30 @@
+import os
+
+# Variáveis obrigatórias do config.Settings; os testes não fazem chamadas de rede
+for name, value in {
+    "UFPB_OPENAI_API_KEY": "teste",
+    "UFPB_OPENAI_API_BASE": "http://127.0.0.1:8911/",
+    "UFPB_OPENAI_API_VERSION": "2024-02-01",
+    "UFPB_OPENAI_EMBEDDING_DEPLOYMENT": "text-embedding-3-small",
+    "COSMOSDB_URL": "mongodb://127.0.0.1:27017/",
+}.items():
+    os.environ.setdefault(name, value)
+
+import inspect
+import pytest
+
+@pytest.fixture
+def mongo_db():
+    """Banco Mongo em memória (mongomock-motor), com a mesma interface assíncrona do motor."""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from mongomock.collection import BulkOperationBuilder
+
+    # O pymongo >= 4.9 passa `sort` às operações de bulk_write, que o mongomock ainda não aceita
+    if "sort" not in inspect.signature(BulkOperationBuilder.add_update).parameters:
+        add_update = BulkOperationBuilder.add_update
+
+        def add_update_without_sort(self, *args, sort=None, **kwargs):
+            return add_update(self, *args, **kwargs)
+
+        BulkOperationBuilder.add_update = add_update_without_sort
+    return mongomock_motor.AsyncMongoMockClient()["plataforma_B3_teste"]
@@ -1,14 +1,61 @@
+import asyncio
 from pymongo import MongoClient
-from typing import Generator
+from motor.motor_asyncio import AsyncIOMotorClient
+from typing import Generator, Optional
 from config import settings
 
-client = MongoClient(settings.COSMOSDB_URL)
+DATABASE_NAME = 'plataforma_B3'
 
-db = client['plataforma_B3']
+# Os clientes são criados no primeiro uso: importar o módulo não abre conexões
+_client: Optional[MongoClient] = None
+_async_client: Optional[AsyncIOMotorClient] = None
+_db = None
+_async_db = None
+
+def get_sync_db():
+    global _client, _db
+    if _db is None:
+        _client = MongoClient(settings.COSMOSDB_URL)
+        _db = _client[DATABASE_NAME]
+    return _db
+
+def get_async_db():
+    global _async_client, _async_db
+    if _async_db is None:
+        _async_client = AsyncIOMotorClient(settings.COSMOSDB_URL)
+        _async_db = _async_client[DATABASE_NAME]
+    return _async_db
+
+async def ping(timeout: float):
+    """Falha se o banco não responder em `timeout` segundos."""
+    await asyncio.wait_for(get_async_db().command("ping"), timeout)
+
+def close_clients():
+    global _client, _async_client, _db, _async_db
+    if _client is not None:
+        _client.close()
+    if _async_client is not None:
+        _async_client.close()
+    _client = _async_client = _db = _async_db = None
 
 def get_db() -> Generator:
     
     try:
-        yield db['flows']
+        yield get_async_db()['flows']
     finally:
-        pass
\ No newline at end of file
+        pass
+
+def get_flows_collection():
+    return get_async_db()['flows']
+
+def get_cache_collection():
+    return get_async_db()['response_cache']
+
+def get_runs_collection():
+    return get_async_db()['runs']
+
+def get_semantic_cache_collection():
+    return get_async_db()['semantic_cache']
+
+def get_jobs_collection():
+    return get_async_db()['jobs']
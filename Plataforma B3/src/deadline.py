@@ -0,0 +1,51 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Optional, Iterator, Any, Awaitable
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Instante (time.monotonic) em que a execução atual deve terminar; tarefas
+# criadas dentro do escopo herdam o prazo junto com o contexto.
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+class DeadlineExceeded(ValueError):
+    """O prazo da execução se esgotou."""
+
+@contextmanager
+def deadline_scope(timeout: Optional[float]) -> Iterator[Optional[float]]:
+    """Define um prazo de `timeout` segundos; um prazo externo mais curto prevalece."""
+    current = _deadline.get()
+    deadline = current
+    if timeout is not None:
+        deadline = time.monotonic() + timeout
+        if current is not None:
+            deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+def remaining() -> Optional[float]:
+    """Segundos restantes até o prazo atual, ou None se não houver prazo."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+async def without_deadline(aw: Awaitable[Any]) -> Any:
+    """Aguarda `aw` sem prazo, para trabalho compartilhado por execuções com prazos diferentes.
+
+    Deve rodar na própria tarefa (ex.: `asyncio.ensure_future(without_deadline(...))`):
+    o prazo é removido apenas do contexto dessa tarefa, e cada interessado
+    aplica o seu ao aguardá-la.
+    """
+    _deadline.set(None)
+    return await aw
+
+def check_deadline():
+    if remaining() == 0.0:
+        raise DeadlineExceeded("Prazo da execução esgotado")
@@ -0,0 +1,273 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Callable, Awaitable
+import logging
+from flow_manager import Flow, FlowStep
+from metrics import STEP_DURATION
+from tracing import start_span
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Função que executa um passo: recebe o passo e a entrada, devolve
+# (assistant_message, messages) — assistant_message pode ser None.
+StepRunner = Callable[[FlowStep, str], Awaitable[Any]]
+
+# Chamado com o resultado de cada passo executado (ex.: para registrar checkpoints).
+ResultCallback = Callable[["StepResult"], None]
+
+# Versão do formato dos planos gerados por flow_optimizer; planos de outra versão são ignorados
+PLAN_VERSION = 1
+
+
+@dataclass
+class StepResult:
+    step_name: str
+    status: str  # "done" | "skipped"
+    input: Optional[str] = None
+    output: Optional[str] = None
+    assistant_message: Optional[str] = None
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    route: List[str] = field(default_factory=list)
+
+
+def _normalize(text: str) -> str:
+    return (text or "").strip().strip(".!:;\"'").casefold()
+
+
+def evaluate_router(step: FlowStep, value: str) -> List[str]:
+    """Retorna os rótulos de `conditions` satisfeitos pelo valor recebido pelo router."""
+    normalized = _normalize(value)
+    exact = [label for label, expected in step.conditions.items() if _normalize(expected) == normalized]
+    if exact:
+        return exact
+    return [
+        label for label, expected in step.conditions.items()
+        if _normalize(expected) and _normalize(expected) in normalized
+    ]
+
+
+class FlowGraph:
+    """Grafo de dependências de um fluxo.
+
+    Regras para montar as arestas, na ordem em que são aplicadas:
+    - `depends_on` explícito sempre prevalece;
+    - um router (passo com `conditions`) depende dos passos da maior ordem
+      declarada antes dele na lista;
+    - um passo com `execute_if` depende do router que declara o rótulo;
+    - os demais passos de ordem N dependem de todos os passos de ordem N-1.
+    Passos sem dependências entre si são executados em paralelo.
+
+    Se o fluxo traz um plano pré-computado (`flow.plan`, gerado ao salvar),
+    ordem e dependências são lidas dele, sem validar nem ordenar de novo, e
+    os passos eliminados pelo otimizador ficam fora do grafo.
+    """
+
+    def __init__(self, flow: Flow, use_plan: bool = True):
+        self.flow = flow
+        self.steps: Dict[str, FlowStep] = {}
+        self.dependencies: Dict[str, List[str]] = {}
+        if use_plan and self._load_plan(flow.plan):
+            return
+        self.steps = {}
+        self.dependencies = {}
+        self._build()
+        self.order = self._topological_order()
+
+    def _load_plan(self, plan: Optional[Dict[str, Any]]) -> bool:
+        if not plan or plan.get("version") != PLAN_VERSION:
+            return False
+        steps = {step.step_name: step for step in self.flow.steps}
+        if any(name not in steps for name in plan["order"]):
+            # Plano de outra definição do fluxo
+            return False
+        self.steps = {name: steps[name] for name in plan["order"]}
+        self.dependencies = {name: list(plan["dependencies"][name]) for name in plan["order"]}
+        self.order = list(plan["order"])
+        return True
+
+    def _build(self):
+        steps_by_order: Dict[int, List[str]] = {}
+        label_routers: Dict[str, str] = {}
+        for step in self.flow.steps:
+            if step.step_name in self.steps:
+                raise ValueError(f"Nome de passo duplicado: '{step.step_name}'")
+            self.steps[step.step_name] = step
+            if step.step_order is not None:
+                steps_by_order.setdefault(step.step_order, []).append(step.step_name)
+            if step.is_router:
+                for label in step.conditions:
+                    label_routers[label] = step.step_name
+
+        for step in self.flow.steps:
+            if step.execute_if is not None and step.execute_if not in label_routers:
+                raise ValueError(
+                    f"Passo '{step.step_name}' usa execute_if '{step.execute_if}' sem router correspondente"
+                )
+
+        seen_by_order: Dict[int, List[str]] = {}
+        for step in self.flow.steps:
+            if step.depends_on is not None:
+                deps = list(step.depends_on)
+                if step.execute_if is not None and label_routers[step.execute_if] not in deps:
+                    deps.append(label_routers[step.execute_if])
+            elif step.is_router:
+                deps = list(seen_by_order[max(seen_by_order)]) if seen_by_order else []
+            elif step.execute_if is not None:
+                deps = [label_routers[step.execute_if]]
+            elif step.step_order is not None:
+                deps = list(steps_by_order.get(step.step_order - 1, []))
+            else:
+                raise ValueError(
+                    f"Passo '{step.step_name}' sem step_order deve ser um router ou declarar depends_on"
+                )
+
+            for dep in deps:
+                if dep not in self.steps:
+                    raise ValueError(f"Passo '{step.step_name}' depende de passo inexistente '{dep}'")
+            self.dependencies[step.step_name] = deps
+
+            if step.step_order is not None:
+                seen_by_order.setdefault(step.step_order, []).append(step.step_name)
+
+    def _topological_order(self) -> List[str]:
+        remaining = {name: set(deps) for name, deps in self.dependencies.items()}
+        order = []
+        while remaining:
+            ready = [name for name in self.steps if name in remaining and not remaining[name]]
+            if not ready:
+                raise ValueError(f"Ciclo detectado entre os passos: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+                order.append(name)
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    def dependants(self, step_name: str) -> List[str]:
+        return [name for name, deps in self.dependencies.items() if step_name in deps]
+
+
+class FlowExecutor:
+    """Executa um FlowGraph respeitando dependências, routers e execute_if."""
+
+    def __init__(self, graph: FlowGraph, run_step: StepRunner, on_result: Optional[ResultCallback] = None):
+        self.graph = graph
+        self.run_step = run_step
+        self.on_result = on_result
+        # Resultados já disponíveis, inclusive quando a execução é interrompida
+        self.finished: Dict[str, StepResult] = {}
+
+    async def run(
+        self,
+        user_message: str,
+        completed: Optional[Dict[str, StepResult]] = None
+    ) -> Dict[str, StepResult]:
+        """Executa o grafo; passos presentes em `completed` reutilizam o resultado já obtido."""
+        completed = completed or {}
+        tasks: Dict[str, asyncio.Task] = {}
+        for name in self.graph.order:
+            deps = [tasks[dep] for dep in self.graph.dependencies[name]]
+            if name in completed:
+                tasks[name] = asyncio.ensure_future(self._reuse(completed[name]))
+                continue
+            tasks[name] = asyncio.ensure_future(self._run_node(name, deps, user_message))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return {name: tasks[name].result() for name in self.graph.order}
+
+    async def _reuse(self, result: StepResult) -> StepResult:
+        self.finished[result.step_name] = result
+        return result
+
+    async def run_node(
+        self,
+        name: str,
+        completed: Dict[str, StepResult],
+        user_message: str
+    ) -> StepResult:
+        """Executa apenas o passo `name`, com as dependências tiradas de `completed`.
+
+        Dependências ausentes de `completed` contam como puladas. Usado quando
+        cada passo roda em um processo separado (ex.: uma tarefa do Argo).
+        """
+        deps = [
+            asyncio.ensure_future(self._reuse(completed.get(dep) or StepResult(step_name=dep, status="skipped")))
+            for dep in self.graph.dependencies[name]
+        ]
+        return await self._run_node(name, deps, user_message)
+
+    async def _run_node(self, name: str, deps: List[asyncio.Task], user_message: str) -> StepResult:
+        step = self.graph.steps[name]
+        dep_results: List[StepResult] = list(await asyncio.gather(*deps)) if deps else []
+        active = [result for result in dep_results if result.status == "done"]
+
+        if deps and not active:
+            return StepResult(step_name=name, status="skipped")
+        if step.execute_if is not None and not any(
+            step.execute_if in result.route for result in active if self.graph.steps[result.step_name].is_router
+        ):
+            return StepResult(step_name=name, status="skipped")
+
+        step_input = "\n\n".join(result.output for result in active) if active else user_message
+
+        started = time.monotonic()
+        try:
+            with start_span(f"step:{name}", step=name, model=None if step.is_router else step.model) as span:
+                result = await self._execute(step, step_input, active, user_message)
+                if step.is_router:
+                    span.set_attribute("route", result.route)
+            self.finished[name] = result
+            if self.on_result is not None:
+                self.on_result(result)
+            return result
+        finally:
+            STEP_DURATION.observe(time.monotonic() - started, flow=self.graph.flow.name, step=name)
+
+    async def _execute(
+        self,
+        step: FlowStep,
+        step_input: str,
+        active: List[StepResult],
+        user_message: str
+    ) -> StepResult:
+        name = step.step_name
+        if step.is_router:
+            # O router avalia a saída dos passos anteriores e repassa adiante
+            # a mesma entrada que eles receberam (ex.: o e-mail classificado).
+            route = evaluate_router(step, step_input)
+            forwarded = "\n\n".join(result.input for result in active) if active else user_message
+            logger.info(f"Router '{name}' selecionou: {route or 'nenhum ramo'}")
+            return StepResult(step_name=name, status="done", input=step_input, output=forwarded, route=route)
+
+        assistant_message, messages = await self.run_step(step, step_input)
+        return StepResult(
+            step_name=name,
+            status="done",
+            input=step_input,
+            output=assistant_message if assistant_message is not None else step_input,
+            assistant_message=assistant_message,
+            messages=messages,
+        )
+
+    def final_response(self, results: Dict[str, StepResult], user_message: str) -> str:
+        """Saídas dos passos executados que não têm dependentes executados."""
+        finals = [
+            result.output for name, result in results.items()
+            if result.status == "done"
+            and not self.graph.steps[name].is_router
+            and not any(results[d].status == "done" for d in self.graph.dependants(name))
+        ]
+        if finals:
+            return "\n\n".join(finals)
+        executed = [
+            result.output for name, result in results.items()
+            if result.status == "done" and not self.graph.steps[name].is_router
+        ]
+        return executed[-1] if executed else user_message
@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import json
+import sys
+from typing import Dict, Any, Optional, List, Tuple, AsyncIterable, AsyncIterator, Iterable, Union
+import logging
+import yaml
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FORMATS = ("ndjson", "yaml")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "yaml": "application/x-yaml"}
+
+# As versões em C do PyYAML são bem mais rápidas; nem toda instalação as inclui
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+def detect_format(name: Optional[str]) -> str:
+    """Formato a partir de um nome de arquivo ou Content-Type; NDJSON se nada indicar YAML."""
+    return "yaml" if name and ("yaml" in name or name.endswith(".yml")) else "ndjson"
+
+async def iter_chunk_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Divide um corpo recebido em pedaços (ex.: `Request.stream()`) em linhas, sem carregá-lo inteiro.
+
+    As linhas não são decodificadas: quem as lê transforma uma linha inválida
+    em UTF-8 em erro do próprio registro.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if buffer:
+        yield buffer.rstrip(b"\r")
+
+async def iter_file_lines(source: Iterable[Union[str, bytes]]) -> AsyncIterator[Union[str, bytes]]:
+    for line in source:
+        yield line.rstrip(b"\r\n" if isinstance(line, bytes) else "\r\n")
+
+def _decode(line: Union[str, bytes]) -> str:
+    if isinstance(line, bytes):
+        try:
+            return line.decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise ValueError(f"Texto inválido em UTF-8: {str(e)}")
+    return line
+
+def _load_yaml(lines: List[str]) -> Any:
+    try:
+        return yaml.load("\n".join(lines), Loader=_YAML_LOADER)
+    except yaml.YAMLError as e:
+        return ValueError(f"YAML inválido: {str(e)}")
+
+async def parse_records(lines: AsyncIterable[Union[str, bytes]], fmt: str) -> AsyncIterator[Tuple[int, Any]]:
+    """Produz (índice, registro) para cada objeto NDJSON ou documento YAML.
+
+    Linhas em bytes são decodificadas aqui. Registros que não puderam ser
+    lidos (JSON ou YAML inválido, texto inválido em UTF-8) são produzidos como
+    ValueError, para que o erro seja reportado no índice certo sem
+    interromper a leitura. Documentos YAML são separados por linhas `---`.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato inválido: '{fmt}' (use {' ou '.join(FORMATS)})")
+    index = 0
+    if fmt == "ndjson":
+        async for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(_decode(line))
+            except json.JSONDecodeError as e:
+                record = ValueError(f"JSON inválido: {str(e)}")
+            except ValueError as e:
+                record = e
+            yield index, record
+            index += 1
+        return
+
+    document: List[str] = []
+    error: Optional[ValueError] = None
+    async for raw in lines:
+        try:
+            line = _decode(raw)
+        except ValueError as e:
+            # O documento inteiro vira erro, mas a leitura segue até o próximo `---`
+            error = error or e
+            line = ""
+        if line.rstrip() in ("---", "..."):
+            if error or any(part.strip() and not part.lstrip().startswith("#") for part in document):
+                yield index, error or _load_yaml(document)
+                index += 1
+            document, error = [], None
+        else:
+            document.append(line)
+    if error or any(part.strip() and not part.lstrip().startswith("#") for part in document):
+        yield index, error or _load_yaml(document)
+
+def format_record(record: Dict[str, Any], fmt: str) -> str:
+    if fmt == "yaml":
+        return "---\n" + yaml.dump(record, Dumper=_YAML_DUMPER, allow_unicode=True, sort_keys=False)
+    return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+async def _main(args):
+    from database import get_flows_collection
+    from flow_manager import FlowManager
+
+    manager = FlowManager(get_flows_collection())
+    if args.command == "import":
+        fmt = args.format or detect_format(args.file)
+        source = open(args.file, "rb") if args.file != "-" else sys.stdin.buffer
+        try:
+            report = await manager.import_flows(
+                parse_records(iter_file_lines(source), fmt), batch_size=args.batch_size
+            )
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+        if report["failed"]:
+            raise SystemExit(1)
+    else:
+        fmt = args.format or detect_format(args.output)
+        output = open(args.output, "w", encoding="utf-8") if args.output != "-" else sys.stdout
+        exported = 0
+        try:
+            async for record in manager.export_flows(is_active=args.is_active):
+                output.write(format_record(record, fmt))
+                exported += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        logger.info(f"{exported} fluxos exportados")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa e exporta fluxos em NDJSON ou YAML (vários documentos).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="Valida e grava os fluxos do arquivo")
+    importer.add_argument("file", help="Arquivo de entrada ('-' para stdin)")
+    importer.add_argument("--format", choices=FORMATS, help="Padrão: pela extensão do arquivo")
+    importer.add_argument("--batch-size", type=int, default=settings.FLOW_IMPORT_BATCH_SIZE)
+    exporter = commands.add_parser("export", help="Grava todos os fluxos no arquivo")
+    exporter.add_argument("-o", "--output", default="-", help="Arquivo de saída ('-' para stdout)")
+    exporter.add_argument("--format", choices=FORMATS, help="Padrão: pela extensão do arquivo")
+    exporter.add_argument("--active", dest="is_active", action="store_const", const=True, default=None,
+                          help="Exporta apenas fluxos ativos")
+    asyncio.run(_main(parser.parse_args()))
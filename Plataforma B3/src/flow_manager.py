@@ -1,54 +1,227 @@
-from typing import List, Dict, Any, Optional
-from pydantic import BaseModel, Field, validator
-import re
+from typing import List, Dict, Any, Optional, Tuple, Union, AsyncIterable, AsyncIterator
+from collections import OrderedDict
+import asyncio
+import time
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
 import logging
-from pymongo.collection import Collection
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
 import uuid
 import yaml
-import requests
+from config import settings
+from flow_repository import FlowRepository
+from rate_limit import backoff_delay
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Validado pelo pydantic-core (Field(pattern=...)), sem passar por validadores em Python
+NAME_PATTERN = r'^[a-zA-Z0-9_\s\-]+$'
+NAME_PATTERN_MESSAGE = 'deve conter apenas letras, números, espaços, underscores e hífens'
+
+# Campos gerados pelo servidor, ignorados na importação
+SERVER_FIELDS = ("_id", "id", "plan", "revision", "schema_version", "created_at", "updated_at")
+
 class FlowStep(BaseModel):
-    system_prompt: str = Field(..., min_length=1)
-    step_name: str = Field(..., min_length=1)
+    system_prompt: Optional[str] = Field(default=None, min_length=1)
+    step_name: str = Field(..., min_length=1, pattern=NAME_PATTERN)
     step_order: Optional[int] = Field(default=None, ge=1)
     max_tokens: Optional[int] = Field(default=100, ge=1)
     temperature: Optional[float] = Field(default=0.7, ge=0.0, le=1.0)
     model: Optional[str] = Field(default="gpt-4o")
     conditions: Optional[Dict[str, str]] = None
     execute_if: Optional[str] = None
+    depends_on: Optional[List[str]] = None
+    cache: bool = False
+    cache_ttl: Optional[int] = Field(default=None, ge=1)
+    semantic_cache: bool = False
+    semantic_threshold: Optional[float] = Field(default=None, gt=0.0, le=1.0)
+    coalesce: Optional[bool] = None
+    fallback_models: Optional[List[str]] = None
+    hedge: bool = False
+    hedge_percentile: float = Field(default=0.95, gt=0.0, lt=1.0)
+    hedge_budget: float = Field(default=0.1, ge=0.0, le=1.0)
+    chunked: bool = False
+    chunk_tokens: Optional[int] = Field(default=None, ge=1)
+    chunk_overlap: Optional[int] = Field(default=None, ge=0)
+    chunk_concurrency: Optional[int] = Field(default=None, ge=1)
+    reduce_prompt: Optional[str] = Field(default=None, min_length=1)
+
+    @property
+    def is_router(self) -> bool:
+        return bool(self.conditions)
 
-    @validator('step_name')
-    def validate_step_name(cls, v):
-        if not re.match(r'^[a-zA-Z0-9_\s\-]+$', v):
-            raise ValueError('O nome do passo deve conter apenas letras, números, espaços, underscores e hífens')
-        return v
+    @property
+    def should_coalesce(self) -> bool:
+        """Sem configuração explícita, só agrupa chamadas de passos de baixa temperatura."""
+        if self.coalesce is not None:
+            return self.coalesce
+        return (self.temperature or 0.0) <= settings.COALESCE_MAX_TEMPERATURE
+
+    @model_validator(mode='after')
+    def validate_system_prompt(self):
+        if not self.conditions and not self.system_prompt:
+            raise ValueError('Passos que não são routers devem ter system_prompt')
+        if self.chunked and self.conditions:
+            raise ValueError('Routers não podem usar chunked')
+        if self.chunk_tokens is not None and self.chunk_overlap is not None and self.chunk_overlap >= self.chunk_tokens:
+            raise ValueError('chunk_overlap deve ser menor que chunk_tokens')
+        return self
 
 class Flow(BaseModel):
-    name: str = Field(..., min_length=1)
+    name: str = Field(..., min_length=1, pattern=NAME_PATTERN)
     description: Optional[str] = None
-    steps: List[FlowStep] = Field(..., min_items=1)
+    steps: List[FlowStep] = Field(..., min_length=1)
     is_active: bool = True
+    timeout: Optional[float] = Field(default=None, gt=0)
+    # Plano de execução gerado por flow_optimizer ao salvar; não deve ser informado pelo cliente
+    plan: Optional[Dict[str, Any]] = None
+
+def format_validation_error(error: ValueError) -> str:
+    """Mensagem curta de um erro de validação: `campo.subcampo: motivo` por problema."""
+    errors = getattr(error, "errors", None)
+    if not callable(errors):
+        return str(error)
+    def message(item) -> str:
+        # O único `pattern` dos modelos é o de nomes
+        return NAME_PATTERN_MESSAGE if item.get("type") == "string_pattern_mismatch" else item["msg"]
+
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {message(item)}" if item["loc"] else message(item)
+        for item in errors()
+    )
+
+# Servidor sem change streams (standalone, ou API do Mongo sem suporte): não adianta tentar de novo
+CHANGE_STREAM_UNSUPPORTED_CODES = {40573, 40324, 115}
+# O token de retomada saiu do oplog; o stream precisa recomeçar do zero
+CHANGE_STREAM_HISTORY_LOST = 286
+
+FLOW_SCHEMA_VERSION = 2  # 1: documento com o fluxo serializado em YAML; 2: documento nativo
+
+class FlowCache:
+    """Cache em processo de fluxos já validados, indexado por id e revisão."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        # O TTL limita a defasagem entre réplicas quando não há change stream
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[int, Flow, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Estado do change stream: starting, watching, retrying, unsupported ou stopped
+        self.watch_status = "stopped"
+        self.watch_restarts = 0
 
-    @validator('name')
-    def validate_name(cls, v):
-        if not re.match(r'^[a-zA-Z0-9_\s\-]+$', v):
-            raise ValueError('O nome do fluxo deve conter apenas letras, números, espaços, underscores e hífens')
-        return v
+    def get(self, flow_id: str) -> Optional[Flow]:
+        entry = self._entries.get(flow_id)
+        if entry is None or entry[2] <= time.monotonic():
+            self._entries.pop(flow_id, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(flow_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, flow_id: str, revision: int, flow: Flow):
+        current = self._entries.get(flow_id)
+        if current is not None and current[0] > revision:
+            return
+        self._entries[flow_id] = (revision, flow, time.monotonic() + self.ttl)
+        self._entries.move_to_end(flow_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, flow_id: str, revision: Optional[int] = None):
+        """Remove o fluxo; com `revision`, só remove entradas mais antigas que ela."""
+        current = self._entries.get(flow_id)
+        if current is not None and (revision is None or current[0] < revision):
+            del self._entries[flow_id]
+
+    def clear(self):
+        self._entries.clear()
+
+    async def watch(
+        self,
+        collection: AsyncIOMotorCollection,
+        retry_base_delay: float = settings.FLOW_CACHE_WATCH_RETRY_BASE_DELAY,
+        retry_max_delay: float = settings.FLOW_CACHE_WATCH_RETRY_MAX_DELAY
+    ):
+        """Invalida entradas a partir de um change stream do Mongo.
+
+        Mantém os caches de várias réplicas coerentes. Se o stream cair
+        (eleição no replica set, queda de rede), ele é reaberto com backoff a
+        partir do último token de retomada, sem perder as alterações do
+        intervalo; sem token, o cache é esvaziado. Se o servidor não suportar
+        change streams, apenas registra o erro. O estado fica em `watch_status`.
+        """
+        resume_token = None
+        attempt = 0
+        self.watch_status = "starting"
+        try:
+            while True:
+                try:
+                    async with collection.watch(full_document="updateLookup", resume_after=resume_token) as stream:
+                        self.watch_status = "watching"
+                        attempt = 0
+                        async for change in stream:
+                            flow_id = change.get("documentKey", {}).get("_id")
+                            revision = (change.get("fullDocument") or {}).get("revision")
+                            if flow_id is not None:
+                                self.invalidate(flow_id, revision if change["operationType"] != "delete" else None)
+                            resume_token = stream.resume_token
+                except asyncio.CancelledError:
+                    raise
+                except OperationFailure as e:
+                    if e.code in CHANGE_STREAM_UNSUPPORTED_CODES:
+                        logger.warning(f"Change stream de fluxos indisponível, cache sem invalidação remota: {str(e)}")
+                        self.watch_status = "unsupported"
+                        self.clear()
+                        return
+                    if e.code == CHANGE_STREAM_HISTORY_LOST:
+                        resume_token = None
+                    error = e
+                except Exception as e:
+                    error = e
+                else:
+                    error = "stream encerrado pelo servidor"
+                if resume_token is None:
+                    # Sem como retomar, alterações do intervalo podem ter sido perdidas
+                    self.clear()
+                self.watch_status = "retrying"
+                self.watch_restarts += 1
+                delay = backoff_delay(attempt, retry_base_delay, retry_max_delay)
+                attempt += 1
+                logger.warning(f"Change stream de fluxos interrompido ({str(error)}); reabrindo em {delay:.1f}s")
+                await asyncio.sleep(delay)
+        finally:
+            if self.watch_status != "unsupported":
+                self.watch_status = "stopped"
+
+flow_cache = FlowCache(max_entries=settings.FLOW_CACHE_MAX_ENTRIES, ttl=settings.FLOW_CACHE_TTL)
 
 class FlowManager:
-    def __init__(self, collection: Collection):
-        self.collection = collection
+    def __init__(self, collection: AsyncIOMotorCollection, cache: Optional[FlowCache] = None):
+        self.repository = FlowRepository(collection)
+        self.cache = cache if cache is not None else flow_cache
+
+    def optimize(self, flow: Flow) -> Flow:
+        """Valida o grafo do fluxo e anexa o plano de execução pré-computado (ver flow_optimizer)."""
+        from flow_optimizer import optimize_flow
+        return flow.model_copy(update={"plan": optimize_flow(flow)})
 
-    def validate_step_orders(self, steps: List[FlowStep]):
-        step_orders = [step.step_order for step in steps if step.step_order is not None]
-        if len(set(step_orders)) != len(step_orders):
-            raise ValueError("Ordens de passos devem ser únicas")
-        if sorted(step_orders) != list(range(1, len(step_orders) + 1)):
-            raise ValueError("Ordens de passos devem ser sequenciais começando de 1")
+    def _ensure_plan(self, flow: Flow) -> Flow:
+        """Gera o plano de fluxos gravados antes do otimizador (ou com plano de outra versão)."""
+        from flow_executor import PLAN_VERSION
+        if flow.plan and flow.plan.get("version") == PLAN_VERSION:
+            return flow
+        try:
+            return self.optimize(flow)
+        except ValueError as e:
+            # Fluxos antigos continuam executáveis; o grafo é montado a cada execução
+            logger.warning(f"Fluxo '{flow.name}' sem plano de execução: {str(e)}")
+            return flow.model_copy(update={"plan": None})
 
     def json_to_yaml(self, json_data: Dict) -> str:
         """Converte JSON para YAML."""
@@ -62,71 +235,240 @@ class FlowManager:
         """Gera um identificador único para o workflow."""
         return str(uuid.uuid4())
 
-    def create_flow(self, flow_json: Dict) -> str:
-        """Cria um novo workflow a partir de JSON."""
-        self.validate_step_orders(flow_json['steps'])
+    def _to_flow(self, flow: Union[Flow, Dict]) -> Flow:
+        return flow if isinstance(flow, Flow) else Flow(**flow)
+
+    def _flow_fields(self, flow_doc: Dict) -> Dict:
+        """Campos do fluxo de um documento, aceitando também o formato YAML legado."""
+        if "yaml" in flow_doc:
+            return self.yaml_to_json(flow_doc["yaml"])
+        return {key: flow_doc[key] for key in Flow.model_fields if key in flow_doc}
+
+    async def create_flow(self, flow_json: Union[Flow, Dict]) -> str:
+        """Cria um novo workflow armazenado como documento nativo."""
+        flow = self.optimize(self._to_flow(flow_json))
         flow_id = self.generate_workflow_id()
-        flow_yaml = self.json_to_yaml(flow_json)
-        self.collection.insert_one({"_id": flow_id, "yaml": flow_yaml})
+        now = datetime.utcnow()
+        await self.repository.insert({
+            "_id": flow_id,
+            **flow.model_dump(),
+            "schema_version": FLOW_SCHEMA_VERSION,
+            "revision": 1,
+            "created_at": now,
+            "updated_at": now,
+        })
+        self.cache.put(flow_id, 1, flow)
         return flow_id
 
-    def get_flow(self, flow_id: str) -> Dict:
-        """Recupera um workflow e converte para JSON."""
+    async def get_flow(self, flow_id: str) -> Optional[Flow]:
+        """Recupera um workflow validado, usando o cache quando possível."""
+        flow = self.cache.get(flow_id)
+        if flow is not None:
+            return flow
         logger.info(f"Obtendo fluxo com ID: {flow_id}")
-        flow_doc = self.collection.find_one({"_id": flow_id})
+        flow_doc = await self.repository.find_by_id(flow_id)
         if not flow_doc:
+            return None
+        flow = self._ensure_plan(Flow(**self._flow_fields(flow_doc)))
+        self.cache.put(flow_id, flow_doc.get("revision", 0), flow)
+        return flow
+
+    async def warm_cache(self, limit: int = settings.FLOW_CACHE_WARM_LIMIT) -> int:
+        """Carrega até `limit` fluxos ativos no cache, já com o plano de execução."""
+        loaded = 0
+        async for flow_doc in self.repository.iter_documents(is_active=True, batch_size=min(limit, 1000)):
+            if loaded >= limit:
+                break
+            try:
+                flow = self._ensure_plan(Flow(**self._flow_fields(flow_doc)))
+            except ValueError as e:
+                logger.warning(f"Fluxo {flow_doc['_id']} inválido, fora do cache: {str(e)}")
+                continue
+            self.cache.put(flow_doc["_id"], flow_doc.get("revision", 0), flow)
+            loaded += 1
+        logger.info(f"Cache de fluxos aquecido com {loaded} fluxos")
+        return loaded
+
+    async def update_flow(self, flow_id: str, flow_json: Union[Flow, Dict]):
+        """Atualiza um workflow existente, incrementando sua revisão."""
+        flow = self.optimize(self._to_flow(flow_json))
+        flow_doc = await self.repository.update(flow_id, {
+            "$set": {**flow.model_dump(), "schema_version": FLOW_SCHEMA_VERSION, "updated_at": datetime.utcnow()},
+            "$unset": {"yaml": ""},
+            "$inc": {"revision": 1},
+        })
+        self.cache.invalidate(flow_id)
+        if flow_doc is None:
             raise ValueError(f"Workflow com ID {flow_id} não encontrado")
-        return self.yaml_to_json(flow_doc["yaml"])
-
-    def update_flow(self, flow_id: str, flow_json: Dict):
-        """Atualiza um workflow existente."""
-        self.validate_step_orders(flow_json['steps'])
-        flow_yaml = self.json_to_yaml(flow_json)
-        result = self.collection.update_one({"_id": flow_id}, {"$set": {"yaml": flow_yaml}})
-        if result.matched_count == 0:
-            raise ValueError(f"Workflow com ID {flow_id} não encontrado")
+        self.cache.put(flow_id, flow_doc["revision"], flow)
         logger.info(f"Fluxo atualizado com sucesso: {flow_id}")
 
-    def delete_flow(self, flow_id: str):
+    def _validate_record(self, record: Any) -> Tuple[str, Flow]:
+        """Valida um registro importado; sem `id`, o fluxo recebe um novo identificador."""
+        if not isinstance(record, dict):
+            raise ValueError("O registro deve ser um objeto")
+        flow_id = record.get("id", record.get("_id"))
+        if flow_id is not None and not isinstance(flow_id, str):
+            raise ValueError("O campo id deve ser uma string")
+        flow = self.optimize(Flow(**{key: value for key, value in record.items() if key not in SERVER_FIELDS}))
+        return flow_id or self.generate_workflow_id(), flow
+
+    async def import_flows(
+        self,
+        records: AsyncIterable[Tuple[int, Any]],
+        batch_size: int = settings.FLOW_IMPORT_BATCH_SIZE
+    ) -> Dict[str, Any]:
+        """Valida e grava fluxos em lotes de upserts sem ordem.
+
+        `records` produz (índice, registro), em que o registro pode ser uma
+        exceção de leitura. Registros com `id` substituem o fluxo existente
+        (incrementando a revisão) ou o criam com esse id. Registros inválidos
+        ou com erro de escrita são reportados em `errors` sem interromper a
+        importação; se um id se repetir, vale o último registro.
+        """
+        report: Dict[str, Any] = {"received": 0, "created": 0, "updated": 0, "failed": 0, "errors": []}
+        batch: Dict[str, Tuple[int, Flow]] = {}
+
+        def fail(index: int, flow_id: Optional[str], message: str):
+            report["failed"] += 1
+            report["errors"].append({"index": index, "id": flow_id, "error": message})
+
+        async for index, record in records:
+            report["received"] += 1
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                flow_id, flow = self._validate_record(record)
+            except ValueError as e:
+                fail(index, record.get("id") if isinstance(record, dict) else None, format_validation_error(e))
+                continue
+            if flow_id in batch:
+                # Mantém a ordem de aplicação mesmo com upserts sem ordem dentro do lote
+                await self._write_import_batch(batch, report, fail)
+                batch = {}
+            batch[flow_id] = (index, flow)
+            if len(batch) >= batch_size:
+                await self._write_import_batch(batch, report, fail)
+                batch = {}
+        if batch:
+            await self._write_import_batch(batch, report, fail)
+        logger.info(
+            f"Importação concluída: {report['created']} criados, {report['updated']} atualizados, "
+            f"{report['failed']} com erro"
+        )
+        return report
+
+    async def _write_import_batch(self, batch: Dict[str, Tuple[int, Flow]], report: Dict[str, Any], fail):
+        now = datetime.utcnow()
+        flow_ids = list(batch)
+        operations = [
+            UpdateOne(
+                {"_id": flow_id},
+                {
+                    "$set": {**batch[flow_id][1].model_dump(), "schema_version": FLOW_SCHEMA_VERSION, "updated_at": now},
+                    "$unset": {"yaml": ""},
+                    "$inc": {"revision": 1},
+                    "$setOnInsert": {"created_at": now},
+                },
+                upsert=True,
+            )
+            for flow_id in flow_ids
+        ]
+        try:
+            upserted, errors = await self.repository.bulk_upsert(operations)
+        except Exception as e:
+            upserted, errors = set(), {position: str(e) for position in range(len(operations))}
+        for position, flow_id in enumerate(flow_ids):
+            self.cache.invalidate(flow_id)
+            if position in errors:
+                fail(batch[flow_id][0], flow_id, errors[position])
+            elif position in upserted:
+                report["created"] += 1
+            else:
+                report["updated"] += 1
+
+    async def export_flows(self, is_active: Optional[bool] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Produz os fluxos com `id` e os campos da definição, prontos para `import_flows`."""
+        async for flow_doc in self.repository.iter_documents(is_active=is_active):
+            fields = self._flow_fields(flow_doc)
+            fields.pop("plan", None)
+            yield {"id": flow_doc["_id"], **fields}
+
+    async def delete_flow(self, flow_id: str):
         logger.info(f"Tentando excluir fluxo com ID: {flow_id}")
-        result = self.collection.delete_one({"_id": flow_id})
-        if result.deleted_count == 0:
+        deleted = await self.repository.delete(flow_id)
+        self.cache.invalidate(flow_id)
+        if not deleted:
             raise ValueError(f"Fluxo com ID {flow_id} não encontrado")
         logger.info(f"Fluxo excluído com sucesso: {flow_id}")
 
-    def list_flows(self) -> List[Dict[str, Any]]:
-        logger.info("Listando todos os fluxos")
-        flows = self.collection.find()
-        return [
-            {
-                "id": flow["_id"],
-                "name": flow["name"],
-                "description": flow["description"],
-                "steps_count": len(flow["steps"]),
-                "is_active": flow["is_active"]
-            }
-            for flow in flows
-        ]
+    async def list_flows(
+        self,
+        limit: int = 100,
+        after: Optional[str] = None,
+        is_active: Optional[bool] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Lista uma página de fluxos e retorna também o cursor da próxima página."""
+        logger.info(f"Listando fluxos (limit={limit}, after={after})")
+        flow_docs, next_after = await self.repository.list_page(limit, after=after, is_active=is_active)
+        listed = []
+        for flow_doc in flow_docs:
+            fields = self._flow_fields(flow_doc)
+            listed.append({
+                "id": flow_doc["_id"],
+                "name": fields.get("name"),
+                "description": fields.get("description"),
+                "steps_count": len(fields.get("steps", [])),
+                "is_active": fields.get("is_active", True)
+            })
+        return listed, next_after
 
-    def execute_flow(self, flow_id: str):
-        """Executa um workflow usando Argo."""
-        logger.info(f"Executando fluxo com ID: {flow_id}")
-        flow_doc = self.collection.find_one({"_id": flow_id})
-        if not flow_doc:
+    async def execute_flow(self, flow_id: str, user_message: str, argo_client, run_log) -> Dict[str, str]:
+        """Executa o fluxo no Argo: registra a execução, compila o Workflow e o submete.
+
+        Os passos rodam nos pods do Argo e gravam suas saídas na execução
+        retornada, que pode ser acompanhada em /runs/{run_id}.
+        """
+        result = (await self.execute_flow_batch(flow_id, [user_message], argo_client, run_log))[0]
+        if "error" in result:
+            raise ValueError(f"Erro ao submeter workflow: {result['error']}")
+        return result
+
+    async def execute_flow_batch(
+        self,
+        flow_id: str,
+        user_messages: List[str],
+        argo_client,
+        run_log,
+        concurrency: int = settings.ARGO_SUBMIT_CONCURRENCY
+    ) -> List[Dict[str, str]]:
+        """Submete um workflow do Argo por mensagem; retorna `run_id` e `workflow_name` (ou `error`) por item."""
+        from argo_compiler import compile_workflow
+        from flow_executor import FlowGraph
+
+        logger.info(f"Executando fluxo com ID {flow_id} no Argo ({len(user_messages)} execuções)")
+        flow = await self.get_flow(flow_id)
+        if flow is None:
             raise ValueError(f"Workflow com ID {flow_id} não encontrado")
-        
-        yaml_content = flow_doc["yaml"]
-        self.submit_workflow(yaml_content)
-
-    def submit_workflow(self, yaml_content: str):
-        """Submete um workflow ao Argo."""
-        url = "http://argo-server.argo:2746/api/v1/workflows/argo"
-        headers = {"Content-Type": "application/yaml"}
-        response = requests.post(url, headers=headers, data=yaml_content)
-        if response.status_code == 200:
-            logger.info("Workflow submetido com sucesso")
-        else:
-            logger.error(f"Erro ao submeter workflow: {response.text}")
+        if not flow.is_active:
+            raise ValueError("O fluxo não está ativo")
+        FlowGraph(flow)
+
+        run_ids = [run_log.start_run(flow, flow_id, user_message) for user_message in user_messages]
+        workflows = [compile_workflow(flow, run_id, flow_id) for run_id in run_ids]
+        # Os passos leem a execução do banco, então ela precisa estar gravada antes da submissão
+        await run_log.flush()
+        submitted = await argo_client.submit_many(workflows, concurrency=concurrency)
+
+        results = []
+        for run_id, outcome in zip(run_ids, submitted):
+            if "error" in outcome:
+                run_log.finish_run(run_id, "failed", error=outcome["error"])
+                results.append({"run_id": run_id, "error": outcome["error"]})
+            else:
+                run_log.update_run(run_id, {"executor": "argo", "workflow_name": outcome["name"]})
+                results.append({"run_id": run_id, "workflow_name": outcome["name"]})
+        return results
 
     def process_step(self, step: FlowStep, user_input: str) -> Dict:
         pass
@@ -0,0 +1,129 @@
+from collections import Counter
+from typing import List, Dict, Any, Set
+import logging
+from flow_manager import Flow
+from flow_executor import FlowGraph, PLAN_VERSION
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def validate_flow(flow: Flow):
+    """Valida a estrutura do fluxo e reporta todos os problemas encontrados de uma vez.
+
+    Verifica ordens sequenciais, nomes duplicados, rótulos de `execute_if`
+    sem router, rótulos declarados por mais de um router, `depends_on`
+    inexistente, passos sem posição no grafo e, por fim, ciclos.
+    """
+    errors: List[str] = []
+    names = [step.step_name for step in flow.steps]
+
+    step_orders = sorted({step.step_order for step in flow.steps if step.step_order is not None})
+    if step_orders != list(range(1, len(step_orders) + 1)):
+        errors.append(f"Ordens de passos devem ser sequenciais começando de 1 (encontradas: {step_orders})")
+
+    for name, count in Counter(names).items():
+        if count > 1:
+            errors.append(f"Nome de passo duplicado: '{name}' ({count} vezes)")
+
+    routers_by_label: Dict[str, List[str]] = {}
+    for step in flow.steps:
+        for label in step.conditions or {}:
+            routers_by_label.setdefault(label, []).append(step.step_name)
+    for label, routers in routers_by_label.items():
+        if len(routers) > 1:
+            errors.append(f"Rótulo '{label}' declarado por mais de um router: {routers}")
+
+    for step in flow.steps:
+        if step.execute_if is not None and step.execute_if not in routers_by_label:
+            errors.append(f"Passo '{step.step_name}' usa execute_if '{step.execute_if}' sem router correspondente")
+        for dep in step.depends_on or []:
+            if dep == step.step_name:
+                errors.append(f"Passo '{step.step_name}' depende de si mesmo")
+            elif dep not in names:
+                errors.append(f"Passo '{step.step_name}' depende de passo inexistente '{dep}'")
+        if step.step_order is None and step.depends_on is None and not step.is_router and step.execute_if is None:
+            errors.append(f"Passo '{step.step_name}' sem step_order deve ser um router ou declarar depends_on")
+
+    if errors:
+        raise ValueError("Fluxo inválido: " + "; ".join(errors))
+    # Com a estrutura válida, a montagem do grafo só pode falhar por ciclo
+    FlowGraph(flow, use_plan=False)
+
+def _duplicate_warnings(flow: Flow) -> List[str]:
+    """Passos idênticos na mesma ordem: ambos executam e repetem a mesma chamada ao modelo."""
+    seen: Dict[Any, str] = {}
+    warnings = []
+    for step in flow.steps:
+        if step.is_router:
+            continue
+        signature = (step.step_order, step.model, step.system_prompt, step.temperature, step.max_tokens,
+                     step.execute_if, tuple(step.depends_on or ()))
+        if signature in seen:
+            warnings.append(f"Passos '{seen[signature]}' e '{step.step_name}' são idênticos na ordem {step.step_order}")
+        else:
+            seen[signature] = step.step_name
+    return warnings
+
+def _prune(graph: FlowGraph) -> Set[str]:
+    """Routers mortos: nenhum passo vivo depende da rota que escolhem.
+
+    Routers não produzem resposta final, então um router sem dependentes só
+    gasta tempo; removê-lo pode deixar sem uso o router que o alimentava.
+    Passos de modelo nunca são eliminados: todo passo tem uma raiz como
+    ancestral e pode executar, e sua saída vira entrada ou resposta final.
+    """
+    live = set(graph.steps)
+    while True:
+        unused_routers = {
+            name for name in live
+            if graph.steps[name].is_router and not any(dep in live for dep in graph.dependants(name))
+        }
+        if not unused_routers:
+            return set(graph.steps) - live
+        live -= unused_routers
+
+def optimize_flow(flow: Flow) -> Dict[str, Any]:
+    """Valida o fluxo e retorna o plano de execução a ser guardado com ele.
+
+    O plano traz a ordem topológica e as dependências já resolvidas apenas
+    entre passos vivos, além dos passos eliminados e de avisos. O
+    FlowExecutor usa o plano diretamente, sem reconstruir nem reordenar o
+    grafo a cada execução.
+    """
+    validate_flow(flow)
+    graph = FlowGraph(flow, use_plan=False)
+    pruned = _prune(graph)
+    order = [name for name in graph.order if name not in pruned]
+    dependencies = {
+        name: [dep for dep in graph.dependencies[name] if dep not in pruned] for name in order
+    }
+
+    levels: List[List[str]] = []
+    level_of: Dict[str, int] = {}
+    for name in order:
+        level = max((level_of[dep] + 1 for dep in dependencies[name]), default=0)
+        level_of[name] = level
+        if level == len(levels):
+            levels.append([])
+        levels[level].append(name)
+
+    warnings = _duplicate_warnings(flow)
+    used_labels = {graph.steps[name].execute_if for name in order}
+    for name in order:
+        step = graph.steps[name]
+        for label in step.conditions or {}:
+            if label not in used_labels:
+                warnings.append(f"Rótulo '{label}' do router '{name}' não é usado por nenhum passo")
+    if pruned:
+        warnings.append(f"Routers eliminados por não terem a rota usada: {sorted(pruned)}")
+    for warning in warnings:
+        logger.warning(f"Fluxo '{flow.name}': {warning}")
+
+    return {
+        "version": PLAN_VERSION,
+        "order": order,
+        "dependencies": dependencies,
+        "levels": levels,
+        "pruned": sorted(pruned, key=graph.order.index),
+        "warnings": warnings,
+    }
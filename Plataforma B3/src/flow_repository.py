@@ -0,0 +1,115 @@
+from typing import List, Dict, Any, Optional, Tuple, Set, AsyncIterator
+import logging
+import yaml
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Campos lidos na listagem; `yaml` cobre documentos no formato legado
+LIST_PROJECTION = {"yaml": 1, "name": 1, "description": 1, "steps.step_name": 1, "is_active": 1}
+
+def active_filter(is_active: bool) -> Dict[str, Any]:
+    """Filtro por `is_active`; documentos sem o campo (formato legado) contam como ativos, o padrão do Flow."""
+    return {"is_active": {"$ne": False}} if is_active else {"is_active": False}
+
+class FlowRepository:
+    """Acesso assíncrono (motor) à coleção de fluxos."""
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        """Cria os índices usados pela listagem e por filtros (idempotente)."""
+        await self.collection.create_index([("name", ASCENDING)], name="name_1")
+        await self.collection.create_index([("is_active", ASCENDING), ("_id", ASCENDING)], name="is_active_1__id_1")
+        await self.backfill_is_active()
+        logger.info("Índices da coleção de fluxos garantidos")
+
+    async def backfill_is_active(self, batch_size: int = 1000) -> int:
+        """Grava `is_active` nos documentos legados que não o têm, com o valor do YAML (padrão True).
+
+        Assim o filtro por `is_active` também encontra esses documentos pelo
+        índice, inclusive os inativos.
+        """
+        updated = 0
+        operations: List[UpdateOne] = []
+        async for document in self.collection.find({"is_active": {"$exists": False}}, {"yaml": 1}):
+            fields = yaml.safe_load(document["yaml"]) if "yaml" in document else None
+            is_active = fields.get("is_active", True) if isinstance(fields, dict) else True
+            operations.append(UpdateOne(
+                {"_id": document["_id"], "is_active": {"$exists": False}}, {"$set": {"is_active": bool(is_active)}}
+            ))
+            if len(operations) >= batch_size:
+                updated += (await self.collection.bulk_write(operations, ordered=False)).modified_count
+                operations = []
+        if operations:
+            updated += (await self.collection.bulk_write(operations, ordered=False)).modified_count
+        if updated:
+            logger.info(f"Campo is_active gravado em {updated} fluxos legados")
+        return updated
+
+    async def insert(self, document: Dict[str, Any]):
+        await self.collection.insert_one(document)
+
+    async def find_by_id(self, flow_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": flow_id})
+
+    async def update(self, flow_id: str, update: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Aplica `update` e retorna o documento com a nova revisão, ou None se o fluxo não existir."""
+        return await self.collection.find_one_and_update(
+            {"_id": flow_id},
+            update,
+            projection={"revision": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def delete(self, flow_id: str) -> bool:
+        result = await self.collection.delete_one({"_id": flow_id})
+        return result.deleted_count > 0
+
+    async def bulk_upsert(self, operations: List[UpdateOne]) -> Tuple[Set[int], Dict[int, str]]:
+        """Executa os upserts sem ordem em um único `bulk_write`.
+
+        Retorna os índices das operações que criaram documentos e as
+        mensagens de erro por índice; uma operação com erro não impede as
+        demais.
+        """
+        try:
+            result = await self.collection.bulk_write(operations, ordered=False)
+            return set(result.upserted_ids), {}
+        except BulkWriteError as e:
+            details = e.details
+            upserted = {item["index"] for item in details.get("upserted", [])}
+            return upserted, {error["index"]: error["errmsg"] for error in details.get("writeErrors", [])}
+
+    async def iter_documents(self, is_active: Optional[bool] = None, batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """Percorre todos os fluxos em ordem de `_id`, lendo `batch_size` documentos por vez."""
+        query: Dict[str, Any] = {} if is_active is None else active_filter(is_active)
+        async for document in self.collection.find(query).sort("_id", ASCENDING).batch_size(batch_size):
+            yield document
+
+    async def list_page(
+        self,
+        limit: int,
+        after: Optional[str] = None,
+        is_active: Optional[bool] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Página de fluxos ordenada por `_id`, a partir do cursor `after`.
+
+        Retorna os documentos projetados e o cursor da próxima página (None
+        quando não há mais resultados). A consulta usa apenas índices, então
+        o custo não cresce com o tamanho da coleção.
+        """
+        query: Dict[str, Any] = {}
+        if after is not None:
+            query["_id"] = {"$gt": after}
+        if is_active is not None:
+            query.update(active_filter(is_active))
+        cursor = self.collection.find(query, LIST_PROJECTION).sort("_id", ASCENDING).limit(limit + 1)
+        documents = await cursor.to_list(length=limit + 1)
+        if len(documents) > limit:
+            return documents[:limit], documents[limit - 1]["_id"]
+        return documents, None
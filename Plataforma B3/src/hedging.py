@@ -0,0 +1,136 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Callable, Awaitable, Deque
+import logging
+from metrics import MODEL_HEDGES
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+@dataclass
+class HedgePolicy:
+    """Configuração de hedge de uma chamada: para onde enviar a cópia e quando."""
+    url: str
+    percentile: float
+    budget_key: str
+    budget_ratio: float
+
+class HedgeBudget:
+    """Orçamento de hedges: cada chamada acumula `ratio` e cada hedge gasta 1.
+
+    Assim, no regime, no máximo `ratio` das chamadas geram uma requisição
+    extra; `max_balance` limita a rajada depois de um período sem hedges.
+    """
+
+    def __init__(self, ratio: float, max_balance: float = 10.0):
+        self.ratio = ratio
+        self.max_balance = max_balance
+        self.balance = min(1.0, max_balance) if ratio > 0 else 0.0
+        self.requests = 0
+        self.hedges = 0
+
+    def deposit(self):
+        self.requests += 1
+        self.balance = min(self.max_balance, self.balance + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        if self.balance < 1.0:
+            return False
+        self.balance -= 1.0
+        self.hedges += 1
+        return True
+
+class HedgeController:
+    """Latências recentes por deployment e orçamentos de hedge por passo.
+
+    O atraso do hedge é o percentil pedido das últimas `window` latências do
+    deployment principal; com menos de `min_samples` amostras usa-se
+    `default_delay`.
+    """
+
+    def __init__(
+        self,
+        window: int = settings.HEDGE_LATENCY_WINDOW,
+        min_samples: int = settings.HEDGE_MIN_SAMPLES,
+        default_delay: float = settings.HEDGE_DEFAULT_DELAY,
+        min_delay: float = settings.HEDGE_MIN_DELAY,
+    ):
+        self.window = window
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.budgets: Dict[str, HedgeBudget] = {}
+
+    def observe(self, deployment: str, seconds: float):
+        samples = self.latencies.get(deployment)
+        if samples is None:
+            samples = self.latencies[deployment] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def delay(self, deployment: str, percentile: float) -> float:
+        samples = self.latencies.get(deployment)
+        if not samples or len(samples) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(samples)
+        index = min(int(percentile * len(ordered)), len(ordered) - 1)
+        return max(self.min_delay, ordered[index])
+
+    def budget(self, key: str, ratio: float) -> HedgeBudget:
+        budget = self.budgets.get(key)
+        if budget is None or budget.ratio != ratio:
+            budget = self.budgets[key] = HedgeBudget(ratio)
+        return budget
+
+    async def run(
+        self,
+        primary: Callable[[], Awaitable[Any]],
+        secondary: Callable[[], Awaitable[Any]],
+        delay: float,
+        budget: HedgeBudget,
+        deployment: str,
+    ) -> Any:
+        """Executa `primary`; se não terminar em `delay` e houver orçamento, dispara `secondary`.
+
+        Retorna o primeiro sucesso e cancela a outra chamada. Se ambas
+        falharem, propaga o erro da chamada principal.
+        """
+        primary_task = asyncio.ensure_future(primary())
+        secondary_task: Optional[asyncio.Future] = None
+        budget.deposit()
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=delay)
+            if done:
+                return primary_task.result()
+            if not budget.try_withdraw():
+                MODEL_HEDGES.inc(deployment=deployment, outcome="budget_exhausted")
+                return await primary_task
+
+            MODEL_HEDGES.inc(deployment=deployment, outcome="fired")
+            logger.info(f"Hedge disparado para '{deployment}' após {delay:.3f}s")
+            secondary_task = asyncio.ensure_future(secondary())
+            pending = {primary_task, secondary_task}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is secondary_task:
+                            MODEL_HEDGES.inc(deployment=deployment, outcome="won")
+                        return task.result()
+            return primary_task.result()
+        finally:
+            for task in (primary_task, secondary_task):
+                if task is not None and not task.done():
+                    task.cancel()
+            await asyncio.gather(
+                *(task for task in (primary_task, secondary_task) if task is not None),
+                return_exceptions=True
+            )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            key: {"requests": budget.requests, "hedges": budget.hedges, "balance": round(budget.balance, 2)}
+            for key, budget in self.budgets.items()
+        }
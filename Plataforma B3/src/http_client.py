@@ -0,0 +1,51 @@
+import aiohttp
+from typing import Optional
+import logging
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class HTTPClientPool:
+    """Sessão HTTP compartilhada, com pool de conexões, durante o ciclo de vida da aplicação."""
+
+    def __init__(
+        self,
+        limit: int = settings.HTTP_POOL_LIMIT,
+        limit_per_host: int = settings.HTTP_POOL_LIMIT_PER_HOST,
+        dns_cache_ttl: int = settings.HTTP_DNS_CACHE_TTL,
+        keepalive_timeout: float = settings.HTTP_KEEPALIVE_TIMEOUT,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self) -> aiohttp.ClientSession:
+        """Abre a sessão (idempotente)."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            logger.info(
+                f"Pool HTTP iniciado (limit={self.limit}, limit_per_host={self.limit_per_host})"
+            )
+        return self._session
+
+    async def close(self):
+        """Fecha a sessão e libera as conexões do pool."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("Pool HTTP encerrado")
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("Pool HTTP não iniciado")
+        return self._session
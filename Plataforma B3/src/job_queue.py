@@ -0,0 +1,378 @@
+import argparse
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Set
+import logging
+import aiohttp
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, ReturnDocument
+from flow_manager import FlowManager
+from model_integration import ModelIntegration, FlowRunError, FlowDeadlineExceeded, build_model_client
+from rate_limit import backoff_delay
+from metrics import JOBS
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUS = ("done", "failed")
+
+class JobQueue:
+    """Fila de execuções de fluxo no Mongo, compartilhada por todas as réplicas.
+
+    Um job fica `queued` até que um worker o arrende (`running`). O
+    arrendamento vale `visibility_timeout` segundos e é renovado pelo worker
+    enquanto o fluxo executa; se o worker morrer, o job volta a ficar
+    disponível quando o prazo vence. Em ambos os estados, `available_at`
+    indica quando o job pode ser pego, então uma única consulta indexada
+    serve para os dois casos.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+        # Acorda o worker embutido assim que um job é submetido nesta réplica
+        self.submitted = asyncio.Event()
+
+    async def ensure_indexes(self):
+        await self.collection.create_index(
+            [("status", ASCENDING), ("available_at", ASCENDING)], name="status_1_available_at_1"
+        )
+        await self.collection.create_index(
+            "finished_at", name="finished_at_ttl", expireAfterSeconds=settings.JOB_RETENTION
+        )
+
+    async def submit(
+        self,
+        flow_id: str,
+        user_message: str,
+        timeout: Optional[float] = None,
+        callback_url: Optional[str] = None,
+        max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+    ) -> str:
+        job_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        await self.collection.insert_one({
+            "_id": job_id,
+            "flow_id": flow_id,
+            "user_message": user_message,
+            "timeout": timeout,
+            "callback_url": callback_url,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "available_at": now,
+            "worker": None,
+            "run_id": None,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        })
+        self.submitted.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": job_id})
+
+    async def lease(self, worker_id: str, visibility_timeout: float) -> Optional[Dict[str, Any]]:
+        """Arrenda o job disponível há mais tempo; None se a fila estiver vazia."""
+        while True:
+            now = datetime.utcnow()
+            job = await self.collection.find_one_and_update(
+                {"status": {"$in": ["queued", "running"]}, "available_at": {"$lte": now}},
+                {
+                    "$set": {
+                        "status": "running",
+                        "worker": worker_id,
+                        "available_at": now + timedelta(seconds=visibility_timeout),
+                        "updated_at": now,
+                    },
+                    "$inc": {"attempts": 1},
+                },
+                sort=[("available_at", ASCENDING)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if job is None or job["attempts"] <= job["max_attempts"]:
+                return job
+            # Arrendamentos vencidos também contam como tentativa: um job que
+            # derruba o worker não volta para a fila indefinidamente
+            await self.finish(job, "failed", error="Número máximo de tentativas excedido")
+
+    async def heartbeat(self, job_id: str, worker_id: str, visibility_timeout: float) -> bool:
+        """Renova o arrendamento; False se o job não pertence mais a este worker."""
+        now = datetime.utcnow()
+        result = await self.collection.update_one(
+            {"_id": job_id, "status": "running", "worker": worker_id},
+            {"$set": {"available_at": now + timedelta(seconds=visibility_timeout), "updated_at": now}},
+        )
+        return result.matched_count > 0
+
+    async def set_run(self, job: Dict[str, Any], run_id: str):
+        await self.collection.update_one({"_id": job["_id"]}, {"$set": {"run_id": run_id}})
+
+    async def finish(
+        self,
+        job: Dict[str, Any],
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None
+    ) -> bool:
+        """Grava o desfecho se o job ainda pertence ao worker que o arrendou."""
+        now = datetime.utcnow()
+        updated = await self.collection.update_one(
+            {"_id": job["_id"], "status": "running", "worker": job["worker"]},
+            {"$set": {
+                "status": status,
+                "result": result,
+                "error": error,
+                "updated_at": now,
+                "finished_at": now,
+            }},
+        )
+        return updated.modified_count > 0
+
+    async def retry(self, job: Dict[str, Any], error: str, delay: float) -> bool:
+        """Devolve o job à fila para nova tentativa após `delay` segundos."""
+        now = datetime.utcnow()
+        updated = await self.collection.update_one(
+            {"_id": job["_id"], "status": "running", "worker": job["worker"]},
+            {"$set": {
+                "status": "queued",
+                "worker": None,
+                "error": error,
+                "available_at": now + timedelta(seconds=delay),
+                "updated_at": now,
+            }},
+        )
+        return updated.modified_count > 0
+
+    async def wait(self, job_id: str, timeout: float, poll_interval: float = settings.JOB_WAIT_POLL_INTERVAL):
+        """Aguarda até `timeout` segundos o fim do job e retorna seu estado mais recente."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = await self.get(job_id)
+            if job is None or job["status"] in TERMINAL_STATUS or loop.time() >= deadline:
+                return job
+            await asyncio.sleep(min(poll_interval, max(deadline - loop.time(), 0.0)))
+
+    async def counts(self) -> Dict[str, int]:
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        async for row in self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+class JobWorker:
+    """Consome a fila executando até `concurrency` fluxos ao mesmo tempo.
+
+    Um único laço arrenda jobs enquanto houver capacidade livre, então uma
+    réplica ociosa faz no máximo uma consulta a cada `poll_interval`.
+    Falhas de execução voltam para a fila com backoff até `max_attempts`;
+    se a execução foi registrada, a nova tentativa a retoma a partir do
+    último passo concluído. Estouro de prazo e fluxos inexistentes ou
+    inativos não são repetidos.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        model_client: ModelIntegration,
+        flow_manager: FlowManager,
+        session: Optional[aiohttp.ClientSession] = None,
+        concurrency: int = settings.JOB_WORKER_CONCURRENCY,
+        visibility_timeout: float = settings.JOB_VISIBILITY_TIMEOUT,
+        poll_interval: float = settings.JOB_POLL_INTERVAL,
+    ):
+        self.queue = queue
+        self.model_client = model_client
+        self.flow_manager = flow_manager
+        self.session = session
+        self.concurrency = concurrency
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._slots = asyncio.Semaphore(concurrency)
+        self._running: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._lease_loop())
+        logger.info(f"Worker {self.worker_id} iniciado (concorrência {self.concurrency})")
+
+    async def stop(self, drain_timeout: float = settings.JOB_DRAIN_TIMEOUT):
+        """Para de arrendar e aguarda os jobs em andamento; os que não terminarem voltam à fila pelo arrendamento."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._running:
+            _, pending = await asyncio.wait(self._running, timeout=drain_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _lease_loop(self):
+        while True:
+            await self._slots.acquire()
+            self.queue.submitted.clear()
+            try:
+                job = await self.queue.lease(self.worker_id, self.visibility_timeout)
+            except Exception as e:
+                logger.error(f"Erro ao arrendar job: {str(e)}")
+                job = None
+            if job is None:
+                self._slots.release()
+                try:
+                    await asyncio.wait_for(self.queue.submitted.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.ensure_future(self._process(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _process(self, job: Dict[str, Any]):
+        heartbeat = asyncio.ensure_future(self._heartbeat(job))
+        try:
+            await self._execute(job)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            self._slots.release()
+
+    async def _heartbeat(self, job: Dict[str, Any]):
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                if not await self.queue.heartbeat(job["_id"], self.worker_id, self.visibility_timeout):
+                    logger.warning(f"Job {job['_id']} não pertence mais a este worker")
+                    return
+            except Exception as e:
+                logger.warning(f"Falha ao renovar o arrendamento do job {job['_id']}: {str(e)}")
+
+    async def _execute(self, job: Dict[str, Any]):
+        job_id = job["_id"]
+        logger.info(f"Executando job {job_id} (tentativa {job['attempts']})")
+        try:
+            flow = await self.flow_manager.get_flow(job["flow_id"])
+            if flow is None or not flow.is_active:
+                await self._finish(job, "failed", error="Fluxo não encontrado ou inativo")
+                return
+            run = None
+            if job.get("run_id") and self.model_client.run_log is not None:
+                run = await self.model_client.run_log.load(job["run_id"])
+            if run is not None:
+                result = await self.model_client.resume_flow(run, timeout=job.get("timeout"))
+            else:
+                result = await self.model_client.process_flow(
+                    user_message=job["user_message"], flow=flow, flow_id=job["flow_id"], timeout=job.get("timeout")
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            run_id = e.run_id if isinstance(e, FlowRunError) else None
+            # O worker que retomar o job lê a execução do banco: tudo o que
+            # esta tentativa registrou precisa estar gravado antes de liberá-lo
+            await self._flush_run_log()
+            if run_id is not None:
+                await self.queue.set_run(job, run_id)
+            if isinstance(e, FlowDeadlineExceeded) or job["attempts"] >= job["max_attempts"]:
+                await self._finish(job, "failed", error=str(e))
+                return
+            delay = max(
+                backoff_delay(job["attempts"] - 1, settings.JOB_RETRY_BASE_DELAY, settings.JOB_RETRY_MAX_DELAY),
+                2 * settings.RUN_LOG_FLUSH_INTERVAL
+            )
+            logger.warning(f"Job {job_id} falhou ({str(e)}); nova tentativa em {delay:.1f}s")
+            if await self.queue.retry(job, str(e), delay):
+                self.retried += 1
+                JOBS.inc(outcome="retried")
+            return
+        await self._finish(job, "done", result=result)
+
+    async def _finish(
+        self,
+        job: Dict[str, Any],
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None
+    ):
+        await self._flush_run_log()
+        if not await self.queue.finish(job, status, result=result, error=error):
+            # O arrendamento venceu e outro worker assumiu o job
+            logger.warning(f"Job {job['_id']} concluído fora do arrendamento; desfecho descartado")
+            return
+        if status == "done":
+            self.completed += 1
+        else:
+            self.failed += 1
+        JOBS.inc(outcome=status)
+        if job.get("callback_url") and self.session is not None:
+            await self._notify(job, status, result, error)
+
+    async def _flush_run_log(self):
+        if self.model_client.run_log is not None:
+            await self.model_client.run_log.flush()
+
+    async def _notify(self, job: Dict[str, Any], status: str, result: Optional[Dict[str, Any]], error: Optional[str]):
+        """Avisa o cliente do fim do job com um POST em `callback_url`."""
+        payload = {"job_id": job["_id"], "status": status, "result": result, "error": error}
+        try:
+            async with self.session.post(
+                job["callback_url"], json=payload, timeout=aiohttp.ClientTimeout(total=settings.JOB_CALLBACK_TIMEOUT)
+            ) as response:
+                if response.status >= 400:
+                    logger.warning(f"Callback do job {job['_id']} respondeu {response.status}")
+        except Exception as e:
+            logger.warning(f"Falha ao chamar o callback do job {job['_id']}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "concurrency": self.concurrency,
+            "in_flight": len(self._running),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+async def _main(args):
+    from database import get_flows_collection, get_runs_collection, get_jobs_collection
+    from http_client import HTTPClientPool
+    from run_log import RunLog
+
+    http_client = HTTPClientPool()
+    await http_client.start()
+    run_log = RunLog(get_runs_collection()) if settings.RUN_LOG_ENABLED else None
+    if run_log is not None:
+        await run_log.start()
+    model_client = build_model_client(http_client.session, run_log=run_log)
+    await model_client.semantic_cache.load()
+    queue = JobQueue(get_jobs_collection())
+    await queue.ensure_indexes()
+    worker = JobWorker(
+        queue, model_client, FlowManager(get_flows_collection()), session=http_client.session,
+        concurrency=args.concurrency
+    )
+    worker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await worker.stop()
+        if run_log is not None:
+            await run_log.close()
+        await http_client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker standalone da fila de execuções de fluxo.")
+    parser.add_argument("-c", "--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY)
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,140 @@
+import bisect
+import threading
+from typing import Dict, List, Tuple, Callable, Iterable
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(counts):
+                counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Registry:
+    """Registro de métricas exportadas no formato texto do Prometheus."""
+
+    def __init__(self):
+        self.metrics: List = []
+        # Coletores produzem (nome, tipo, documentação, [(labels, valor)]) no momento da coleta
+        self.collectors: List[Callable] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable):
+        self.collectors.append(collector)
+
+    def remove_collector(self, collector: Callable):
+        if collector in self.collectors:
+            self.collectors.remove(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {value}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+FLOW_DURATION = REGISTRY.register(Histogram(
+    "flow_duration_seconds", "Duração da execução de um fluxo.", ("flow",)
+))
+STEP_DURATION = REGISTRY.register(Histogram(
+    "flow_step_duration_seconds", "Duração de cada passo de um fluxo.", ("flow", "step")
+))
+MODEL_TTFB = REGISTRY.register(Histogram(
+    "model_time_to_first_byte_seconds", "Tempo até o primeiro byte da resposta do modelo.", ("deployment",)
+))
+MODEL_TOKENS = REGISTRY.register(Counter(
+    "model_tokens_total", "Tokens consumidos, segundo o campo usage da resposta.", ("deployment", "kind")
+))
+MODEL_REQUESTS = REGISTRY.register(Counter(
+    "model_requests_total", "Requisições ao modelo por status HTTP.", ("deployment", "status")
+))
+MODEL_ERRORS = REGISTRY.register(Counter(
+    "model_errors_total", "Erros do modelo por status HTTP, ou connection/timeout sem resposta.", ("deployment", "status")
+))
+MODEL_RETRIES = REGISTRY.register(Counter(
+    "model_retries_total", "Novas tentativas de chamadas ao modelo.", ("deployment", "reason")
+))
+MODEL_HEDGES = REGISTRY.register(Counter(
+    "model_hedges_total", "Requisições de hedge por deployment principal e desfecho.", ("deployment", "outcome")
+))
+MODEL_FALLBACKS = REGISTRY.register(Counter(
+    "model_fallbacks_total", "Chamadas redirecionadas a um deployment de fallback.", ("deployment", "fallback")
+))
+JOBS = REGISTRY.register(Counter(
+    "jobs_total", "Jobs da fila de execuções por desfecho (done, failed, retried).", ("outcome",)
+))
+FLOW_ERRORS = REGISTRY.register(Counter(
+    "flow_errors_total", "Execuções de fluxo que terminaram com erro.", ("flow",)
+))
@@ -1,22 +1,125 @@
 import json
+import asyncio
+import itertools
+import time
 import aiohttp
-from typing import List, Dict, Any, Optional
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Iterator, Callable, Awaitable, Iterable
 from urllib.parse import urlparse
 import logging
 from flow_manager import Flow, FlowStep
+from flow_executor import FlowGraph, FlowExecutor, StepResult
+from response_cache import ResponseCache, make_cache_key
+from coalescing import SingleFlight
+from run_log import RunLog, completed_steps
+from hedging import HedgeController, HedgePolicy
+from semantic_cache import SemanticCache, build_embedder
+from chunking import (
+    DEFAULT_REDUCE_PROMPT, chunk_size, count_tokens, group_partials, join_partials, prompt_budget, split_text
+)
+from deadline import DeadlineExceeded, deadline_scope, remaining, check_deadline
+from rate_limit import DeploymentRateLimits, RETRYABLE_STATUS, backoff_delay, parse_retry_after
+from metrics import (
+    FLOW_DURATION, FLOW_ERRORS, MODEL_TTFB, MODEL_TOKENS, MODEL_REQUESTS, MODEL_ERRORS, MODEL_RETRIES, MODEL_FALLBACKS
+)
+from tracing import start_span, current_span
 from config import settings
 
 # Configuração básica de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SUPPORTED_MODELS = ["gpt-4o", "gpt-4o-mini"]
+
+class ModelHTTPError(ValueError):
+    """Resposta não-200 do endpoint do modelo."""
+
+    def __init__(self, message: str, status: int, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class FlowRunError(ValueError):
+    """Falha de uma execução de fluxo.
+
+    `completed_steps` lista os passos concluídos antes da falha e `run_id`,
+    quando a execução é registrada, permite retomá-la.
+    """
+
+    def __init__(self, message: str, run_id: Optional[str] = None, completed_steps: Optional[List[str]] = None):
+        super().__init__(message)
+        self.run_id = run_id
+        self.completed_steps = completed_steps or []
+
+class FlowDeadlineExceeded(FlowRunError):
+    """A execução do fluxo excedeu o prazo."""
+
+def deployment_from_url(url: str) -> str:
+    """Extrai o nome do deployment de uma URL .../deployments/{nome}/chat/completions."""
+    parts = urlparse(url).path.split("/")
+    if "deployments" in parts and parts.index("deployments") + 1 < len(parts):
+        return parts[parts.index("deployments") + 1]
+    return urlparse(url).netloc
+
+def should_fallback(error: Exception) -> bool:
+    """Erros transitórios ou de conexão justificam tentar o próximo deployment."""
+    if isinstance(error, ModelHTTPError):
+        return error.status in RETRYABLE_STATUS
+    return isinstance(error, aiohttp.ClientConnectionError)
+
+async def gather_or_cancel(aws: Iterable[Awaitable[Any]]) -> List[Any]:
+    """Como asyncio.gather, mas cancela as demais tarefas assim que uma falha."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    """Estimativa grosseira (4 caracteres por token) usada pelo limite de TPM."""
+    prompt_chars = sum(len(message.get("content") or "") for message in payload["messages"])
+    return prompt_chars // 4 + payload.get("max_tokens", 0)
+
 class ModelIntegration:
-    def __init__(self, api_key: str):
-        """Inicializa a integração com o modelo."""
+    def __init__(
+        self,
+        api_key: str,
+        session: Optional[aiohttp.ClientSession] = None,
+        cache: Optional[ResponseCache] = None,
+        rate_limits: Optional[DeploymentRateLimits] = None,
+        coalescer: Optional[SingleFlight] = None,
+        run_log: Optional[RunLog] = None,
+        hedging: Optional[HedgeController] = None,
+        semantic_cache: Optional[SemanticCache] = None
+    ):
+        """Inicializa a integração com o modelo.
+
+        Se `session` for informada, as chamadas reutilizam o pool de conexões
+        dessa sessão em vez de abrir uma nova sessão a cada chamada. `cache`
+        é usado apenas pelas chamadas que o habilitam explicitamente, e
+        `rate_limits` controla RPM/TPM e a concorrência de cada deployment.
+        Respostas 429 e 5xx são repetidas com backoff exponencial, e
+        `coalescer` agrupa chamadas idênticas simultâneas em uma só. Com
+        `run_log`, cada execução de fluxo e seus passos são registrados e
+        execuções com falha podem ser retomadas. `hedging` guarda as latências
+        recentes por deployment e os orçamentos usados pelas chamadas com hedge.
+        `semantic_cache` atende passos com `semantic_cache` habilitado quando
+        uma entrada parecida já foi respondida.
+        """
         if not api_key:
             raise ValueError("API_KEY não pode ser vazia")
         
         self.api_key = api_key
+        self.session = session
+        self.cache = cache
+        self.rate_limits = rate_limits
+        self.coalescer = coalescer
+        self.run_log = run_log
+        self.hedging = hedging
+        self.semantic_cache = semantic_cache
         self.model_url = ''
         self.headers = {
             "Content-Type": "application/json",
@@ -34,16 +137,88 @@ class ModelIntegration:
         messages: List[Dict[str, str]],
         temperature: float = 0.7,
         max_tokens: int = 100,
+        model_url: Optional[str] = None,
+        use_cache: bool = False,
+        cache_ttl: Optional[int] = None,
+        coalesce: bool = False,
+        fallback_urls: Optional[List[str]] = None,
+        hedge: Optional[HedgePolicy] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Realiza uma chamada de conclusão de chat ao modelo.
+
+        `model_url` permite chamadas concorrentes a deployments diferentes;
+        se omitido, usa `self.model_url`. Com `use_cache`, respostas idênticas
+        (mesmo deployment e payload) são servidas pelo cache; com `coalesce`,
+        chamadas idênticas em andamento compartilham a mesma requisição.
+        `fallback_urls` são tentadas em ordem quando o deployment principal
+        falha, e `hedge` dispara uma cópia da chamada se a principal demorar.
+        """
+        payload = self._build_payload(messages, temperature, max_tokens, **kwargs)
+        url = model_url or self.model_url
+        check_deadline()
+        key = make_cache_key(url, payload) if use_cache or coalesce else None
+        if use_cache and self.cache is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        try:
+            if coalesce and self.coalescer is not None:
+                response_data = await self.coalescer.do(
+                    key, lambda: self._request_routed(url, payload, fallback_urls, hedge)
+                )
+            else:
+                response_data = await self._request_routed(url, payload, fallback_urls, hedge)
+            if use_cache and self.cache is not None:
+                await self.cache.set(key, response_data, ttl=cache_ttl)
+            return response_data
+
+        except ModelHTTPError as e:
+            logger.error(str(e))
+            raise
+        except (DeadlineExceeded, asyncio.TimeoutError) as e:
+            raise self._timeout_error(e)
+        except aiohttp.ClientError as e:
+            logger.error(f"Erro de conexão: {str(e)}")
+            raise ValueError(f"Erro de conexão: {str(e)}")
+        except json.JSONDecodeError as e:
+            logger.error(f"Erro ao processar resposta do modelo: {str(e)}")
+            raise ValueError(f"Erro ao processar resposta do modelo: {str(e)}")
+        except Exception as e:
+            logger.error(f"Erro inesperado: {str(e)}")
+            raise ValueError(f"Erro inesperado: {str(e)}")
+
+    def _timeout_error(self, error: Exception) -> Exception:
+        """Converte o timeout de uma chamada em DeadlineExceeded quando o prazo da execução acabou."""
+        if isinstance(error, DeadlineExceeded) or remaining() == 0.0:
+            logger.warning("Chamada ao modelo interrompida: prazo da execução esgotado")
+            return DeadlineExceeded("Prazo da execução esgotado")
+        logger.error("Tempo limite excedido na chamada ao modelo")
+        return ValueError("Tempo limite excedido na chamada ao modelo")
+
+    def _request_timeout(self) -> Dict[str, Any]:
+        """Argumento `timeout` do aiohttp com o tempo restante até o prazo, se houver."""
+        time_left = remaining()
+        if time_left is None:
+            return {}
+        check_deadline()
+        return {"timeout": aiohttp.ClientTimeout(total=time_left)}
+
+    def _build_payload(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
         **kwargs
     ) -> Dict[str, Any]:
-        """Realiza uma chamada de conclusão de chat ao modelo."""
         if not messages:
             raise ValueError("A lista de mensagens não pode estar vazia")
         
         if not isinstance(temperature, (int, float)) or not 0 <= temperature <= 1:
             raise ValueError("Temperatura deve ser um número entre 0 e 1")
         
-        payload = {
+        return {
             "messages": messages,
             "temperature": temperature,
             "max_tokens": max_tokens,
@@ -51,41 +226,436 @@ class ModelIntegration:
             "frequency_penalty": kwargs.get("frequency_penalty", 1.0),
             "presence_penalty": kwargs.get("presence_penalty", 0.5),
         }
-        
+
+    async def _check_response(self, response: aiohttp.ClientResponse, deployment: str):
+        MODEL_REQUESTS.inc(deployment=deployment, status=response.status)
+        if response.status != 200:
+            MODEL_ERRORS.inc(deployment=deployment, status=response.status)
+        if self.rate_limits is not None:
+            self.rate_limits.get(deployment).observe(response.status, response.headers)
+        if response.status == 401:
+            raise ModelHTTPError("Erro de autenticação: Chave de API inválida ou endpoint incorreto", 401)
+        elif response.status == 404:
+            raise ModelHTTPError("Endpoint não encontrado. Verifique a URL do modelo", 404)
+        elif response.status != 200:
+            error_text = await response.text()
+            raise ModelHTTPError(
+                f"Erro na chamada ao modelo: {error_text}",
+                response.status,
+                retry_after=parse_retry_after(response.headers)
+            )
+
+    @contextmanager
+    def _count_transport_errors(self, deployment: str) -> Iterator[None]:
+        """Conta em MODEL_ERRORS as falhas sem resposta HTTP, que também levam a retry e fallback."""
         try:
+            yield
+        except asyncio.TimeoutError:
+            MODEL_ERRORS.inc(deployment=deployment, status="timeout")
+            raise
+        except aiohttp.ClientConnectionError:
+            MODEL_ERRORS.inc(deployment=deployment, status="connection")
+            raise
+
+    @asynccontextmanager
+    async def _session_scope(self) -> AsyncIterator[aiohttp.ClientSession]:
+        """Usa a sessão compartilhada ou, na falta dela, uma sessão temporária."""
+        if self.session is not None:
+            yield self.session
+        else:
             async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.model_url,
-                    headers=self.headers,
-                    json=payload
-                ) as response:
-                    if response.status == 401:
-                        raise ValueError("Erro de autenticação: Chave de API inválida ou endpoint incorreto")
-                    elif response.status == 404:
-                        raise ValueError("Endpoint não encontrado. Verifique a URL do modelo")
-                    elif response.status != 200:
-                        error_text = await response.text()
-                        raise ValueError(f"Erro na chamada ao modelo: {error_text}")
-                    
-                    response_data = await response.json()
-                    return response_data
-                    
+                yield session
+
+    def _limit(self, url: str, payload: Dict[str, Any]):
+        if self.rate_limits is None:
+            return nullcontext()
+        return self.rate_limits.slot(deployment_from_url(url), estimate_tokens(payload))
+
+    async def _wait_retry(
+        self,
+        attempt: int,
+        error: Exception,
+        deployment: str,
+        max_retries: Optional[int] = None
+    ) -> bool:
+        """Espera o backoff antes de uma nova tentativa; retorna False se o erro não deve ser repetido."""
+        max_retries = settings.MODEL_MAX_RETRIES if max_retries is None else max_retries
+        if attempt >= max_retries:
+            return False
+        if isinstance(error, ModelHTTPError):
+            if error.status not in RETRYABLE_STATUS:
+                return False
+            retry_after = error.retry_after
+            reason = str(error.status)
+        elif isinstance(error, aiohttp.ClientConnectionError):
+            retry_after = None
+            reason = "connection"
+        else:
+            return False
+        delay = backoff_delay(
+            attempt, settings.MODEL_RETRY_BASE_DELAY, settings.MODEL_RETRY_MAX_DELAY, retry_after
+        )
+        time_left = remaining()
+        if time_left is not None and delay >= time_left:
+            return False
+        MODEL_RETRIES.inc(deployment=deployment, reason=reason)
+        logger.warning(f"Nova tentativa em {delay:.2f}s ({attempt + 1}/{max_retries}): {str(error)}")
+        await asyncio.sleep(delay)
+        return True
+
+    async def _request(self, url: str, payload: Dict[str, Any], max_retries: Optional[int] = None) -> Dict[str, Any]:
+        """Chama o modelo respeitando os limites do deployment e repetindo erros transitórios."""
+        for attempt in itertools.count():
+            try:
+                async with self._limit(url, payload):
+                    async with self._session_scope() as session:
+                        return await self._post(session, url, payload)
+            except (ModelHTTPError, aiohttp.ClientConnectionError) as e:
+                if not await self._wait_retry(attempt, e, deployment_from_url(url), max_retries):
+                    raise
+
+    async def _request_routed(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        fallback_urls: Optional[List[str]] = None,
+        hedge: Optional[HedgePolicy] = None
+    ) -> Dict[str, Any]:
+        """Tenta `url` e, em caso de erro transitório, cada fallback na ordem.
+
+        Com fallbacks, cada deployment que não é o último faz apenas
+        `MODEL_FALLBACK_RETRIES` novas tentativas antes de passar ao próximo.
+        A chamada ao deployment principal pode usar hedge.
+        """
+        candidates = [url] + [candidate for candidate in (fallback_urls or []) if candidate != url]
+        for index, candidate in enumerate(candidates):
+            is_last = index == len(candidates) - 1
+            max_retries = settings.MODEL_MAX_RETRIES if is_last else settings.MODEL_FALLBACK_RETRIES
+            try:
+                if index == 0 and hedge is not None and self.hedging is not None:
+                    return await self._request_hedged(candidate, payload, hedge, max_retries)
+                return await self._request(candidate, payload, max_retries)
+            except (ModelHTTPError, aiohttp.ClientConnectionError) as e:
+                if is_last or not should_fallback(e):
+                    raise
+                deployment, fallback = deployment_from_url(candidate), deployment_from_url(candidates[index + 1])
+                MODEL_FALLBACKS.inc(deployment=deployment, fallback=fallback)
+                logger.warning(f"Deployment '{deployment}' falhou ({str(e)}); usando fallback '{fallback}'")
+
+    async def _request_hedged(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        hedge: HedgePolicy,
+        max_retries: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Chamada principal com uma cópia para `hedge.url` após o percentil de latência configurado."""
+        deployment = deployment_from_url(url)
+        return await self.hedging.run(
+            lambda: self._request(url, payload, max_retries),
+            lambda: self._request(hedge.url, payload, max_retries),
+            delay=self.hedging.delay(deployment, hedge.percentile),
+            budget=self.hedging.budget(hedge.budget_key, hedge.budget_ratio),
+            deployment=deployment,
+        )
+
+    async def _post(self, session: aiohttp.ClientSession, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Envia o payload ao endpoint do modelo usando a sessão informada."""
+        deployment = deployment_from_url(url)
+        started = time.monotonic()
+        with self._count_transport_errors(deployment):
+            async with session.post(
+                url,
+                headers=self.headers,
+                json=payload,
+                **self._request_timeout()
+            ) as response:
+                MODEL_TTFB.observe(time.monotonic() - started, deployment=deployment)
+                await self._check_response(response, deployment)
+                response_data = await response.json()
+        self._record_usage(deployment, response_data.get("usage"))
+        if self.hedging is not None:
+            self.hedging.observe(deployment, time.monotonic() - started)
+        return response_data
+
+    def _record_usage(self, deployment: str, usage: Optional[Dict[str, int]]):
+        """Contabiliza os tokens do campo `usage` nas métricas e no span atual."""
+        if not usage:
+            return
+        span = current_span()
+        for kind in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            if kind in usage:
+                MODEL_TOKENS.inc(usage[kind], deployment=deployment, kind=kind.replace("_tokens", ""))
+                if span is not None:
+                    span.set_attribute(kind, span.attributes.get(kind, 0) + usage[kind])
+
+    async def _post_stream(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        payload: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """Envia o payload com `stream: true` e produz os deltas de conteúdo (SSE)."""
+        deployment = deployment_from_url(url)
+        started = time.monotonic()
+        with self._count_transport_errors(deployment):
+            async with session.post(
+                url,
+                headers=self.headers,
+                json={**payload, "stream": True},
+                **self._request_timeout()
+            ) as response:
+                MODEL_TTFB.observe(time.monotonic() - started, deployment=deployment)
+                await self._check_response(response, deployment)
+                async for raw_line in response.content:
+                    line = raw_line.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    self._record_usage(deployment, chunk.get("usage"))
+                    for choice in chunk.get("choices", []):
+                        delta = (choice.get("delta") or {}).get("content")
+                        if delta:
+                            yield delta
+
+    async def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 100,
+        model_url: Optional[str] = None,
+        fallback_urls: Optional[List[str]] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Realiza uma chamada de conclusão de chat em modo streaming, produzindo os deltas de texto.
+
+        Novas tentativas e fallbacks só acontecem antes do primeiro delta.
+        """
+        payload = self._build_payload(messages, temperature, max_tokens, **kwargs)
+        url = model_url or self.model_url
+        candidates = [url] + [candidate for candidate in (fallback_urls or []) if candidate != url]
+        try:
+            for index, candidate in enumerate(candidates):
+                is_last = index == len(candidates) - 1
+                max_retries = settings.MODEL_MAX_RETRIES if is_last else settings.MODEL_FALLBACK_RETRIES
+                yielded = False
+                try:
+                    for attempt in itertools.count():
+                        try:
+                            async with self._limit(candidate, payload):
+                                async with self._session_scope() as session:
+                                    async for delta in self._post_stream(session, candidate, payload):
+                                        yielded = True
+                                        yield delta
+                            return
+                        except (ModelHTTPError, aiohttp.ClientConnectionError) as e:
+                            # Só é seguro repetir enquanto nada foi entregue ao chamador
+                            if yielded or not await self._wait_retry(
+                                attempt, e, deployment_from_url(candidate), max_retries
+                            ):
+                                raise
+                except (ModelHTTPError, aiohttp.ClientConnectionError) as e:
+                    if yielded or is_last or not should_fallback(e):
+                        raise
+                    deployment, fallback = deployment_from_url(candidate), deployment_from_url(candidates[index + 1])
+                    MODEL_FALLBACKS.inc(deployment=deployment, fallback=fallback)
+                    logger.warning(f"Deployment '{deployment}' falhou ({str(e)}); usando fallback '{fallback}'")
+
+        except ModelHTTPError as e:
+            logger.error(str(e))
+            raise
+        except (DeadlineExceeded, asyncio.TimeoutError) as e:
+            raise self._timeout_error(e)
         except aiohttp.ClientError as e:
             logger.error(f"Erro de conexão: {str(e)}")
             raise ValueError(f"Erro de conexão: {str(e)}")
         except json.JSONDecodeError as e:
             logger.error(f"Erro ao processar resposta do modelo: {str(e)}")
             raise ValueError(f"Erro ao processar resposta do modelo: {str(e)}")
+
+    async def process_step(
+        self,
+        step: FlowStep,
+        user_input: str,
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        """Executa um único passo de modelo e retorna (resposta, mensagens enviadas).
+
+        Com `on_delta`, a resposta é pedida em modo streaming e cada delta é
+        repassado ao callback; passos com cache (exato ou semântico) habilitado
+        entregam a resposta inteira em um único delta. Passos `chunked` cuja
+        entrada não cabe em um trecho são executados em map-reduce (ver
+        `_process_chunked`).
+        """
+        model_url = settings.MODEL_URL(model_name=step.model)
+        self._validate_model_url(model_url)
+        fallback_urls = [settings.MODEL_URL(model_name=model) for model in step.fallback_models or []]
+        hedge = None
+        if step.hedge:
+            # Sem fallbacks, a cópia vai para o mesmo deployment
+            hedge = HedgePolicy(
+                url=fallback_urls[0] if fallback_urls else model_url,
+                percentile=step.hedge_percentile,
+                budget_key=f"{step.model}:{step.step_name}",
+                budget_ratio=step.hedge_budget,
+            )
+
+        messages = [
+            {"role": "system", "content": step.system_prompt},
+            {"role": "user", "content": user_input}
+        ]
+        
+        try:
+            assistant_message = None
+
+            if step.model in SUPPORTED_MODELS:
+                if step.chunked:
+                    chunks = self._split_input(step, user_input)
+                    if len(chunks) > 1:
+                        return await self._process_chunked(step, chunks, model_url, fallback_urls, hedge, on_delta)
+
+                semantic_key, vector = None, None
+                if step.semantic_cache and self.semantic_cache is not None:
+                    semantic_key = make_cache_key(model_url, {
+                        "system_prompt": step.system_prompt,
+                        "temperature": step.temperature,
+                        "max_tokens": step.max_tokens,
+                    })
+                    cached, vector = await self._semantic_lookup(semantic_key, user_input, step.semantic_threshold)
+                    if cached is not None:
+                        if on_delta is not None:
+                            await on_delta(cached)
+                        return cached, messages
+
+                assistant_message = await self._complete(
+                    step, messages, model_url, fallback_urls, hedge,
+                    on_delta=on_delta, stream=not step.cache and semantic_key is None
+                )
+                if vector is not None and assistant_message:
+                    await self.semantic_cache.store(semantic_key, user_input, vector, assistant_message)
+
+            return assistant_message, messages
+            
+        except DeadlineExceeded:
+            raise
         except Exception as e:
-            logger.error(f"Erro inesperado: {str(e)}")
-            raise ValueError(f"Erro inesperado: {str(e)}")
+            logger.error(f"Erro ao processar passo '{step.step_name}': {str(e)}")
+            raise ValueError(f"Erro ao processar passo '{step.step_name}': {str(e)}")
 
-    async def process_flow(
+    async def _complete(
         self,
-        user_message: str,
-        flow: Flow,
-    ) -> Dict[str, Any]:
-        """Processa uma mensagem de usuário através de um fluxo."""
+        step: FlowStep,
+        messages: List[Dict[str, str]],
+        model_url: str,
+        fallback_urls: List[str],
+        hedge: Optional[HedgePolicy],
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+        stream: bool = True
+    ) -> str:
+        """Uma chamada ao modelo com as opções do passo; em modo streaming se houver `on_delta` e `stream`."""
+        if on_delta is not None and stream:
+            parts = []
+            async for delta in self.chat_completion_stream(
+                messages=messages,
+                temperature=step.temperature,
+                max_tokens=step.max_tokens,
+                model_url=model_url,
+                fallback_urls=fallback_urls
+            ):
+                parts.append(delta)
+                await on_delta(delta)
+            return "".join(parts)
+
+        response = await self.chat_completion(
+            messages=messages,
+            temperature=step.temperature,
+            max_tokens=step.max_tokens,
+            model_url=model_url,
+            use_cache=step.cache,
+            cache_ttl=step.cache_ttl,
+            coalesce=step.should_coalesce,
+            fallback_urls=fallback_urls,
+            hedge=hedge
+        )
+        assistant_message = response["choices"][0]["message"]["content"]
+        if on_delta is not None:
+            await on_delta(assistant_message)
+        return assistant_message
+
+    def _split_input(self, step: FlowStep, user_input: str) -> List[str]:
+        """Trechos da entrada de um passo `chunked`; um único trecho se ela já cabe inteira."""
+        size = chunk_size(step.model, step.system_prompt, step.max_tokens, step.chunk_tokens)
+        if count_tokens(user_input, step.model) <= size:
+            return [user_input]
+        overlap = step.chunk_overlap if step.chunk_overlap is not None else settings.CHUNK_OVERLAP_TOKENS
+        return split_text(user_input, step.model, size, overlap)
+
+    async def _process_chunked(
+        self,
+        step: FlowStep,
+        chunks: List[str],
+        model_url: str,
+        fallback_urls: List[str],
+        hedge: Optional[HedgePolicy],
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> Tuple[str, List[Dict[str, str]]]:
+        """Map-reduce: aplica `system_prompt` a cada trecho em paralelo e combina os parciais com `reduce_prompt`.
+
+        No máximo `chunk_concurrency` chamadas do passo ficam em andamento. Se
+        os parciais não couberem juntos numa chamada, são reduzidos em grupos,
+        em rodadas, até restar um grupo; só a redução final é transmitida a
+        `on_delta`. Retorna a resposta e as mensagens da redução final.
+        """
+        limit = asyncio.Semaphore(step.chunk_concurrency or settings.CHUNK_CONCURRENCY)
+        reduce_prompt = step.reduce_prompt or DEFAULT_REDUCE_PROMPT.format(system_prompt=step.system_prompt)
+
+        async def complete(system_prompt: str, text: str, deltas=None) -> Tuple[str, List[Dict[str, str]]]:
+            messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": text}]
+            async with limit:
+                answer = await self._complete(
+                    step, messages, model_url, fallback_urls, hedge, on_delta=deltas, stream=not step.cache
+                )
+            return answer, messages
+
+        results = await gather_or_cancel(complete(step.system_prompt, chunk) for chunk in chunks)
+        partials = [answer for answer, _ in results]
+        budget = prompt_budget(step.model, reduce_prompt, step.max_tokens)
+        rounds = 1
+        groups = group_partials(partials, step.model, budget)
+        while len(groups) > 1:
+            results = await gather_or_cancel(complete(reduce_prompt, join_partials(group)) for group in groups)
+            partials = [answer for answer, _ in results]
+            groups = group_partials(partials, step.model, budget)
+            rounds += 1
+
+        span = current_span()
+        if span is not None:
+            span.set_attribute("chunks", len(chunks))
+            span.set_attribute("reduce_rounds", rounds)
+        logger.info(f"Passo '{step.step_name}': {len(chunks)} trechos reduzidos em {rounds} rodada(s)")
+        return await complete(reduce_prompt, join_partials(groups[0]), on_delta)
+
+    async def _semantic_lookup(
+        self,
+        key: str,
+        user_input: str,
+        threshold: Optional[float]
+    ) -> Tuple[Optional[str], Any]:
+        """Consulta o cache semântico; se o embedding falhar, o passo segue direto para o modelo."""
+        try:
+            cached, vector = await self.semantic_cache.lookup(key, user_input, threshold)
+        except Exception as e:
+            logger.warning(f"Cache semântico indisponível: {str(e)}")
+            return None, None
+        span = current_span()
+        if span is not None:
+            span.set_attribute("semantic_cache", "hit" if cached is not None else "miss")
+        return cached, vector
+
+    def _validate_flow_input(self, user_message: str, flow: Flow):
         if not user_message:
             raise ValueError("A mensagem do usuário não pode estar vazia")
         if not flow or not flow.steps:
@@ -93,43 +663,213 @@ class ModelIntegration:
         
         if not flow.is_active:
             raise ValueError("O fluxo não está ativo")
-        
-        sorted_steps = sorted(flow.steps, key=lambda x: x.step_order)
-        last_response = user_message
+
+    def _build_result(
+        self,
+        flow: Flow,
+        executor: FlowExecutor,
+        results: Dict[str, StepResult],
+        user_message: str
+    ) -> Dict[str, Any]:
         step_responses = {}
-        
-        for step in sorted_steps:
-            self.model_url = settings.MODEL_URL(model_name=step.model)
-            self._validate_model_url(self.model_url)
-
-            messages = [
-                {"role": "system", "content": step.system_prompt},
-                {"role": "user", "content": last_response}
-            ]
-            
-            try:
-                assistant_message = None
-
-                if step.model in ["gpt-4o", "gpt-4o-mini"]:
-                    response = await self.chat_completion(
-                        messages=messages,
-                        temperature=step.temperature,
-                        max_tokens=step.max_tokens
-                    )
-                    assistant_message = response["choices"][0]["message"]["content"]
-                    last_response = assistant_message
-
-                step_responses[step.step_name] = {
-                    "assistant_message": assistant_message,
-                    "messages": messages
+        for name, result in results.items():
+            if result.status != "done":
+                continue
+            if executor.graph.steps[name].is_router:
+                step_responses[name] = {"route": result.route}
+            else:
+                step_responses[name] = {
+                    "assistant_message": result.assistant_message,
+                    "messages": result.messages
                 }
-                
-            except Exception as e:
-                logger.error(f"Erro ao processar passo '{step.step_name}': {str(e)}")
-                raise ValueError(f"Erro ao processar passo '{step.step_name}': {str(e)}")
-        
+
         return {
             "flow_name": flow.name,
             "steps": step_responses,
-            "final_response": last_response
-        }
\ No newline at end of file
+            "skipped_steps": [name for name, result in results.items() if result.status == "skipped"],
+            "final_response": executor.final_response(results, user_message)
+        }
+
+    async def process_flow(
+        self,
+        user_message: str,
+        flow: Flow,
+        flow_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Processa uma mensagem de usuário através de um fluxo.
+
+        `timeout` (segundos) tem precedência sobre o `timeout` do fluxo e
+        sobre FLOW_DEFAULT_TIMEOUT. Esgotado o prazo, as chamadas em andamento
+        são canceladas e FlowDeadlineExceeded informa os passos concluídos.
+        """
+        self._validate_flow_input(user_message, flow)
+        run_id = self.run_log.start_run(flow, flow_id, user_message) if self.run_log is not None else None
+        return await self._run_flow(flow, user_message, run_id, self.process_step, timeout=timeout)
+
+    async def resume_flow(self, run: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Retoma uma execução registrada a partir do último passo concluído.
+
+        Usa a definição do fluxo guardada na execução e reaproveita as saídas
+        dos passos já concluídos; apenas os demais são executados.
+        """
+        if self.run_log is None:
+            raise ValueError("O registro de execuções não está habilitado")
+        if run["status"] == "done":
+            raise ValueError("A execução já foi concluída")
+        flow = Flow(**run["flow"])
+        self.run_log.resume_run(run["_id"])
+        return await self._run_flow(
+            flow, run["user_message"], run["_id"], self.process_step, completed=completed_steps(run), timeout=timeout
+        )
+
+    async def _run_flow(
+        self,
+        flow: Flow,
+        user_message: str,
+        run_id: Optional[str],
+        run_step: Callable[[FlowStep, str], Awaitable[Any]],
+        completed: Optional[Dict[str, StepResult]] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Executa o fluxo dentro do prazo e, se houver `run_id`, registra cada passo e o desfecho."""
+        on_result = (lambda result: self.run_log.record_step(run_id, result)) if run_id else None
+        executor = FlowExecutor(FlowGraph(flow), run_step, on_result=on_result)
+        if timeout is None:
+            timeout = flow.timeout if flow.timeout is not None else settings.FLOW_DEFAULT_TIMEOUT
+        try:
+            with self._flow_span(flow), deadline_scope(timeout):
+                try:
+                    results = await asyncio.wait_for(executor.run(user_message, completed), remaining())
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded("Prazo da execução esgotado")
+                result = self._build_result(flow, executor, results, user_message)
+        except BaseException as e:
+            finished = [name for name, step in executor.finished.items() if step.status == "done"]
+            if isinstance(e, asyncio.CancelledError):
+                message = "Execução cancelada"
+            elif isinstance(e, DeadlineExceeded):
+                message = f"Prazo da execução ({timeout}s) esgotado"
+            else:
+                message = str(e) or type(e).__name__
+            if run_id is not None:
+                self.run_log.finish_run(run_id, "failed", error=message)
+            if isinstance(e, DeadlineExceeded):
+                raise FlowDeadlineExceeded(message, run_id, finished) from e
+            if isinstance(e, Exception):
+                raise FlowRunError(message, run_id, finished) from e
+            raise
+        if run_id is not None:
+            self.run_log.finish_run(run_id, "done", final_response=result["final_response"])
+            result["run_id"] = run_id
+        return result
+
+    @contextmanager
+    def _flow_span(self, flow: Flow) -> Iterator[None]:
+        """Span raiz e métricas de duração/erro de uma execução de fluxo."""
+        started = time.monotonic()
+        try:
+            with start_span("process_flow", flow=flow.name):
+                yield
+        except Exception:
+            FLOW_ERRORS.inc(flow=flow.name)
+            raise
+        finally:
+            FLOW_DURATION.observe(time.monotonic() - started, flow=flow.name)
+
+    async def process_flow_stream(
+        self,
+        user_message: str,
+        flow: Flow,
+        flow_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Processa o fluxo produzindo eventos step_start, token, step_done e, ao final, done.
+
+        O evento `done` traz o mesmo resultado de `process_flow`; em caso de
+        falha é emitido um evento `error` no lugar, com o `run_id` quando a
+        execução é registrada.
+        """
+        self._validate_flow_input(user_message, flow)
+
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def run_step(step: FlowStep, user_input: str):
+            await queue.put({"event": "step_start", "data": {"step_name": step.step_name}})
+
+            async def on_delta(delta: str):
+                await queue.put({"event": "token", "data": {"step_name": step.step_name, "delta": delta}})
+
+            assistant_message, messages = await self.process_step(step, user_input, on_delta=on_delta)
+            await queue.put({
+                "event": "step_done",
+                "data": {"step_name": step.step_name, "assistant_message": assistant_message}
+            })
+            return assistant_message, messages
+
+        run_id = self.run_log.start_run(flow, flow_id, user_message) if self.run_log is not None else None
+
+        async def run_flow():
+            try:
+                result = await self._run_flow(flow, user_message, run_id, run_step, timeout=timeout)
+                await queue.put({"event": "done", "data": result})
+            except FlowRunError as e:
+                error = {"detail": str(e), "completed_steps": e.completed_steps}
+                if e.run_id is not None:
+                    error["run_id"] = e.run_id
+                if isinstance(e, FlowDeadlineExceeded):
+                    error["deadline_exceeded"] = True
+                await queue.put({"event": "error", "data": error})
+            except Exception as e:
+                await queue.put({"event": "error", "data": {"detail": str(e)}})
+
+        task = asyncio.ensure_future(run_flow())
+        try:
+            while True:
+                event = await queue.get()
+                yield event
+                if event["event"] in ("done", "error"):
+                    break
+        finally:
+            if not task.done():
+                task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+def build_model_client(
+    session: aiohttp.ClientSession,
+    run_log: Optional[RunLog] = None,
+    cache: Optional[ResponseCache] = None,
+    rate_limits: Optional[DeploymentRateLimits] = None,
+    coalescer: Optional[SingleFlight] = None,
+    hedging: Optional[HedgeController] = None,
+    semantic_cache: Optional[SemanticCache] = None
+) -> ModelIntegration:
+    """ModelIntegration com todos os componentes, configurados a partir de `settings`.
+
+    Usado pela API, pelo worker de jobs, pela CLI de lotes e pelas tarefas
+    do Argo, para que `cache`, `hedge`, `fallback_models` e o cache
+    semântico se comportem igual em todos eles. Componentes informados são
+    reaproveitados e os demais são criados aqui; o cache semântico criado
+    aqui começa vazio até `semantic_cache.load()`.
+    """
+    from database import get_cache_collection, get_semantic_cache_collection
+
+    if rate_limits is None:
+        rate_limits = DeploymentRateLimits.from_settings()
+    if cache is None:
+        cache = ResponseCache(collection=get_cache_collection() if settings.RESPONSE_CACHE_SHARED else None)
+    if semantic_cache is None:
+        semantic_cache = SemanticCache(
+            build_embedder(session, rate_limits).embed_many,
+            collection=get_semantic_cache_collection() if settings.SEMANTIC_CACHE_SHARED else None
+        )
+    return ModelIntegration(
+        api_key=settings.UFPB_OPENAI_API_KEY,
+        session=session,
+        cache=cache,
+        rate_limits=rate_limits,
+        coalescer=coalescer if coalescer is not None else SingleFlight(),
+        run_log=run_log,
+        hedging=hedging if hedging is not None else HedgeController(),
+        semantic_cache=semantic_cache
+    )
@@ -0,0 +1,214 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Mapping, AsyncIterator
+import logging
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Balde de tokens simples: `rate_per_minute` unidades por minuto, com rajada igual à taxa."""
+
+    def __init__(self, rate_per_minute: int):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute deve ser maior que zero")
+        self.capacity = float(rate_per_minute)
+        self.refill_per_second = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.refill_per_second)
+
+    def sync_remaining(self, remaining: float):
+        """Alinha o balde com a cota restante informada pelo servidor (compartilhada entre réplicas)."""
+        self._refill()
+        self.tokens = min(self.tokens, max(remaining, 0.0))
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Lê `retry-after-ms` ou `Retry-After` (em segundos) dos cabeçalhos da resposta."""
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("Retry-After")
+    if value is not None:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return None
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """Backoff exponencial com jitter completo; nunca menor que o Retry-After do servidor."""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+class DeploymentLimiter:
+    """Limitador de um deployment: RPM/TPM por balde de tokens e concorrência AIMD.
+
+    A concorrência cresce de forma aditiva (+1 por janela de `limit`
+    respostas bem-sucedidas) e cai de forma multiplicativa a cada 429, que
+    também pausa o deployment pelo tempo pedido em Retry-After. Uma rajada de
+    429 simultâneos conta como um único corte (ver `decrease_interval`).
+    """
+
+    def __init__(
+        self,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        initial_concurrency: float = 8,
+        min_concurrency: float = 1,
+        max_concurrency: float = 64,
+        decrease_factor: float = 0.5,
+        decrease_interval: float = 1.0,
+    ):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.limit = float(initial_concurrency)
+        self.min_concurrency = float(min_concurrency)
+        self.max_concurrency = float(max_concurrency)
+        self.decrease_factor = decrease_factor
+        self.decrease_interval = decrease_interval
+        self.last_decrease = 0.0
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self._condition = asyncio.Condition()
+
+    async def _wait_unblocked(self):
+        while True:
+            delay = self.blocked_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def acquire(self, estimated_tokens: int = 0):
+        await self._wait_unblocked()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < max(int(self.limit), 1))
+            self.in_flight += 1
+        try:
+            if self.requests is not None:
+                await self.requests.acquire()
+            if self.tokens is not None and estimated_tokens:
+                await self.tokens.acquire(estimated_tokens)
+        except BaseException:
+            await self.release()
+            raise
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def observe(self, status: int, headers: Mapping[str, str]):
+        """Ajusta o limitador a partir do status e dos cabeçalhos de cota da resposta."""
+        if status == 429:
+            self.throttled += 1
+            now = time.monotonic()
+            if now - self.last_decrease >= self.decrease_interval:
+                self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+                self.last_decrease = now
+            retry_after = parse_retry_after(headers)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            logger.warning(f"Deployment limitado (429); concorrência reduzida para {self.limit:.1f}")
+        elif status == 200:
+            self.limit = min(self.max_concurrency, self.limit + 1.0 / max(self.limit, 1.0))
+
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        if remaining_requests is not None and self.requests is not None:
+            try:
+                self.requests.sync_remaining(float(remaining_requests))
+            except ValueError:
+                pass
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None and self.tokens is not None:
+            try:
+                self.tokens.sync_remaining(float(remaining_tokens))
+            except ValueError:
+                pass
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "throttled": self.throttled,
+            "blocked_for_seconds": round(max(self.blocked_until - time.monotonic(), 0.0), 3),
+        }
+
+class DeploymentRateLimits:
+    """Limitadores por deployment, criados sob demanda.
+
+    Deployments sem RPM/TPM configurados ainda têm concorrência adaptativa e
+    respeitam Retry-After.
+    """
+
+    def __init__(
+        self,
+        rpm_limits: Optional[Dict[str, int]] = None,
+        tpm_limits: Optional[Dict[str, int]] = None,
+        initial_concurrency: float = 8,
+        max_concurrency: float = 64,
+    ):
+        self.rpm_limits = rpm_limits or {}
+        self.tpm_limits = tpm_limits or {}
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.limiters: Dict[str, DeploymentLimiter] = {}
+
+    @classmethod
+    def from_settings(cls) -> "DeploymentRateLimits":
+        return cls(
+            rpm_limits=settings.DEPLOYMENT_RPM_LIMITS,
+            tpm_limits=settings.DEPLOYMENT_TPM_LIMITS,
+            initial_concurrency=settings.DEPLOYMENT_INITIAL_CONCURRENCY,
+            max_concurrency=settings.DEPLOYMENT_MAX_CONCURRENCY,
+        )
+
+    def get(self, deployment: str) -> DeploymentLimiter:
+        limiter = self.limiters.get(deployment)
+        if limiter is None:
+            limiter = DeploymentLimiter(
+                rpm=self.rpm_limits.get(deployment),
+                tpm=self.tpm_limits.get(deployment),
+                initial_concurrency=self.initial_concurrency,
+                max_concurrency=self.max_concurrency,
+            )
+            self.limiters[deployment] = limiter
+        return limiter
+
+    @asynccontextmanager
+    async def slot(self, deployment: str, estimated_tokens: int = 0) -> AsyncIterator[DeploymentLimiter]:
+        limiter = self.get(deployment)
+        await limiter.acquire(estimated_tokens)
+        try:
+            yield limiter
+        finally:
+            await limiter.release()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {deployment: limiter.stats() for deployment, limiter in self.limiters.items()}
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+import logging
+from motor.motor_asyncio import AsyncIOMotorCollection
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def make_cache_key(url: str, payload: Dict[str, Any]) -> str:
+    """Gera a chave do cache a partir do deployment e do payload completo."""
+    raw = json.dumps({"url": url, "payload": payload}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """Cache exato de respostas do modelo: LRU+TTL em memória e, opcionalmente, Mongo compartilhado."""
+
+    def __init__(
+        self,
+        max_entries: int = settings.RESPONSE_CACHE_MAX_ENTRIES,
+        ttl: int = settings.RESPONSE_CACHE_TTL,
+        collection: Optional[AsyncIOMotorCollection] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.collection = collection
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._index_ready = False
+        self.hits = 0
+        self.misses = 0
+
+    async def _ensure_index(self):
+        if self.collection is not None and not self._index_ready:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+            self._index_ready = True
+
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def _set_local(self, key: str, response: Dict[str, Any], ttl: int):
+        self._entries[key] = (time.monotonic() + ttl, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _get_shared(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        await self._ensure_index()
+        doc = await self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+        if not doc:
+            return None
+        return doc["response"], (doc["expires_at"] - datetime.utcnow()).total_seconds()
+
+    async def _set_shared(self, key: str, response: Dict[str, Any], ttl: int):
+        await self._ensure_index()
+        await self.collection.replace_one(
+            {"_id": key},
+            {"_id": key, "response": response, "expires_at": datetime.utcnow() + timedelta(seconds=ttl)},
+            upsert=True,
+        )
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        response = self._get_local(key)
+        if response is None and self.collection is not None:
+            try:
+                shared = await self._get_shared(key)
+            except Exception as e:
+                logger.warning(f"Falha ao consultar cache compartilhado: {str(e)}")
+                shared = None
+            if shared is not None:
+                response, remaining = shared
+                self._set_local(key, response, max(int(remaining), 1))
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    async def set(self, key: str, response: Dict[str, Any], ttl: Optional[int] = None):
+        ttl = ttl or self.ttl
+        self._set_local(key, response, ttl)
+        if self.collection is not None:
+            try:
+                await self._set_shared(key, response, ttl)
+            except Exception as e:
+                logger.warning(f"Falha ao gravar cache compartilhado: {str(e)}")
+
+    def clear(self):
+        self._entries.clear()
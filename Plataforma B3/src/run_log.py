@@ -0,0 +1,171 @@
+import asyncio
+import uuid
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+import logging
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, DESCENDING, InsertOne, UpdateOne, ReturnDocument
+from flow_manager import Flow
+from flow_executor import StepResult
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class RunLog:
+    """Registro das execuções de fluxo e de cada passo concluído, gravado em segundo plano.
+
+    As operações são acumuladas em memória e enviadas em lotes com
+    `bulk_write` ordenado, a cada `flush_interval` segundos ou quando
+    `batch_size` operações estão pendentes; o caminho de execução nunca
+    espera pelo banco. Falhas de escrita são registradas em log e não
+    interrompem a execução.
+    """
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        batch_size: int = settings.RUN_LOG_BATCH_SIZE,
+        flush_interval: float = settings.RUN_LOG_FLUSH_INTERVAL,
+    ):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[Any] = []
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.failed_writes = 0
+        self.batches = 0
+
+    async def start(self):
+        await self.collection.create_index([("flow_id", ASCENDING), ("created_at", DESCENDING)], name="flow_id_1_created_at_-1")
+        await self.collection.create_index([("status", ASCENDING)], name="status_1")
+        self._task = asyncio.ensure_future(self._flush_loop())
+
+    async def close(self):
+        """Encerra o envio periódico e grava o que ainda estiver pendente."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def _enqueue(self, operation):
+        self._pending.append(operation)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def start_run(self, flow: Flow, flow_id: Optional[str], user_message: str) -> str:
+        """Registra uma nova execução; a definição do fluxo é guardada para a retomada."""
+        run_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        self._enqueue(InsertOne({
+            "_id": run_id,
+            "flow_id": flow_id,
+            "flow_name": flow.name,
+            "flow": flow.model_dump(),
+            "user_message": user_message,
+            "status": "running",
+            "attempts": 1,
+            "steps": [],
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }))
+        return run_id
+
+    def record_step(self, run_id: str, result: StepResult):
+        self._enqueue(UpdateOne(
+            {"_id": run_id},
+            {"$push": {"steps": asdict(result)}, "$set": {"updated_at": datetime.utcnow()}}
+        ))
+
+    def finish_run(self, run_id: str, status: str, final_response: Optional[str] = None, error: Optional[str] = None):
+        now = datetime.utcnow()
+        self._enqueue(UpdateOne(
+            {"_id": run_id},
+            {"$set": {
+                "status": status,
+                "final_response": final_response,
+                "error": error,
+                "finished_at": now,
+                "updated_at": now,
+            }}
+        ))
+
+    def update_run(self, run_id: str, fields: Dict[str, Any]):
+        """Atualiza campos avulsos da execução (ex.: o workflow do Argo que a executa)."""
+        self._enqueue(UpdateOne({"_id": run_id}, {"$set": {**fields, "updated_at": datetime.utcnow()}}))
+
+    def resume_run(self, run_id: str):
+        self._enqueue(UpdateOne(
+            {"_id": run_id},
+            {"$set": {"status": "running", "error": None, "updated_at": datetime.utcnow()}, "$inc": {"attempts": 1}}
+        ))
+
+    async def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Lê uma execução após gravar as operações pendentes."""
+        await self.flush()
+        return await self.collection.find_one({"_id": run_id})
+
+    async def claim(self, run_id: str, stale_after: float = settings.RUN_STALE_AFTER) -> Optional[Dict[str, Any]]:
+        """Marca como "running", de forma atômica, uma execução que pode ser retomada e a retorna.
+
+        Só execuções com falha ou "running" sem atualização há `stale_after`
+        segundos são assumidas; para as demais (concluídas ou em andamento em
+        outra requisição, worker ou workflow) retorna None.
+        """
+        await self.flush()
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"_id": run_id, "$or": [
+                {"status": "failed"},
+                {"status": "running", "updated_at": {"$lt": now - timedelta(seconds=stale_after)}},
+            ]},
+            {"$set": {"status": "running", "updated_at": now}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def flush(self):
+        async with self._lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                await self._write(batch)
+
+    async def _write(self, batch: List[Any]):
+        try:
+            await self.collection.bulk_write(batch, ordered=True)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed_writes += len(batch)
+            logger.error(f"Falha ao gravar {len(batch)} operações do registro de execuções: {str(e)}")
+        self.batches += 1
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "failed_writes": self.failed_writes,
+            "batches": self.batches,
+        }
+
+def completed_steps(run: Dict[str, Any]) -> Dict[str, StepResult]:
+    """Passos concluídos de uma execução registrada, no formato aceito por FlowExecutor.run."""
+    return {
+        step["step_name"]: StepResult(**step)
+        for step in run.get("steps", [])
+        if step["status"] == "done"
+    }
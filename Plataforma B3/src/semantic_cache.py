@@ -0,0 +1,352 @@
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
+import logging
+import aiohttp
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, DESCENDING
+from rate_limit import DeploymentRateLimits
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EmbedMany = Callable[[List[str]], Awaitable[List[np.ndarray]]]
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+class StubEmbedder:
+    """Embedder local e determinístico para testes: bag of words com hashing.
+
+    Textos com as mesmas palavras têm similaridade 1; textos parecidos
+    ficam próximos. Nenhuma chamada de rede é feita.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+        self.calls = 0
+        self.texts = 0
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in re.findall(r"\w+", text.casefold()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimensions] += 1.0
+        return _normalize(vector)
+
+    async def embed_many(self, texts: List[str]) -> List[np.ndarray]:
+        self.calls += 1
+        self.texts += len(texts)
+        return [self._embed(text) for text in texts]
+
+class AzureEmbedder:
+    """Embeddings do deployment UFPB_OPENAI_EMBEDDING_DEPLOYMENT (uma requisição por lote de textos)."""
+
+    def __init__(
+        self,
+        api_key: str,
+        session: aiohttp.ClientSession,
+        rate_limits: Optional[DeploymentRateLimits] = None,
+        url: Optional[str] = None
+    ):
+        if not api_key:
+            raise ValueError("API_KEY não pode ser vazia")
+        self.session = session
+        self.rate_limits = rate_limits
+        self.url = url or settings.EMBEDDING_URL()
+        self.headers = {"Content-Type": "application/json", "api-key": api_key}
+        self.calls = 0
+        self.texts = 0
+
+    async def embed_many(self, texts: List[str]) -> List[np.ndarray]:
+        self.calls += 1
+        self.texts += len(texts)
+        deployment = settings.UFPB_OPENAI_EMBEDDING_DEPLOYMENT
+        async with (self.rate_limits.slot(deployment) if self.rate_limits is not None else nullcontext()) as limiter:
+            async with self.session.post(self.url, headers=self.headers, json={"input": texts}) as response:
+                if limiter is not None:
+                    limiter.observe(response.status, response.headers)
+                if response.status != 200:
+                    raise ValueError(f"Erro na chamada de embeddings ({response.status}): {await response.text()}")
+                data = (await response.json())["data"]
+        # A API devolve um item por texto, identificado por `index`
+        return [_normalize(item["embedding"]) for item in sorted(data, key=lambda item: item["index"])]
+
+class EmbeddingBatcher:
+    """Agrupa pedidos de embedding concorrentes em lotes.
+
+    Cada lote é enviado quando reúne `max_batch` textos ou após `window`
+    segundos do primeiro pedido, o que ocorrer primeiro.
+    """
+
+    def __init__(self, embed_many: EmbedMany, max_batch: int = 16, window: float = 0.01):
+        self.embed_many = embed_many
+        self.max_batch = max_batch
+        self.window = window
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+
+    async def embed(self, text: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self.batches += 1
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            vectors = await self.embed_many([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+class VectorIndex:
+    """Índice vetorial em memória (NumPy) limitado a `max_entries`, com remoção do item menos usado.
+
+    Os arrays crescem (e encolhem) sob demanda, dobrando de tamanho: um
+    índice ocupa memória proporcional às entradas que de fato guarda.
+    """
+
+    INITIAL_CAPACITY = 16
+
+    def __init__(self, dimensions: int, max_entries: int):
+        self.max_entries = max_entries
+        capacity = min(self.INITIAL_CAPACITY, max_entries)
+        self.vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.answers: List[str] = []
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.size = 0
+        # Entradas gravadas no Mongo desde a última poda do namespace
+        self.inserts = 0
+
+    def _resize(self, capacity: int):
+        vectors = np.zeros((capacity, self.vectors.shape[1]), dtype=np.float32)
+        vectors[:self.size] = self.vectors[:self.size]
+        last_used = np.zeros(capacity, dtype=np.float64)
+        last_used[:self.size] = self.last_used[:self.size]
+        self.vectors, self.last_used = vectors, last_used
+
+    def search(self, vector: np.ndarray) -> Tuple[Optional[int], float]:
+        """Vizinho mais próximo por similaridade de cosseno (vetores normalizados)."""
+        if self.size == 0:
+            return None, 0.0
+        scores = self.vectors[:self.size] @ vector
+        index = int(np.argmax(scores))
+        return index, float(scores[index])
+
+    def add(self, vector: np.ndarray, answer: str) -> int:
+        if self.size < self.max_entries:
+            if self.size == len(self.vectors):
+                self._resize(min(self.size * 2, self.max_entries))
+            index = self.size
+            self.size += 1
+            self.answers.append(answer)
+        else:
+            index = int(np.argmin(self.last_used[:self.size]))
+            self.answers[index] = answer
+        self.vectors[index] = vector
+        self.last_used[index] = time.monotonic()
+        return index
+
+    def remove_least_used(self):
+        """Remove a entrada usada há mais tempo, movendo a última para o lugar dela."""
+        index = int(np.argmin(self.last_used[:self.size]))
+        last = self.size - 1
+        self.vectors[index] = self.vectors[last]
+        self.last_used[index] = self.last_used[last]
+        self.answers[index] = self.answers[last]
+        self.answers.pop()
+        self.size -= 1
+        if self.INITIAL_CAPACITY < len(self.vectors) and self.size <= len(self.vectors) // 4:
+            self._resize(len(self.vectors) // 2)
+
+    def touch(self, index: int):
+        self.last_used[index] = time.monotonic()
+
+class SemanticCache:
+    """Cache semântico de respostas: entradas parecidas com uma já respondida reutilizam a resposta.
+
+    As entradas são separadas por `namespace` (o passo: deployment, prompt
+    de sistema e parâmetros), cada um com seu índice limitado a
+    `max_entries`. No total ficam no máximo `max_namespaces` índices e
+    `max_total_entries` entradas: ao passar desses limites, saem primeiro
+    as entradas dos namespaces usados há mais tempo (ex.: revisões antigas
+    de um prompt). Com `collection`, as entradas também são gravadas no
+    Mongo (expiram após SEMANTIC_CACHE_RETENTION e cada namespace é podado
+    para as `max_entries` mais recentes) e recarregadas por `load`.
+    """
+
+    def __init__(
+        self,
+        embed_many: EmbedMany,
+        threshold: float = settings.SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = settings.SEMANTIC_CACHE_MAX_ENTRIES,
+        max_total_entries: int = settings.SEMANTIC_CACHE_MAX_TOTAL_ENTRIES,
+        max_namespaces: int = settings.SEMANTIC_CACHE_MAX_NAMESPACES,
+        collection: Optional[AsyncIOMotorCollection] = None,
+        max_batch: int = settings.EMBEDDING_BATCH_SIZE,
+        batch_window: float = settings.EMBEDDING_BATCH_WINDOW,
+    ):
+        self.batcher = EmbeddingBatcher(embed_many, max_batch=max_batch, window=batch_window)
+        self.threshold = threshold
+        self.max_entries = min(max_entries, max_total_entries)
+        self.max_total_entries = max_total_entries
+        self.max_namespaces = max_namespaces
+        self.collection = collection
+        # Em ordem de uso: o primeiro é o namespace usado há mais tempo
+        self.indexes: "OrderedDict[str, VectorIndex]" = OrderedDict()
+        self.entries = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _index(self, namespace: str, dimensions: int) -> VectorIndex:
+        index = self.indexes.get(namespace)
+        if index is None:
+            index = self.indexes[namespace] = VectorIndex(dimensions, self.max_entries)
+            while len(self.indexes) > self.max_namespaces:
+                _, evicted = self.indexes.popitem(last=False)
+                self.entries -= evicted.size
+                self.evictions += evicted.size
+        self.indexes.move_to_end(namespace)
+        return index
+
+    def _add(self, namespace: str, vector: np.ndarray, answer: str):
+        index = self._index(namespace, len(vector))
+        before = index.size
+        index.add(vector, answer)
+        self.entries += index.size - before
+        while self.entries > self.max_total_entries:
+            # O namespace atual é o último da ordem e cabe sozinho no limite
+            oldest_name, oldest = next(iter(self.indexes.items()))
+            oldest.remove_least_used()
+            self.entries -= 1
+            self.evictions += 1
+            if oldest.size == 0:
+                del self.indexes[oldest_name]
+
+    async def lookup(
+        self,
+        namespace: str,
+        text: str,
+        threshold: Optional[float] = None
+    ) -> Tuple[Optional[str], np.ndarray]:
+        """Retorna (resposta, embedding); a resposta é None se não houver vizinho acima do limiar.
+
+        O embedding é devolvido para que `store` não precise recalculá-lo.
+        """
+        vector = await self.batcher.embed(text)
+        index = self.indexes.get(namespace)
+        if index is not None:
+            position, score = index.search(vector)
+            if position is not None and score >= (threshold if threshold is not None else self.threshold):
+                index.touch(position)
+                self.indexes.move_to_end(namespace)
+                self.hits += 1
+                return index.answers[position], vector
+        self.misses += 1
+        return None, vector
+
+    async def store(self, namespace: str, text: str, vector: np.ndarray, answer: str):
+        self._add(namespace, vector, answer)
+        if self.collection is not None:
+            try:
+                await self.collection.insert_one({
+                    "namespace": namespace,
+                    "text": text,
+                    "vector": vector.tolist(),
+                    "answer": answer,
+                    "created_at": datetime.utcnow(),
+                })
+                index = self.indexes[namespace]
+                index.inserts += 1
+                if index.inserts >= settings.SEMANTIC_CACHE_TRIM_EVERY:
+                    index.inserts = 0
+                    await self._trim(namespace)
+            except Exception as e:
+                logger.warning(f"Falha ao gravar cache semântico: {str(e)}")
+
+    async def _trim(self, namespace: str):
+        """Apaga do Mongo as entradas do namespace além das `max_entries` mais recentes."""
+        cursor = (
+            self.collection.find({"namespace": namespace}, {"created_at": 1})
+            .sort("created_at", DESCENDING).skip(self.max_entries).limit(1)
+        )
+        newest_dropped = await cursor.to_list(1)
+        if newest_dropped:
+            await self.collection.delete_many(
+                {"namespace": namespace, "created_at": {"$lte": newest_dropped[0]["created_at"]}}
+            )
+
+    async def load(self):
+        """Cria os índices da coleção e recarrega as entradas mais recentes de cada namespace.
+
+        Cada namespace é lido à parte, ordenado pelo índice
+        (namespace, created_at) e limitado a `max_entries`.
+        """
+        if self.collection is None:
+            return
+        await self.collection.create_index(
+            [("namespace", ASCENDING), ("created_at", DESCENDING)], name="namespace_1_created_at_-1"
+        )
+        await self.collection.create_index(
+            "created_at", name="created_at_ttl", expireAfterSeconds=settings.SEMANTIC_CACHE_RETENTION
+        )
+        loaded = 0
+        for namespace in (await self.collection.distinct("namespace"))[:self.max_namespaces]:
+            if self.entries >= self.max_total_entries:
+                break
+            docs = await (
+                self.collection.find({"namespace": namespace}, {"vector": 1, "answer": 1})
+                .sort("created_at", DESCENDING).limit(self.max_entries).to_list(None)
+            )
+            # A mais recente entra por último e fica como a usada há menos tempo
+            for doc in reversed(docs):
+                self._add(namespace, _normalize(doc["vector"]), doc["answer"])
+            loaded += len(docs)
+        logger.info(f"Cache semântico: {loaded} entradas carregadas")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": self.entries,
+            "namespaces": len(self.indexes),
+            "evictions": self.evictions,
+            "embedding_batches": self.batcher.batches,
+        }
+
+def build_embedder(session: aiohttp.ClientSession, rate_limits: Optional[DeploymentRateLimits] = None):
+    """Embedder configurado em SEMANTIC_CACHE_EMBEDDER: "azure" (padrão) ou "stub"."""
+    if settings.SEMANTIC_CACHE_EMBEDDER == "stub":
+        return StubEmbedder()
+    if settings.SEMANTIC_CACHE_EMBEDDER != "azure":
+        raise ValueError(f"SEMANTIC_CACHE_EMBEDDER inválido: '{settings.SEMANTIC_CACHE_EMBEDDER}'")
+    return AzureEmbedder(settings.UFPB_OPENAI_API_KEY, session, rate_limits=rate_limits)
@@ -0,0 +1,71 @@
+import asyncio
+import json
+from batch import BatchJob, iter_lines, run_batch
+from flow_manager import Flow
+from model_integration import FlowRunError
+
+FLOW = Flow(name="Fluxo", steps=[{"step_name": "resumo", "step_order": 1, "system_prompt": "Resuma"}])
+
+class FakeModelClient:
+    """Responde com a própria mensagem; a espera (e falhas) vêm do texto, para embaralhar a conclusão."""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def process_flow(self, user_message, flow, flow_id=None, timeout=None):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            delay, _, text = user_message.partition(":")
+            await asyncio.sleep(float(delay))
+            if text == "falha":
+                raise FlowRunError("Passo 'resumo' falhou", run_id="execucao-1", completed_steps=[])
+            return {"final_response": text}
+        finally:
+            self.active -= 1
+
+def collect(lines, concurrency=2, ordered=True):
+    async def run():
+        client = FakeModelClient()
+        job = BatchJob("fluxo", concurrency=concurrency, ordered=ordered)
+        records = [record async for record in run_batch(client, FLOW, iter_lines(lines), job)]
+        return records, job, client.peak
+
+    return asyncio.run(run())
+
+def items(*messages):
+    return [json.dumps({"user_message": message}).encode() + b"\n" for message in messages]
+
+def test_ordered_batch_follows_the_input_order():
+    records, job, peak = collect(items("0.03:a", "0.001:b", "0.02:c", "0:d"), concurrency=2)
+    assert [record["index"] for record in records] == [0, 1, 2, 3]
+    assert [record["result"]["final_response"] for record in records] == ["a", "b", "c", "d"]
+    assert peak <= 2
+    assert job.finished and job.completed == 4 and job.failed == 0
+
+def test_unordered_batch_follows_the_completion_order():
+    records, job, _ = collect(items("0.05:a", "0:b", "0.02:c"), concurrency=3, ordered=False)
+    assert [record["id"] for record in records] == [1, 2, 0]
+    assert job.progress()["in_flight"] == 0
+
+def test_bad_lines_fail_only_their_own_item():
+    lines = [
+        b'{"id": "x1", "user_message": "0:ok"}\n',
+        b"\n",
+        b'{"user_message": "\xff"}\n',
+        b"{quebrado\n",
+        b'{"sem_mensagem": 1}\n',
+        b'{"id": "x5", "user_message": "0:falha"}\n',
+        b'"0:texto"\n',
+    ]
+    records, job, _ = collect(lines)
+    assert [(record["index"], record["id"], record["status"]) for record in records] == [
+        (0, "x1", "ok"), (1, 1, "error"), (2, 2, "error"), (3, 3, "error"), (4, "x5", "error"), (5, 5, "ok"),
+    ]
+    assert "utf-8" in records[1]["error"]
+    assert "user_message" in records[3]["error"]
+    # A falha do fluxo leva o run_id e os passos concluídos para a retomada
+    assert records[4]["run_id"] == "execucao-1" and records[4]["completed_steps"] == []
+    assert records[5]["result"] == {"final_response": "texto"}
+    assert job.completed == 2 and job.failed == 4
@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+import chunking
+from chunking import CHARS_PER_TOKEN, chunk_size, count_tokens, group_partials, split_text
+from config import settings
+from flow_manager import FlowStep
+from model_integration import ModelIntegration
+
+class CharEncoding:
+    """Tokenizador de teste: um token por caractere."""
+
+    def encode(self, text, disallowed_special=()):
+        return list(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+@pytest.fixture
+def estimate(monkeypatch):
+    """Força a estimativa por caracteres, como sem o tiktoken."""
+    monkeypatch.setattr(chunking, "_encoding", lambda model: None)
+
+@pytest.fixture
+def char_tokens(monkeypatch):
+    monkeypatch.setattr(chunking, "_encoding", lambda model: CharEncoding())
+
+def test_token_windows_repeat_the_overlap_and_cover_the_text(char_tokens):
+    text = "".join(chr(ord("a") + index % 26) for index in range(95))
+    chunks = split_text(text, "gpt-4o", size=20, overlap=5)
+    assert all(len(chunk) <= 20 for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.startswith(previous[-5:])
+    assert chunks[0] + "".join(chunk[5:] for chunk in chunks[1:]) == text
+    # Nenhum trecho é só a sobreposição do anterior
+    assert len(chunks) == 6
+
+def test_overlap_is_capped_below_chunk_size(char_tokens):
+    chunks = split_text("abcdefghij", "gpt-4o", size=3, overlap=10)
+    assert chunks[0] == "abc" and chunks[1].startswith("bc")
+
+def test_estimate_cuts_at_spaces_and_keeps_the_overlap(estimate):
+    text = " ".join(f"palavra{index:03d}" for index in range(200))
+    chunks = split_text(text, "gpt-4o", size=50, overlap=5)
+    overlap = 5 * CHARS_PER_TOKEN
+    assert all(len(chunk) <= 50 * CHARS_PER_TOKEN for chunk in chunks)
+    # Os cortes caem em espaços, sem partir palavras
+    assert all(chunk.endswith(tuple("0123456789")) for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.startswith(previous[-overlap:])
+    assert chunks[0] + "".join(chunk[overlap:] for chunk in chunks[1:]) == text
+
+def test_chunk_size_is_limited_by_the_context_window(estimate, monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_CONTEXT_WINDOWS", {"pequeno": 1000})
+    monkeypatch.setattr(settings, "CHUNK_SAFETY_MARGIN", 0)
+    prompt = "x" * 396  # 100 tokens pela estimativa
+    assert count_tokens(prompt, "pequeno") == 100
+    assert chunk_size("pequeno", prompt, max_tokens=200, chunk_tokens=5000) == 700
+    assert chunk_size("pequeno", prompt, max_tokens=200, chunk_tokens=300) == 300
+    with pytest.raises(ValueError, match="não comporta"):
+        chunk_size("pequeno", prompt, max_tokens=900)
+
+def test_groups_fit_the_budget_and_always_shrink(estimate):
+    partials = ["x" * 39] * 7  # 10 tokens cada
+    groups = group_partials(partials, "gpt-4o", budget=30)
+    assert [len(group) for group in groups] == [3, 4]
+    assert sum(groups, []) == partials
+    # Mesmo quando um parcial sozinho estoura o orçamento, cada grupo junta ao menos dois
+    assert [len(group) for group in group_partials(partials[:3], "gpt-4o", budget=5)] == [3]
+
+def test_chunked_step_maps_in_parallel_and_reduces_in_rounds(estimate, monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_CONTEXT_WINDOWS", {"gpt-4o": 400})
+    monkeypatch.setattr(settings, "CHUNK_SAFETY_MARGIN", 0)
+    step = FlowStep(
+        step_name="resumo", step_order=1, system_prompt="Resuma", model="gpt-4o", max_tokens=40,
+        chunked=True, chunk_tokens=100, chunk_overlap=0, chunk_concurrency=3, reduce_prompt="Combine"
+    )
+    client = ModelIntegration("teste")
+    calls, active, peak = [], 0, 0
+
+    async def complete(step, messages, model_url, fallback_urls, hedge, on_delta=None, stream=True):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.001)
+        active -= 1
+        calls.append(messages[0]["content"])
+        # Parciais longos (~60 tokens) para que a redução precise de mais de uma rodada
+        return "p" * 240
+
+    monkeypatch.setattr(client, "_complete", complete)
+    text = " ".join(f"termo{index:04d}" for index in range(1200))
+    answer, messages = asyncio.run(client.process_step(step, text))
+
+    chunks = calls.count("Resuma")
+    reduces = calls.count("Combine")
+    assert chunks == len(split_text(text, "gpt-4o", 100, 0)) > 10
+    # Orçamento de ~359 tokens: 5 parciais por grupo, e rodadas até sobrar um grupo
+    assert reduces > 2
+    assert calls[-1] == "Combine" and messages[0]["content"] == "Combine"
+    assert "[Parte 1/" in messages[1]["content"]
+    assert answer == "p" * 240
+    assert peak <= 3
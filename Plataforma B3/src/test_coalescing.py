@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+from coalescing import SingleFlight
+from deadline import deadline_scope, remaining
+
+class Upstream:
+    """Chamada upstream controlada pelo teste: conta execuções e termina quando `release` é acionado."""
+
+    def __init__(self, result="resposta", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+        self.deadlines = []
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        self.deadlines.append(remaining())
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+def test_concurrent_calls_share_one_upstream_request():
+    async def run():
+        flight = SingleFlight()
+        upstream = Upstream()
+        callers = [asyncio.ensure_future(flight.do("chave", upstream)) for _ in range(5)]
+        other = asyncio.ensure_future(flight.do("outra", Upstream("outra resposta")))
+        await asyncio.sleep(0)
+        waiting = flight.stats()
+        upstream.release.set()
+        results = await asyncio.gather(*callers)
+        other.cancel()
+        await asyncio.gather(other, return_exceptions=True)
+        return upstream.calls, results, waiting, flight.stats()
+
+    calls, results, waiting, stats = asyncio.run(run())
+    assert calls == 1
+    assert results == ["resposta"] * 5
+    assert waiting["in_flight"] == 2 and waiting["waiting"] == 6
+    assert stats == {"leaders": 2, "coalesced": 4, "in_flight": 0, "waiting": 0}
+
+def test_every_waiter_receives_the_same_exception():
+    async def run():
+        flight = SingleFlight()
+        upstream = Upstream(error=ValueError("upstream falhou"))
+        callers = [asyncio.ensure_future(flight.do("chave", upstream)) for _ in range(3)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return await asyncio.gather(*callers, return_exceptions=True), flight.stats()
+
+    results, stats = asyncio.run(run())
+    assert [str(result) for result in results] == ["upstream falhou"] * 3
+    assert stats["in_flight"] == 0
+
+def test_upstream_survives_until_the_last_waiter_gives_up():
+    async def run():
+        flight = SingleFlight()
+        upstream = Upstream()
+        first = asyncio.ensure_future(flight.do("chave", upstream))
+        second = asyncio.ensure_future(flight.do("chave", upstream))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        cancelled_after_first = upstream.cancelled
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        await asyncio.sleep(0)
+        return cancelled_after_first, upstream.cancelled, flight.stats()
+
+    cancelled_after_first, cancelled, stats = asyncio.run(run())
+    assert cancelled_after_first == 0
+    assert cancelled == 1
+    assert stats["in_flight"] == 0
+
+def test_leader_deadline_does_not_cut_the_shared_request():
+    async def run():
+        flight = SingleFlight()
+        upstream = Upstream()
+
+        async def leader():
+            with deadline_scope(0.05):
+                return await flight.do("chave", upstream)
+
+        leading = asyncio.ensure_future(leader())
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("chave", upstream))
+        with pytest.raises(asyncio.TimeoutError):
+            await leading
+        upstream.release.set()
+        return await follower, upstream
+
+    result, upstream = asyncio.run(run())
+    assert result == "resposta"
+    assert upstream.calls == 1
+    assert upstream.cancelled == 0
+    # A requisição compartilhada não herda o prazo de quem a disparou
+    assert upstream.deadlines == [None]
+
+def test_new_request_after_the_previous_one_finishes():
+    async def run():
+        flight = SingleFlight()
+        upstream = Upstream()
+        upstream.release.set()
+        await flight.do("chave", upstream)
+        await flight.do("chave", upstream)
+        return upstream.calls
+
+    assert asyncio.run(run()) == 2
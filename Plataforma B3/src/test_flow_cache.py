@@ -0,0 +1,98 @@
+import asyncio
+from pymongo.errors import OperationFailure
+from flow_manager import Flow, FlowCache
+
+FLOW = Flow(name="Fluxo", steps=[{"step_name": "resumo", "step_order": 1, "system_prompt": "Resuma"}])
+
+class FakeStream:
+    """Change stream roteirizado: produz `changes` e depois falha com `error` (ou espera)."""
+
+    def __init__(self, changes, error=None):
+        self.changes = list(changes)
+        self.error = error
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.changes:
+            change = self.changes.pop(0)
+            self.resume_token = {"_data": change["documentKey"]["_id"]}
+            return change
+        if self.error is not None:
+            raise self.error
+        await asyncio.Event().wait()
+
+class FakeCollection:
+    def __init__(self, streams):
+        self.streams = list(streams)
+        self.resume_tokens = []
+
+    def watch(self, full_document=None, resume_after=None):
+        self.resume_tokens.append(resume_after)
+        stream = self.streams.pop(0)
+        if isinstance(stream, Exception):
+            raise stream
+        return stream
+
+def change(flow_id, revision):
+    return {"operationType": "update", "documentKey": {"_id": flow_id}, "fullDocument": {"revision": revision}}
+
+def test_watch_reopens_stream_from_resume_token():
+    async def run():
+        cache = FlowCache()
+        cache.put("a", 1, FLOW)
+        cache.put("b", 1, FLOW)
+        collection = FakeCollection([
+            FakeStream([change("a", 2)], error=ConnectionError("eleição")),
+            FakeStream([change("b", 2)]),
+        ])
+        task = asyncio.ensure_future(cache.watch(collection, retry_base_delay=0.01, retry_max_delay=0.01))
+        await asyncio.sleep(0.1)
+        status = cache.watch_status
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return cache, collection, status
+
+    cache, collection, status = asyncio.run(run())
+    assert status == "watching"
+    assert cache.watch_status == "stopped"
+    assert cache.watch_restarts == 1
+    # A segunda abertura retoma do token da última alteração recebida
+    assert collection.resume_tokens == [None, {"_data": "a"}]
+    assert cache.get("a") is None and cache.get("b") is None
+
+def test_watch_clears_cache_when_it_cannot_resume():
+    async def run():
+        cache = FlowCache()
+        cache.put("a", 1, FLOW)
+        collection = FakeCollection([ConnectionError("rede"), FakeStream([])])
+        task = asyncio.ensure_future(cache.watch(collection, retry_base_delay=0.01, retry_max_delay=0.01))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return cache, collection
+
+    cache, collection = asyncio.run(run())
+    assert collection.resume_tokens == [None, None]
+    assert cache.watch_restarts == 1
+    assert cache.get("a") is None
+
+def test_watch_stops_when_change_streams_are_unsupported():
+    async def run():
+        cache = FlowCache()
+        cache.put("a", 1, FLOW)
+        unsupported = OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+        await asyncio.wait_for(cache.watch(FakeCollection([unsupported])), 1)
+        return cache
+
+    cache = asyncio.run(run())
+    assert cache.watch_status == "unsupported"
+    assert cache.get("a") is None
@@ -0,0 +1,131 @@
+import asyncio
+import pytest
+from flow_executor import FlowExecutor, FlowGraph, StepResult, evaluate_router
+from flow_manager import Flow
+
+def triage_flow(**overrides) -> Flow:
+    steps = [
+        {"step_name": "classificar", "step_order": 1, "system_prompt": "Classifique"},
+        {"step_name": "router", "conditions": {"urgente": "Urgente", "normal": "Normal"}},
+        {"step_name": "responder_urgente", "step_order": 2, "execute_if": "urgente", "system_prompt": "Responda"},
+        {"step_name": "responder_normal", "step_order": 2, "execute_if": "normal", "system_prompt": "Responda"},
+        {"step_name": "resumo", "step_order": 2, "system_prompt": "Resuma", "depends_on": ["classificar"]},
+    ]
+    return Flow(name="Triagem", steps=steps, **overrides)
+
+def scripted_runner(outputs, calls, delay=0.0):
+    """StepRunner que responde `outputs[passo]` e registra a ordem de início e fim das chamadas."""
+    async def run_step(step, step_input):
+        calls.append(("start", step.step_name, step_input))
+        await asyncio.sleep(delay)
+        calls.append(("end", step.step_name))
+        return outputs.get(step.step_name, f"{step.step_name}:{step_input}"), []
+    return run_step
+
+def test_edges_follow_depends_on_routers_and_execute_if():
+    graph = FlowGraph(triage_flow())
+    assert graph.dependencies == {
+        "classificar": [],
+        # Router sem step_order: depende dos passos da maior ordem declarada antes dele
+        "router": ["classificar"],
+        # execute_if: depende do router que declara o rótulo
+        "responder_urgente": ["router"],
+        "responder_normal": ["router"],
+        # depends_on explícito prevalece sobre a ordem
+        "resumo": ["classificar"],
+    }
+    assert graph.order.index("classificar") < graph.order.index("router") < graph.order.index("responder_urgente")
+
+def test_steps_of_order_n_depend_on_all_steps_of_order_n_minus_1():
+    flow = Flow(name="Camadas", steps=[
+        {"step_name": "a", "step_order": 1, "system_prompt": "x"},
+        {"step_name": "b", "step_order": 1, "system_prompt": "x"},
+        {"step_name": "c", "step_order": 2, "system_prompt": "x"},
+    ])
+    assert FlowGraph(flow).dependencies["c"] == ["a", "b"]
+
+@pytest.mark.parametrize("steps, message", [
+    ([{"step_name": "a", "step_order": 1, "system_prompt": "x"},
+      {"step_name": "a", "step_order": 2, "system_prompt": "x"}], "duplicado"),
+    ([{"step_name": "a", "step_order": 1, "system_prompt": "x", "execute_if": "sim"}], "sem router"),
+    ([{"step_name": "a", "step_order": 1, "system_prompt": "x", "depends_on": ["b"]}], "inexistente"),
+    ([{"step_name": "a", "step_order": 1, "system_prompt": "x", "depends_on": ["b"]},
+      {"step_name": "b", "step_order": 1, "system_prompt": "x", "depends_on": ["a"]}], "Ciclo"),
+    ([{"step_name": "a", "system_prompt": "x"}], "sem step_order"),
+])
+def test_invalid_graphs_are_rejected(steps, message):
+    with pytest.raises(ValueError, match=message):
+        FlowGraph(Flow(name="Invalido", steps=steps), use_plan=False)
+
+def test_router_matches_exact_label_before_substring():
+    step = triage_flow().steps[1]
+    assert evaluate_router(step, "Urgente.") == ["urgente"]
+    assert evaluate_router(step, "a prioridade é normal") == ["normal"]
+    assert evaluate_router(step, "indefinido") == []
+
+def test_router_runs_only_selected_branch_and_forwards_original_input():
+    calls = []
+    runner = scripted_runner({"classificar": "Urgente"}, calls)
+    executor = FlowExecutor(FlowGraph(triage_flow()), runner)
+    results = asyncio.run(executor.run("o servidor caiu"))
+
+    assert results["router"].route == ["urgente"]
+    assert results["responder_urgente"].status == "done"
+    assert results["responder_normal"].status == "skipped"
+    # O ramo recebe a entrada do passo classificado, não a saída do classificador
+    assert results["responder_urgente"].input == "o servidor caiu"
+    started = [name for event, name, *_ in calls if event == "start"]
+    assert "responder_normal" not in started
+    # Passos sem dependentes executados, na ordem do grafo
+    assert executor.final_response(results, "o servidor caiu") == (
+        "resumo:Urgente\n\nresponder_urgente:o servidor caiu"
+    )
+
+def test_router_without_match_skips_every_branch():
+    calls = []
+    executor = FlowExecutor(FlowGraph(triage_flow()), scripted_runner({"classificar": "Spam"}, calls))
+    results = asyncio.run(executor.run("promoção"))
+    assert results["router"].route == []
+    assert {results[name].status for name in ("responder_urgente", "responder_normal")} == {"skipped"}
+    assert executor.final_response(results, "promoção") == "resumo:Spam"
+
+def test_independent_steps_run_in_parallel():
+    flow = Flow(name="Paralelo", steps=[
+        {"step_name": "a", "step_order": 1, "system_prompt": "x"},
+        {"step_name": "b", "step_order": 1, "system_prompt": "x"},
+        {"step_name": "c", "step_order": 2, "system_prompt": "x"},
+    ])
+    calls = []
+    results = asyncio.run(FlowExecutor(FlowGraph(flow), scripted_runner({}, calls, delay=0.01)).run("entrada"))
+    # Os dois passos de ordem 1 começam antes de qualquer um terminar
+    assert [event for event, *_ in calls[:2]] == ["start", "start"]
+    assert results["c"].input == "a:entrada\n\nb:entrada"
+
+def test_completed_steps_are_reused_and_failure_cancels_the_rest():
+    flow = Flow(name="Cadeia", steps=[
+        {"step_name": "a", "step_order": 1, "system_prompt": "x"},
+        {"step_name": "b", "step_order": 2, "system_prompt": "x"},
+        {"step_name": "c", "step_order": 2, "system_prompt": "x"},
+    ])
+    first_calls = []
+
+    async def failing(step, step_input):
+        first_calls.append(step.step_name)
+        if step.step_name == "b":
+            raise ValueError("falhou")
+        if step.step_name == "c":
+            await asyncio.sleep(1)
+        return "ok", []
+
+    executor = FlowExecutor(FlowGraph(flow), failing)
+    with pytest.raises(ValueError, match="falhou"):
+        asyncio.run(executor.run("entrada"))
+    # "c" foi cancelado junto com a falha de "b"; só "a" chegou ao fim
+    assert set(executor.finished) == {"a"}
+    assert sorted(first_calls) == ["a", "b", "c"]
+
+    calls = []
+    completed = {"a": StepResult(step_name="a", status="done", input="entrada", output="A")}
+    results = asyncio.run(FlowExecutor(FlowGraph(flow), scripted_runner({}, calls)).run("entrada", completed))
+    assert [name for event, name, *_ in calls if event == "start"] == ["b", "c"]
+    assert results["b"].input == "A"
@@ -0,0 +1,62 @@
+import asyncio
+import json
+from flow_io import iter_chunk_lines, parse_records
+from flow_manager import FlowCache, FlowManager
+
+FLOW = {"name": "Fluxo", "steps": [{"step_name": "resumo", "step_order": 1, "system_prompt": "Resuma"}]}
+
+async def chunks(body: bytes, size: int = 7):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+async def collect(body: bytes, fmt: str):
+    return [record async for record in parse_records(iter_chunk_lines(chunks(body)), fmt)]
+
+def test_invalid_utf8_line_becomes_error_of_its_record():
+    body = b"\n".join([
+        json.dumps({"id": "a", **FLOW}).encode(),
+        b'{"name": "\xff\xfe"}',
+        b"",
+        b"{quebrado",
+        json.dumps({"id": "b", **FLOW}, ensure_ascii=False).encode() + b"\r",
+    ])
+    records = asyncio.run(collect(body, "ndjson"))
+    assert [index for index, _ in records] == [0, 1, 2, 3]
+    assert records[0][1]["id"] == "a"
+    assert isinstance(records[1][1], ValueError) and "UTF-8" in str(records[1][1])
+    assert isinstance(records[2][1], ValueError) and "JSON inválido" in str(records[2][1])
+    assert records[3][1]["id"] == "b"
+
+def test_invalid_utf8_line_invalidates_only_its_yaml_document():
+    body = b"\n".join([
+        b"name: primeiro",
+        b"---",
+        b"name: segundo",
+        b"description: \xff",
+        b"---",
+        b"name: terceiro",
+    ])
+    records = asyncio.run(collect(body, "yaml"))
+    assert records[0] == (0, {"name": "primeiro"})
+    assert records[1][0] == 1 and isinstance(records[1][1], ValueError)
+    assert records[2] == (2, {"name": "terceiro"})
+
+def test_import_reports_invalid_utf8_without_failing(mongo_db):
+    async def run():
+        collection = mongo_db["flows"]
+        manager = FlowManager(collection, cache=FlowCache())
+        body = b"\n".join([
+            json.dumps({"id": "a", **FLOW}).encode(),
+            b'{"id": "x", "name": "\xe9"}',
+            json.dumps({"id": "b", **FLOW}).encode(),
+        ])
+        report = await manager.import_flows(parse_records(iter_chunk_lines(chunks(body)), "ndjson"))
+        return report, sorted(await collection.distinct("_id"))
+
+    report, stored = asyncio.run(run())
+    assert report["received"] == 3
+    assert report["created"] == 2
+    assert report["failed"] == 1
+    assert report["errors"][0]["index"] == 1
+    assert "UTF-8" in report["errors"][0]["error"]
+    assert stored == ["a", "b"]
@@ -0,0 +1,53 @@
+import asyncio
+import yaml
+from flow_manager import FlowCache, FlowManager
+from flow_repository import FlowRepository
+
+STEPS = [{"step_name": "resumo", "step_order": 1, "system_prompt": "Resuma"}]
+
+async def insert_flows(collection):
+    await collection.insert_many([
+        # Formato legado: o fluxo inteiro em YAML, sem `is_active` no documento
+        {"_id": "legado", "yaml": yaml.dump({"name": "Legado", "steps": STEPS})},
+        {"_id": "legado_inativo", "yaml": yaml.dump({"name": "Inativo", "steps": STEPS, "is_active": False})},
+        {"_id": "nativo", "name": "Nativo", "steps": STEPS, "is_active": True, "revision": 1},
+    ])
+
+def test_active_filter_includes_legacy_documents(mongo_db):
+    async def run():
+        collection = mongo_db["flows"]
+        await collection.insert_many([
+            {"_id": "legado", "yaml": yaml.dump({"name": "Legado", "steps": STEPS})},
+            {"_id": "nativo", "name": "Nativo", "steps": STEPS, "is_active": True, "revision": 1},
+            {"_id": "pausado", "name": "Pausado", "steps": STEPS, "is_active": False, "revision": 1},
+        ])
+        cache = FlowCache()
+        manager = FlowManager(collection, cache=cache)
+        exported = [record["id"] async for record in manager.export_flows(is_active=True)]
+        listed, _ = await manager.list_flows(is_active=True)
+        warmed = await manager.warm_cache()
+        return exported, [flow["id"] for flow in listed], warmed, cache.get("legado")
+
+    exported, listed, warmed, cached = asyncio.run(run())
+    assert exported == ["legado", "nativo"]
+    assert listed == ["legado", "nativo"]
+    assert warmed == 2
+    assert cached is not None and cached.name == "Legado"
+
+def test_ensure_indexes_backfills_is_active_from_yaml(mongo_db):
+    async def run():
+        collection = mongo_db["flows"]
+        await insert_flows(collection)
+        repository = FlowRepository(collection)
+        await repository.ensure_indexes()
+        stored = {doc["_id"]: doc.get("is_active") async for doc in collection.find({}, {"is_active": 1})}
+        manager = FlowManager(collection, cache=FlowCache())
+        active = [record["id"] async for record in manager.export_flows(is_active=True)]
+        inactive = [record["id"] async for record in manager.export_flows(is_active=False)]
+        return stored, active, inactive, await repository.backfill_is_active()
+
+    stored, active, inactive, second_pass = asyncio.run(run())
+    assert stored == {"legado": True, "legado_inativo": False, "nativo": True}
+    assert active == ["legado", "nativo"]
+    assert inactive == ["legado_inativo"]
+    assert second_pass == 0
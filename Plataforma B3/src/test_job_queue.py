@@ -0,0 +1,150 @@
+import asyncio
+from datetime import datetime, timedelta
+from config import settings
+from flow_manager import Flow
+from job_queue import JobQueue, JobWorker
+
+FLOW = Flow(name="Fluxo", steps=[{"step_name": "resumo", "step_order": 1, "system_prompt": "Resuma"}])
+
+async def expire_lease(queue: JobQueue, job_id: str):
+    """Simula um worker que parou de renovar o arrendamento."""
+    await queue.collection.update_one({"_id": job_id}, {"$set": {"available_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+def test_lease_takes_oldest_job_once(mongo_db):
+    async def run():
+        queue = JobQueue(mongo_db["jobs"])
+        first = await queue.submit("fluxo", "primeira")
+        await queue.submit("fluxo", "segunda")
+        leased = [await queue.lease("w1", 30), await queue.lease("w2", 30), await queue.lease("w3", 30)]
+        return first, leased, await queue.counts()
+
+    first, leased, counts = asyncio.run(run())
+    assert leased[0]["_id"] == first
+    assert leased[0]["status"] == "running" and leased[0]["worker"] == "w1" and leased[0]["attempts"] == 1
+    assert leased[1]["worker"] == "w2"
+    assert leased[2] is None
+    assert counts["running"] == 2 and counts["queued"] == 0
+
+def test_heartbeat_keeps_the_lease_and_expired_leases_move_to_another_worker(mongo_db):
+    async def run():
+        queue = JobQueue(mongo_db["jobs"])
+        job_id = await queue.submit("fluxo", "mensagem")
+        job = await queue.lease("w1", 30)
+        renewed = await queue.heartbeat(job_id, "w1", 30)
+        stolen_while_valid = await queue.lease("w2", 30)
+        await expire_lease(queue, job_id)
+        taken_over = await queue.lease("w2", 30)
+        # O primeiro worker perdeu o job: não renova nem grava o desfecho
+        late_heartbeat = await queue.heartbeat(job_id, "w1", 30)
+        late_finish = await queue.finish(job, "done", result={"final_response": "atrasado"})
+        finished = await queue.finish(taken_over, "done", result={"final_response": "ok"})
+        return renewed, stolen_while_valid, taken_over, late_heartbeat, late_finish, finished, await queue.get(job_id)
+
+    renewed, stolen, taken_over, late_heartbeat, late_finish, finished, stored = asyncio.run(run())
+    assert renewed is True
+    assert stolen is None
+    assert taken_over["worker"] == "w2" and taken_over["attempts"] == 2
+    assert late_heartbeat is False
+    assert late_finish is False
+    assert finished is True
+    assert stored["status"] == "done" and stored["result"] == {"final_response": "ok"}
+
+def test_expired_leases_count_as_attempts(mongo_db):
+    async def run():
+        queue = JobQueue(mongo_db["jobs"])
+        job_id = await queue.submit("fluxo", "derruba o worker", max_attempts=2)
+        for worker in ("w1", "w2"):
+            await queue.lease(worker, 30)
+            await expire_lease(queue, job_id)
+        return await queue.lease("w3", 30), await queue.get(job_id)
+
+    leased, stored = asyncio.run(run())
+    assert leased is None
+    assert stored["status"] == "failed"
+    assert stored["error"] == "Número máximo de tentativas excedido"
+
+def test_retry_returns_job_to_queue_after_delay(mongo_db):
+    async def run():
+        queue = JobQueue(mongo_db["jobs"])
+        job_id = await queue.submit("fluxo", "mensagem")
+        job = await queue.lease("w1", 30)
+        retried = await queue.retry(job, "falha transitória", delay=60)
+        too_early = await queue.lease("w2", 30)
+        await expire_lease(queue, job_id)
+        return retried, too_early, await queue.lease("w2", 30)
+
+    retried, too_early, leased = asyncio.run(run())
+    assert retried is True
+    assert too_early is None
+    assert leased["attempts"] == 2 and leased["error"] == "falha transitória"
+
+class FakeFlowManager:
+    async def get_flow(self, flow_id):
+        return FLOW if flow_id == "fluxo" else None
+
+class FlakyModelClient:
+    """Falha nas primeiras `failures` execuções de cada mensagem e depois responde."""
+
+    run_log = None
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = {}
+
+    async def process_flow(self, user_message, flow, flow_id=None, timeout=None):
+        self.calls[user_message] = self.calls.get(user_message, 0) + 1
+        if self.calls[user_message] <= self.failures:
+            raise ValueError("modelo indisponível")
+        return {"final_response": user_message.upper()}
+
+def test_worker_retries_failures_and_records_outcomes(mongo_db, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(settings, "JOB_RETRY_MAX_DELAY", 0.01)
+    monkeypatch.setattr(settings, "RUN_LOG_FLUSH_INTERVAL", 0.01)
+
+    async def run():
+        queue = JobQueue(mongo_db["jobs"])
+        ok = await queue.submit("fluxo", "olá", max_attempts=3)
+        exhausted = await queue.submit("fluxo", "sem sorte", max_attempts=1)
+        missing = await queue.submit("inexistente", "olá")
+        worker = JobWorker(queue, FlakyModelClient(failures=1), FakeFlowManager(), concurrency=2, poll_interval=0.01)
+        worker.start()
+        try:
+            jobs = [await queue.wait(job_id, timeout=5, poll_interval=0.01) for job_id in (ok, exhausted, missing)]
+        finally:
+            await worker.stop()
+        return jobs, worker.stats()
+
+    (ok, exhausted, missing), stats = asyncio.run(run())
+    assert ok["status"] == "done" and ok["result"] == {"final_response": "OLÁ"} and ok["attempts"] == 2
+    assert exhausted["status"] == "failed" and exhausted["error"] == "modelo indisponível"
+    assert missing["status"] == "failed" and missing["attempts"] == 1
+    assert stats["completed"] == 1 and stats["failed"] == 2 and stats["retried"] == 1
+
+class SlowModelClient:
+    run_log = None
+
+    async def process_flow(self, user_message, flow, flow_id=None, timeout=None):
+        await asyncio.sleep(0.3)
+        return {"final_response": "ok"}
+
+def test_worker_heartbeat_keeps_long_jobs_leased(mongo_db):
+    async def run():
+        queue = JobQueue(mongo_db["jobs"])
+        job_id = await queue.submit("fluxo", "demorado")
+        worker = JobWorker(queue, SlowModelClient(), FakeFlowManager(), visibility_timeout=0.1, poll_interval=0.01)
+        worker.start()
+        stolen = []
+        try:
+            # O arrendamento de 0.1s venceria três vezes sem as renovações
+            for _ in range(5):
+                await asyncio.sleep(0.05)
+                stolen.append(await queue.lease("intruso", 30))
+            job = await queue.wait(job_id, timeout=5, poll_interval=0.01)
+        finally:
+            await worker.stop()
+        return stolen, job
+
+    stolen, job = asyncio.run(run())
+    assert stolen == [None] * 5
+    assert job["status"] == "done" and job["attempts"] == 1
@@ -0,0 +1,47 @@
+import asyncio
+import aiohttp
+import pytest
+from benchmarks.mock_server import MockAzureServer, MockConfig, LatencyDistribution
+from config import settings
+from deadline import deadline_scope
+from metrics import MODEL_ERRORS
+from model_integration import ModelIntegration
+
+PAYLOAD = {"messages": [{"role": "user", "content": "Olá"}], "max_tokens": 10}
+
+def deployment_url(base_url: str, deployment: str) -> str:
+    return f"{base_url.rstrip('/')}/openai/deployments/{deployment}/chat/completions?api-version=2024-02-01"
+
+def errors(deployment: str, status: str) -> float:
+    prefix = f'{MODEL_ERRORS.name}{{deployment="{deployment}",status="{status}"}} '
+    return next((float(line[len(prefix):]) for line in MODEL_ERRORS.render() if line.startswith(prefix)), 0.0)
+
+def test_connection_errors_are_counted(monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_MAX_RETRIES", 1)
+    monkeypatch.setattr(settings, "MODEL_RETRY_BASE_DELAY", 0.01)
+    before = errors("fora_do_ar", "connection")
+
+    async def run():
+        # Porta 1: conexão recusada em qualquer máquina de teste
+        await ModelIntegration("teste")._request(deployment_url("http://127.0.0.1:1", "fora_do_ar"), PAYLOAD)
+
+    with pytest.raises(aiohttp.ClientConnectionError):
+        asyncio.run(run())
+    # A tentativa original e a repetição
+    assert errors("fora_do_ar", "connection") - before == 2
+
+def test_timeouts_are_counted():
+    before = errors("lento", "timeout")
+
+    async def run():
+        server = MockAzureServer(MockConfig(latency=LatencyDistribution.parse("fixed:1")))
+        await server.start()
+        try:
+            with deadline_scope(0.1):
+                await ModelIntegration("teste")._request(deployment_url(server.base_url, "lento"), PAYLOAD)
+        finally:
+            await server.stop()
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+    assert errors("lento", "timeout") - before == 1
@@ -0,0 +1,101 @@
+import asyncio
+import time
+import pytest
+from benchmarks.mock_server import MockAzureServer, MockConfig
+from config import settings
+from model_integration import ModelIntegration, ModelHTTPError
+from rate_limit import DeploymentLimiter, DeploymentRateLimits, backoff_delay, parse_retry_after
+
+def test_parse_retry_after_prefers_milliseconds():
+    assert parse_retry_after({"retry-after-ms": "250", "Retry-After": "3"}) == 0.25
+    assert parse_retry_after({"Retry-After": "2"}) == 2.0
+    assert parse_retry_after({"Retry-After": "amanhã"}) is None
+    assert parse_retry_after({}) is None
+
+def test_backoff_is_capped_and_never_shorter_than_retry_after():
+    delays = [backoff_delay(10, base=0.5, cap=4.0) for _ in range(200)]
+    assert all(0 <= delay <= 4.0 for delay in delays)
+    assert all(backoff_delay(0, base=0.5, cap=4.0, retry_after=7.0) == 7.0 for _ in range(20))
+
+def test_aimd_grows_additively_and_halves_once_per_burst():
+    limiter = DeploymentLimiter(initial_concurrency=4, max_concurrency=8, decrease_interval=60)
+    for _ in range(4):
+        limiter.observe(200, {})
+    # +1 a cada janela de `limit` respostas bem-sucedidas
+    assert 4.9 < limiter.limit < 5.0
+    for _ in range(5):
+        limiter.observe(429, {})
+    # Uma rajada de 429 conta como um único corte
+    assert 2.4 < limiter.limit < 2.5
+    assert limiter.throttled == 5
+    for _ in range(200):
+        limiter.observe(200, {})
+    assert limiter.limit == 8
+
+def test_limit_never_drops_below_minimum():
+    limiter = DeploymentLimiter(initial_concurrency=2, min_concurrency=1, decrease_interval=0)
+    for _ in range(10):
+        limiter.observe(429, {})
+    assert limiter.limit == 1
+
+def test_concurrency_is_capped_by_the_current_limit():
+    async def run():
+        limits = DeploymentRateLimits(initial_concurrency=2, max_concurrency=2)
+        active, peak = 0, 0
+
+        async def call():
+            nonlocal active, peak
+            async with limits.slot("gpt-4o"):
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(call() for _ in range(10)))
+        return peak, limits.stats()["gpt-4o"]
+
+    peak, stats = asyncio.run(run())
+    assert peak == 2
+    assert stats["in_flight"] == 0
+
+def test_retry_after_pauses_new_requests():
+    async def run():
+        limiter = DeploymentLimiter()
+        limiter.observe(429, {"retry-after-ms": "100"})
+        started = time.monotonic()
+        await limiter.acquire()
+        await limiter.release()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.09
+
+def test_server_quota_headers_drain_the_local_bucket():
+    limiter = DeploymentLimiter(rpm=600)
+    limiter.observe(200, {"x-ratelimit-remaining-requests": "0"})
+    assert limiter.requests.tokens < 1
+
+def test_throttled_requests_are_retried_after_retry_after(monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_MAX_RETRIES", 2)
+    monkeypatch.setattr(settings, "MODEL_RETRY_BASE_DELAY", 0.001)
+
+    async def run():
+        server = MockAzureServer(MockConfig(throttle_rate=1.0, retry_after=0.05))
+        await server.start()
+        limits = DeploymentRateLimits()
+        client = ModelIntegration("teste", rate_limits=limits)
+        url = f"{server.base_url}openai/deployments/limitado/chat/completions?api-version=2024-02-01"
+        started = time.monotonic()
+        try:
+            with pytest.raises(ModelHTTPError) as error:
+                await client._request(url, {"messages": [{"role": "user", "content": "Olá"}], "max_tokens": 5})
+        finally:
+            await server.stop()
+        return error.value.status, server.requests, time.monotonic() - started, limits.stats()["limitado"]
+
+    status, requests, elapsed, stats = asyncio.run(run())
+    assert status == 429
+    # Tentativa original e duas repetições, cada uma após o Retry-After
+    assert requests == 3
+    assert elapsed >= 0.1
+    assert stats["throttled"] == 3
+    assert stats["concurrency_limit"] < 8
@@ -0,0 +1,54 @@
+import asyncio
+from datetime import datetime, timedelta
+from flow_manager import Flow
+from run_log import RunLog
+
+FLOW = Flow(name="Fluxo", steps=[{"step_name": "resumo", "step_order": 1, "system_prompt": "Resuma"}])
+
+async def started_run(run_log: RunLog, status: str, idle_seconds: float = 0) -> str:
+    run_id = run_log.start_run(FLOW, "fluxo", "mensagem")
+    if status != "running":
+        run_log.finish_run(run_id, status, error="erro" if status == "failed" else None)
+    await run_log.flush()
+    updated_at = datetime.utcnow() - timedelta(seconds=idle_seconds)
+    await run_log.collection.update_one({"_id": run_id}, {"$set": {"updated_at": updated_at}})
+    return run_id
+
+def test_only_one_concurrent_claim_wins(mongo_db):
+    async def run():
+        run_log = RunLog(mongo_db["runs"])
+        run_id = await started_run(run_log, "failed")
+        claims = await asyncio.gather(*(run_log.claim(run_id, stale_after=60) for _ in range(5)))
+        return claims, await run_log.load(run_id)
+
+    claims, stored = asyncio.run(run())
+    winners = [claim for claim in claims if claim is not None]
+    assert len(winners) == 1
+    assert winners[0]["status"] == "running"
+    assert stored["status"] == "running"
+
+def test_claim_skips_runs_in_progress_and_finished(mongo_db):
+    async def run():
+        run_log = RunLog(mongo_db["runs"])
+        running = await started_run(run_log, "running", idle_seconds=5)
+        completed = await started_run(run_log, "completed", idle_seconds=600)
+        return (
+            await run_log.claim(running, stale_after=60),
+            await run_log.claim(completed, stale_after=60),
+            await run_log.claim("inexistente", stale_after=60),
+        )
+
+    assert asyncio.run(run()) == (None, None, None)
+
+def test_stale_running_runs_can_be_taken_over_once(mongo_db):
+    async def run():
+        run_log = RunLog(mongo_db["runs"])
+        run_id = await started_run(run_log, "running", idle_seconds=120)
+        first = await run_log.claim(run_id, stale_after=60)
+        # A retomada renova updated_at: a execução deixa de parecer abandonada
+        second = await run_log.claim(run_id, stale_after=60)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first is not None and first["updated_at"] > datetime.utcnow() - timedelta(seconds=60)
+    assert second is None
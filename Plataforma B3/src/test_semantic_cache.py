@@ -0,0 +1,103 @@
+import asyncio
+import os
+
+# Variáveis obrigatórias do config.Settings; os testes não fazem chamadas de rede
+for name, value in {
+    "UFPB_OPENAI_API_KEY": "teste",
+    "UFPB_OPENAI_API_BASE": "http://127.0.0.1:8911/",
+    "UFPB_OPENAI_API_VERSION": "2024-02-01",
+    "UFPB_OPENAI_EMBEDDING_DEPLOYMENT": "text-embedding-3-small",
+    "COSMOSDB_URL": "mongodb://127.0.0.1:27017/",
+}.items():
+    os.environ.setdefault(name, value)
+
+import numpy as np
+from semantic_cache import SemanticCache, StubEmbedder, VectorIndex
+
+def make_cache(**kwargs):
+    embedder = StubEmbedder()
+    kwargs.setdefault("batch_window", 0.001)
+    return embedder, SemanticCache(embedder.embed_many, **kwargs)
+
+async def remember(cache, namespace, text, answer):
+    _, vector = await cache.lookup(namespace, text)
+    await cache.store(namespace, text, vector, answer)
+
+def test_hit_above_threshold_and_miss_below():
+    async def run():
+        embedder, cache = make_cache(threshold=0.95)
+        await remember(cache, "passo", "meu pedido atrasou muito", "Urgente")
+        # Mesmas palavras, outra ordem e caixa: similaridade 1
+        hit, _ = await cache.lookup("passo", "Muito atrasou meu PEDIDO")
+        # Uma palavra a mais: similaridade 4/sqrt(20), abaixo de 0.95 e acima de 0.85
+        miss, _ = await cache.lookup("passo", "meu pedido atrasou muito hoje")
+        loose, _ = await cache.lookup("passo", "meu pedido atrasou muito hoje", threshold=0.85)
+        other, _ = await cache.lookup("outro_passo", "meu pedido atrasou muito")
+        return hit, miss, loose, other, cache.stats()
+
+    hit, miss, loose, other, stats = asyncio.run(run())
+    assert hit == "Urgente"
+    assert miss is None
+    assert loose == "Urgente"
+    assert other is None
+    assert stats["hits"] == 2
+    assert stats["misses"] == 3
+
+def test_namespace_replaces_least_used_entry_when_full():
+    async def run():
+        _, cache = make_cache(max_entries=2)
+        await remember(cache, "passo", "alfa", "A")
+        await remember(cache, "passo", "beta", "B")
+        await cache.lookup("passo", "alfa")
+        await remember(cache, "passo", "gama", "C")
+        return [(await cache.lookup("passo", text))[0] for text in ("alfa", "beta", "gama")], cache.stats()
+
+    answers, stats = asyncio.run(run())
+    assert answers == ["A", None, "C"]
+    assert stats["entries"] == 2
+
+def test_global_bounds_evict_least_recently_used_namespaces():
+    async def run():
+        _, cache = make_cache(max_entries=3, max_total_entries=4, max_namespaces=2)
+        for text in ("a1", "a2", "a3"):
+            await remember(cache, "antigo", text, text)
+        for text in ("b1", "b2"):
+            await remember(cache, "novo", text, text)
+        after_total = {name: index.size for name, index in cache.indexes.items()}
+        await remember(cache, "terceiro", "c1", "c1")
+        return after_total, list(cache.indexes), cache.stats()
+
+    after_total, namespaces, stats = asyncio.run(run())
+    # O limite total tira entradas do namespace usado há mais tempo
+    assert after_total == {"antigo": 2, "novo": 2}
+    # O limite de namespaces descarta o namespace usado há mais tempo inteiro
+    assert namespaces == ["novo", "terceiro"]
+    assert stats["entries"] == 3
+    assert stats["evictions"] == 3
+
+def test_vector_index_grows_and_shrinks_on_demand():
+    index = VectorIndex(dimensions=8, max_entries=1000)
+    assert len(index.vectors) == VectorIndex.INITIAL_CAPACITY
+    for position in range(100):
+        index.add(np.eye(8, dtype=np.float32)[position % 8], str(position))
+    assert index.size == 100
+    assert len(index.vectors) == 128
+    for _ in range(90):
+        index.remove_least_used()
+    assert index.size == 10
+    assert len(index.vectors) < 128
+    assert sorted(index.answers, key=int) == [str(position) for position in range(90, 100)]
+
+def test_concurrent_lookups_share_one_embedding_call():
+    async def run():
+        embedder, cache = make_cache(max_batch=16, batch_window=0.01)
+        await asyncio.gather(*(cache.lookup("passo", f"texto {n}") for n in range(10)))
+        single = (embedder.calls, embedder.texts)
+        await asyncio.gather(*(cache.lookup("passo", f"texto {n}") for n in range(40)))
+        return single, (embedder.calls, embedder.texts), cache.stats()["embedding_batches"]
+
+    single, total, batches = asyncio.run(run())
+    assert single == (1, 10)
+    # 40 pedidos com lotes de até 16: 16 + 16 + 8
+    assert total == (4, 50)
+    assert batches == 4
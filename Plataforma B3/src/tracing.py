@@ -0,0 +1,88 @@
+import contextvars
+import json
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Any, Optional, List, Iterator
+import logging
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_time: float = field(default_factory=time.time)
+    end_time: Optional[float] = None
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end_time is None else self.end_time - self.start_time
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "duration": self.duration}
+
+class SpanExporter:
+    """Guarda os spans finalizados em memória e, opcionalmente, em um arquivo JSON Lines."""
+
+    def __init__(self, max_traces: int = 200, path: Optional[str] = None):
+        self.path = path
+        self._traces: "deque[List[Span]]" = deque(maxlen=max_traces)
+        self._open: Dict[str, List[Span]] = {}
+
+    def export(self, span: Span):
+        self._open.setdefault(span.trace_id, []).append(span)
+        if span.parent_id is None:
+            spans = self._open.pop(span.trace_id)
+            self._traces.append(spans)
+            if self.path:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as handle:
+                        for finished in spans:
+                            handle.write(json.dumps(finished.to_dict(), ensure_ascii=False, default=str) + "\n")
+                except OSError as e:
+                    logger.warning(f"Falha ao exportar trace: {str(e)}")
+
+    def traces(self, limit: int = 50) -> List[List[Dict[str, Any]]]:
+        return [[span.to_dict() for span in spans] for spans in list(self._traces)[-limit:]]
+
+exporter = SpanExporter(max_traces=settings.TRACE_MAX_TRACES, path=settings.TRACE_EXPORT_PATH)
+
+@contextmanager
+def start_span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Abre um span filho do span atual (ou a raiz de um novo trace)."""
+    parent = _current_span.get()
+    span = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        attributes=dict(attributes),
+    )
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "error"
+        span.set_attribute("error", str(e) or type(e).__name__)
+        raise
+    finally:
+        span.end_time = time.time()
+        _current_span.reset(token)
+        exporter.export(span)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
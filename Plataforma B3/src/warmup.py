@@ -0,0 +1,104 @@
+import asyncio
+import time
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
+import logging
+import aiohttp
+from rate_limit import backoff_delay
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WarmUpStep = Tuple[str, Callable[[], Awaitable[Any]]]
+
+class WarmUp:
+    """Etapas de inicialização executadas em segundo plano, depois que o servidor já aceita conexões.
+
+    O servidor responde a /healthz imediatamente, mas só fica pronto
+    (/readyz) quando todas as etapas concluem. Uma etapa que falha (ex.: Mongo
+    ainda inacessível) é repetida com backoff, sem refazer as anteriores.
+    """
+
+    def __init__(
+        self,
+        steps: List[WarmUpStep],
+        retry_base_delay: float = settings.WARMUP_RETRY_BASE_DELAY,
+        retry_max_delay: float = settings.WARMUP_RETRY_MAX_DELAY,
+    ):
+        self.steps = steps
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.pending = [name for name, _ in steps]
+        self.durations: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self):
+        for name, step in self.steps:
+            attempt = 0
+            while True:
+                started = time.monotonic()
+                try:
+                    await step()
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.errors[name] = str(e) or type(e).__name__
+                    delay = backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+                    attempt += 1
+                    logger.warning(f"Aquecimento: etapa '{name}' falhou ({self.errors[name]}); nova tentativa em {delay:.1f}s")
+                    await asyncio.sleep(delay)
+            self.durations[name] = round(time.monotonic() - started, 3)
+            self.errors.pop(name, None)
+            self.pending.remove(name)
+        self.finished_at = time.monotonic()
+        logger.info(f"Aquecimento concluído em {self.seconds:.3f}s: {self.durations}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "pending": list(self.pending),
+            "durations": dict(self.durations),
+            "errors": dict(self.errors),
+            "seconds": round(self.seconds, 3),
+        }
+
+async def warm_http_pool(
+    session: aiohttp.ClientSession,
+    url: str,
+    connections: int = settings.HTTP_WARM_CONNECTIONS,
+    timeout: float = 5.0
+) -> int:
+    """Abre `connections` conexões (DNS, TCP e TLS) com o endpoint do modelo e as deixa no pool.
+
+    O status da resposta não importa, só a conexão. Falhas apenas são
+    registradas: o pool frio não impede o serviço de atender.
+    """
+    async def connect():
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            await response.read()
+
+    results = await asyncio.gather(*(connect() for _ in range(connections)), return_exceptions=True)
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        logger.warning(f"Aquecimento do pool HTTP: {len(failures)} de {connections} conexões falharam ({failures[0]!r})")
+    return connections - len(failures)
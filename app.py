@@ -1,43 +1,138 @@
 import streamlit as st
 from openai import OpenAI
+from dotenv import load_dotenv
 import os
 
-# ⚠️ Ideal: usar variável de ambiente para segurança
-client = OpenAI(api_key="sk-proj-34g6vxddqvYemlu1V47PT3BlbkFJrTyoQHZ4YKiqpU9bi4HS")
+load_dotenv()
+
+# Configuração lida do ambiente (ou do .env)
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o")
+SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "gpt-4o-mini")
+# Orçamento de tokens do histórico enviado a cada mensagem (resumo + turnos recentes)
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "3000"))
+# Com o resumo ativo, turnos que saem da janela são condensados em vez de descartados
+SUMMARY_ENABLED = os.getenv("CHAT_SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    # Sem tiktoken, ou sem rede para baixar o vocabulário: estimativa por caracteres
+    _encoding = None
+
+@st.cache_resource
+def get_client() -> OpenAI:
+    """Cliente único por processo, compartilhado entre sessões e reruns."""
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        st.error("Defina OPENAI_API_KEY no ambiente ou no arquivo .env.")
+        st.stop()
+    return OpenAI(api_key=api_key)
+
+def count_tokens(message) -> int:
+    """Tokens de uma mensagem; sem tiktoken, estima 4 caracteres por token."""
+    content = message["content"] or ""
+    tokens = len(_encoding.encode(content)) if _encoding is not None else len(content) // 4 + 1
+    return tokens + 4  # papel e delimitadores da mensagem
+
+def build_context(history, summary, budget):
+    """Mensagens a enviar e o índice do primeiro turno mantido na janela.
+
+    Os turnos mais recentes entram até o orçamento (descontado o resumo); a
+    última mensagem do usuário sempre entra.
+    """
+    summary_message = {"role": "system", "content": f"Resumo da conversa até aqui: {summary}"} if summary else None
+    used = count_tokens(summary_message) if summary_message else 0
+    start = len(history)
+    while start > 0:
+        tokens = count_tokens(history[start - 1])
+        if used + tokens > budget and start < len(history):
+            break
+        used += tokens
+        start -= 1
+    messages = ([summary_message] if summary_message else []) + history[start:]
+    return messages, start
+
+def update_summary(summary, turns) -> str:
+    """Incorpora ao resumo os turnos que saíram da janela."""
+    transcript = "\n".join(
+        f"{'Usuário' if msg['role'] == 'user' else 'Assistente'}: {msg['content']}" for msg in turns
+    )
+    response = get_client().chat.completions.create(
+        model=SUMMARY_MODEL,
+        temperature=0,
+        max_tokens=SUMMARY_MAX_TOKENS,
+        messages=[
+            {"role": "system", "content": (
+                "Atualize o resumo da conversa com os novos trechos. Mantenha fatos, decisões, "
+                "código e perguntas em aberto; seja conciso."
+            )},
+            {"role": "user", "content": f"Resumo atual:\n{summary or '(vazio)'}\n\nNovos trechos:\n{transcript}"},
+        ],
+    )
+    return response.choices[0].message.content
+
+def compact_history():
+    """Mantém o histórico enviado dentro do orçamento, resumindo (ou descartando) os turnos antigos."""
+    state = st.session_state
+    _, start = build_context(state.history[state.summarized:], state.summary, HISTORY_TOKEN_BUDGET)
+    dropped = state.history[state.summarized:state.summarized + start]
+    if not dropped:
+        return
+    if SUMMARY_ENABLED:
+        try:
+            state.summary = update_summary(state.summary, dropped)
+        except Exception as e:
+            st.warning(f"Não foi possível resumir o histórico antigo: {str(e)}")
+    state.summarized += start
+
+def stream_resposta(messages):
+    stream = get_client().chat.completions.create(
+        model=CHAT_MODEL,
+        temperature=0.8,
+        messages=messages,
+        stream=True
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
 
 if "history" not in st.session_state:
     st.session_state.history = []
-
-def enviar_mensagem(messages):
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            temperature=0.8,
-            messages=messages
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"Erro na resposta: {str(e)}"
+    st.session_state.summary = ""
+    # Turnos anteriores a este índice já foram resumidos e não são mais enviados
+    st.session_state.summarized = 0
 
 prompt = st.text_area("Digite sua dúvida ou código:", height=200)
 
 if st.button("Enviar"):
     if prompt:
         st.session_state.history.append({"role": "user", "content": prompt})
+        compact_history()
+        messages, _ = build_context(
+            st.session_state.history[st.session_state.summarized:], st.session_state.summary, HISTORY_TOKEN_BUDGET
+        )
 
-        with st.spinner("Aguarde, estou processando sua solicitação..."):
-            resposta = enviar_mensagem(st.session_state.history)
-
-        st.session_state.history.append({"role": "assistant", "content": resposta})
-        st.write(f"**Assistente:** {resposta}")
+        st.write("**Assistente:**")
+        try:
+            resposta = st.write_stream(stream_resposta(messages))
+            st.session_state.history.append({"role": "assistant", "content": resposta})
+        except Exception as e:
+            st.session_state.history.pop()
+            st.error(f"Erro na resposta: {str(e)}")
     else:
         st.warning("Por favor, insira uma dúvida ou código.")
 
 if st.button("Resetar Conversa"):
     st.session_state.history.clear()
+    st.session_state.summary = ""
+    st.session_state.summarized = 0
     st.success("Histórico resetado.")
 
 with st.expander("Histórico da Conversa"):
+    if st.session_state.summary:
+        st.write(f"**Resumo dos turnos anteriores:** {st.session_state.summary}")
     for msg in st.session_state.history:
         role = "Usuário" if msg["role"] == "user" else "Assistente"
         st.write(f"**{role}:** {msg['content']}")